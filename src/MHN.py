@@ -10,350 +10,40 @@
 '''
 import os
 import sys
-import arcpy
-
-class MasterHighwayNetwork(object):
+import numpy as np
+try:
+    import arcpy
+except ImportError:
+    arcpy = None  # Headless: GeoPackage storage only (see storage.py)
+from attribute_table import AttributeTable
+from itinerary_arrays import changed_itin_values, itin_measures, itin_times
+from mhn_core import MHNCore
+from network_graph import NetworkGraph, find_shortest_path
+from path_cache import PathCache
+from storage import add_error, add_message, open_storage
+from table_export import write_rows
+
+class MasterHighwayNetwork(MHNCore):
     ''' An object containing properties and methods relating to the MHN processing
-        scripts and a specified MHN geodatabase. '''
-
-    # -----------------------------------------------------------------------------
-    #  SET GDB-AGNOSTIC VARIABLES
-    # -----------------------------------------------------------------------------
-    base_year = 2015  # BASELINK=1 network year, not necessarily scenario 100 (i.e. base_year was recently 2009, while scenario 100 was 2010)
-
-    bus_years = {
-        'base':    2015,  # Year that bus_base feature class represents
-        'current': 2024   # Year that bus_current feature class represents
-        #"current" yr will change if different year specified in MHN object init
-    }
-
-    centroid_ranges = {
-        ## zones17 (C19Q1 and later)
-        'CBD':     range(   1,   48),  # NB. range(i,j) includes i & *excludes* j
-        'Chicago': range(   1,  718),
-        'Cook':    range(   1, 1733),
-        'McHenry': range(2584, 2703),
-        'Lake':    range(2326, 2584),
-        'Kane':    range(2112, 2305),
-        'DuPage':  range(1733, 2112),
-        'Will':    range(2703, 2927),
-        'Kendall': range(2305, 2326),
-        'MHN':     range(   1, 3650),
-        'POE':     range(3633, 3650),
-        'CMAP': {
-            '7_Counties':  range(   1, 2927),
-            'Grundy_Part': range(2949, 2950),
-            'DeKalb_Part': range(2977, 2978)
-        }
+        scripts and a specified MHN geodatabase. GDB-agnostic variables and
+        methods are inherited from mhn_core.MHNCore. '''
 
-        # ## zones09 (C18Q3 and earlier)
-        # 'CBD':     range(   1,   48),  # NB. range(i,j) includes i & *excludes* j
-        # 'Chicago': range(   1,  310),
-        # 'Cook':    range(   1,  855),
-        # 'McHenry': range( 855,  959),
-        # 'Lake':    range( 959, 1134),
-        # 'Kane':    range(1134, 1279),
-        # 'DuPage':  range(1279, 1503),
-        # 'Will':    range(1503, 1691),
-        # 'Kendall': range(1691, 1712),
-        # 'CMAP':    range(   1, 1712),
-        # 'MHN':     range(   1, 1962),
-        # 'POE':     range(1945, 1962)
-    }
-
-    min_node_id =  5001  # 1-5000 reserved for zone centroids/POEs
-    max_node_id = 29999  # 30000+ reserved for MRN nodes
-
-    min_poe = min(centroid_ranges['POE'])
-    max_poe = max(centroid_ranges['POE'])
-
-    scenario_years = {
-        ### Current scenario codes (C22Q2 and later)
-        '100': 2019,  # WARNING: commenting-out 100 will adversely affect transit file generation for later scenarios
-        '200': 2025,
-        '300': 2030,
-        '400': 2035,
-        '500': 2040,
-        '600': 2045,  # UrbanSim only
-        '700': 2050
-
-        ### Old scenario codes (C17Q2-C21Q4)
-        # '100': 2015,  # WARNING: commenting-out 100 will adversely affect transit file generation for later scenarios
-        # '200': 2020,
-        # '300': 2025,
-        # '400': 2030,
-        # '500': 2035,  # Not currently used
-        # '600': 2040,
-        # '700': 2050
-
-        ### Older scenario codes (C17Q1 and earlier):
-        # '100': 2010,  # WARNING: commenting-out 100 will adversely affect transit file generation for later scenarios
-        # '200': 2015,
-        # '300': 2020,
-        # '400': 2025,
-        # '500': 2030,
-        # '600': 2040
-    }
-
-    min_year = min(scenario_years.values())
-    max_year = max(scenario_years.values())
-
-    # Highway/transit TODs.
-    tod_periods = {
-        'highway': {
-            '1':  ('8PM-6AM',                                   # 1: overnight
-                   '"STARTHOUR" >= 20 OR "STARTHOUR" <= 5'),
-            '2':  ('6AM-7AM',                                   # 2: AM shoulder 1
-                   '"STARTHOUR" = 6'),
-            '3':  ('7AM-9AM',                                   # 3: AM peak
-                   '"STARTHOUR" IN (7, 8)'),
-            '4':  ('9AM-10AM',                                  # 4: AM shoulder 2
-                   '"STARTHOUR" = 9'),
-            '5':  ('10AM-2PM',                                  # 5: midday
-                   '"STARTHOUR" >= 10 AND "STARTHOUR" <= 13'),
-            '6':  ('2PM-4PM',                                   # 6: PM shoulder 1
-                   '"STARTHOUR" IN (14, 15)'),
-            '7':  ('4PM-6PM',                                   # 7: PM peak
-                   '"STARTHOUR" IN (16, 17)'),
-            '8':  ('6PM-8PM',                                   # 8: PM shoulder 2
-                   '"STARTHOUR" IN (18, 19)'),
-        },
-        # Condensed TODs for transit (C22Q2 and later)
-        'transit': {
-            '1':  ('6PM-6AM',                                  # 1: overnight
-                   '"STARTHOUR" >= 18 OR "STARTHOUR" < 6'),
-            '2':  ('6AM-9AM',                                  # 2: AM peak
-                   '"STARTHOUR" >= 6 AND "STARTHOUR" < 9'),
-            '3':  ('9AM-4PM',                                  # 3: midday
-                   '"STARTHOUR" >= 9 AND "STARTHOUR" < 16'),
-            '4':  ('4PM-6PM',                                  # 4: PM peak
-                   '"STARTHOUR" >= 16 AND "STARTHOUR" < 18')
-            
-            ### Replaced by longer transit AM peak period (C22Q2 and later)
-            # 'am': ('7AM-9AM',                                  # am: Same as TOD 3, but for buses w/ >50% service in period
-            #        '"AM_SHARE" >= 0.5')
-        }
-    }
-    
-    ampm_tods = {
-        'highway': {
-            '1': ('1', '2', '3', '4', '5', '6', '7', '8'),  # All periods
-            '2': ('2', '3', '4', '5'),                      # AM periods
-            '3': ('1', '6', '7', '8'),                      # PM periods
-            '4': ('1', '5'),                                # Off-peak periods
-            '5': ('2','3','4','6','7','8')                  # AM/PM Peaks + Shoulders
-        },
-        'transit': {
-            '1': ('1', '2', '3', '4'),  # All periods
-            '2': ('2', '3'),            # AM periods
-            '3': ('1', '4'),            # PM periods
-            '4': ('1', '3')             # Off-peak periods
-        }
-    }
-
-    rsps = {
-        3:   "McHenry-Lake Corridor",
-        6:   "IL 31/Front St",
-        10:  "IL 60",
-        11:  "IL 62/Algonquin Rd",
-        13:  "IL 83/Barron Blvd",
-        14:  "IL 131/Greenbay Rd",
-        15:  "IL 173/Rosecrans Rd",
-        20:  "Elgin O'Hare Western Access",
-        21:  "I-290/IL 53 Interchange Improvement",
-        22:  "I-294/I-57 Interchange Addition",
-        23:  "I-294 Central Tri-State Mobility Improvements",
-        24:  "I-290/I-88/I-294 Interchange Improvement",
-        25:  "Central Lake County Corridor: IL 53 North & IL 120",
-        29:  "I-55 Managed Lane",
-        30:  "I-290 Eisenhower Reconstruction & Managed Lane",
-        31:  "Illiana Corridor",
-        32:  "I-190 Access Improvements",
-        33:  "Jane Byrne Interchange Reconstruction",
-        34:  "I-55 Add Lanes & Reconstruction",
-        35:  "I-57 Add Lanes",
-        36:  "I-80 Reconstruction & Managed Lanes",
-        37:  "I-80 Managed Lanes",
-        38:  "I-80 to I-55 Connector",
-        46:  "Randall Rd",
-        51:  "North Algonquin Fox River Crossing",
-        53:  "Caton Farm-Bruce Rd Corridor",
-        55:  "Laraway Rd",
-        56:  "Wilmington-Peotone Rd",
-        57:  "Red Line Extension (South)",
-        58:  "(58A/B) Red Purple Modernization",
-        59:  "Blue Line West Extension",
-        60:  "Brown Line Extension",
-        61:  "Circle Line South (Phase II)",
-        62:  "Circle Line North (Phase III)",
-        63:  "Orange Line Extension",
-        64:  "Yellow Line Enhancements & Extension",
-        66:  "UP Northwest Extension",
-        67:  "SouthWest Service Improvements / 75th St Corridor Improvement Program Elements",
-        68:  "UP North Improvements",
-        69:  "UP West Improvements",
-        70:  "Rock Island Improvements",
-        71:  "BNSF Extension-Oswego/Plano",
-        72:  "BNSF Improvements",
-        73:  "Heritage Corridor Improvements",
-        74:  "Metra Electric Improvements",
-        75:  "Metra Electric Extension",
-        76:  "Milwaukee District North Extension-Wadsworth",
-        77:  "Milwaukee District North Improvements",
-        78:  "Milwaukee District West Extension-Marengo",
-        79:  "Milwaukee District West Improvements",
-        80:  "North Central Service Improvements",
-        81:  "Rock Island Extension",
-        82:  "SouthEast Service",
-        83:  "SouthWest Extension",
-        84:  "STAR Line",
-        85:  "West Loop Transportation Center Phase I",
-        87:  "Mid-City Transitway",
-        88:  "West Loop Transportation Center Phase II",
-        89:  "North Lake Shore Drive Improvements",
-        93:  "Blue Line Forest Park Branch Reconstruction",
-        94:  "Brown Line Capacity Expansion",
-        98:  "A-2 Crossing Rebuild",
-        102: "(102A) Pulse-ART Expansion",
-        103: "River North-Streeterville Transit Improvements",
-        104: "South Lakefront-Museum Campus Access Improvement",
-        105: "Express Bus Expansion",
-        106: "Ashland Ave BRT",
-        107: "Green Line Extension",
-        108: "South Halsted BRT",
-        109: "IL 43/Harlem Ave",
-        110: "IL 47",
-        111: "IL 83/Kingery Hwy",
-        112: "US 12/95th St",
-        113: "US 20/Lake St",
-        114: "US 45/Olde Half Day Rd",
-        115: "BNSF Extension-Sugar Grove",
-        116: "Heritage Corridor Extension",
-        117: "Milwaukee District North Extension-Richmond",
-        118: "Milwaukee District West Extension-Hampshire",
-        119: "STAR Line Eastern Segment",
-        120: "STAR Line Northern Segment",
-        121: "Rock Island RER Service",
-        122: "UP North RER Service",
-        123: "UP Northwest RER Service",
-        124: "CrossRail Chicago",
-        125: "North Lakefront Light Rail Line",
-        126: "South Lakefront Light Rail Line",
-        127: "Superloop Light Rail Line",
-        128: "Madison Street & Jackson Street Light Rail Lines",
-        129: "Clark Street Light Rail Line",
-        130: "Downtown Ring Light Rail Line",
-        131: "The Burnham Ring Light Rail Line",
-        132: "Milwaukee Avenue Streetcar & O'Hare Blue Line Express",
-        134: "Cross-Town Tollway & CTA Route",
-        135: "I-94 Bishop Ford Expressway",
-        136: "I-90/1-94 Kennedy & Dan Ryan Expressways",
-        137: "I-55 Stevenson Expressway",
-        138: "I-90 Kennedy Expressway",
-        139: "I-94 Edens Expressway",
-        140: "I-90/I-94 Kennedy Expressway",
-        141: "I-290/IL-53",
-        142: "I-57",
-        143: "Modern Metra Electric",
-        144: "S.M.A.R.T. - Suburban Metropolitan Area Rapid Transit",
-        145: "Vollmer Rd",
-        146: "I-55 Dual Managed Lane",
-        147: "Blue Line Capacity",
-        151: "CREATE GS-02",
-        152: "Elston-Armitage-Ahsland-Cortland Intersection",
-        153: "Ashland-Ogden Metra Infill Station",
-        154: "South Halsted Bus Enhancements",
-        155: "I-294 BRT Stations",
-        156: "Milwaukee Corridor/O'Hare Improvements",
-        157: "I-57 & Eagle Lake Rd Interchange",
-        158: "US 6",
-        159: "US 30",
-        160: "US 45 & Milburn Bypass",
-        161: "IL 7/143rd St",
-        162: "IL 47",
-        163: "IL 56",
-        164: "IL 60",
-        166: "IL 47 Cross St to Kennedy Rd",
-        9901: "(A1) O'Hare Express Service",
-        9902: "(A2) South Lakefront Improvements",
-        9903: "(A3) I-55 Reconstruction & IL 126 Interchange Reconfiguration",
-        9904: "(A4) I-55/IL 59 Interchange",
-    }
-    
-    #2026 LRTP - Regional Capital Project list
-    rcps = {
-        12121: 'North DuSable LSD Improvements',
-        12129: '75th Street Corridor Improvement Project (CIP)',
-        13104: "I-190 O'Hare Access Improvements",
-        13106: 'I-55 - I-80 to Coal City Road',
-        13107: 'I-55 - IL 129 to Lorenzo Road',
-        13108: 'I-55 Managed Lane I-355 to I-294',
-        13110: 'I-55 - I-80 to US 52',
-        13111: 'I-55 - I-355 to IL 53',
-        13112: 'I-80/I-294 Flex Lanes',
-        13113: 'I-80 - U.S. 30 to I-294 ',
-        13114: 'I-290 - Mannheim Rd to Racine Ave ',
-        13115: 'IL 60 - IL 176 to Townline Rd ',
-        13116: 'IL 173 - IL 59 to US 41 ',
-        13117: 'McHenry Rd - IL 173 to IL 132',
-        13118: 'Algonquin Rd - IL 25 to IL 68',
-        13119: 'Milwaukee Ave from Petite Lake Rd to IL 120',
-        13120: 'IL Route 131 - Russell Rd to Sunset Ave',
-        13122: 'IL 47 - Charles Rd to Reed Road ',
-        13123: 'IL 83 - 31st to 55th, 63rd to Central ',
-        13124: 'US 6 - I-55 to US 52',
-        13125: 'US 30 - IL 47 to Albright Rd',
-        13126: 'IL 7/143rd - Will-Cook Rd to IL7',
-        13127: 'IL 47 -  I-90 to Old Plank Rd ',
-        13128: 'IL 56 from IL 25 to IL 59 ',
-        13130: 'IL 60 from IL 120 to IL 176 ',
-        13131: 'IL 31 Front St - IL 120 to IL 176 ',
-        13132: 'Willow Rd from E of I-294 to E of IL 43, from IL 43 to I-94, and over Middle Fork of N Branch of Chicago River to W of Sunset Ridge Rd',
-        13133: 'Willow Rd from E of Des Plaines River to Waterview Dr./Protection Parkway',
-        13134: 'IL 53 from S of IL 56 Butterfield Rd to Park Blvd',
-        13135: 'IL 22 Lake Zurich Rd from Quentin Rd to W of IL 83',
-        13136: 'US 41 Skokie Hwy from Quassey Avenue to 0.5 Miles S of IL 176',
-        13137: 'IL 137 Buckley Rd from IL 83 to Petersen Rd',
-        13139: 'Ill 120 Belvidere Rd - Ashford Ln to US 45',
-        13140: 'US 45 Lake Ave from Rollins Rd to Washington St and US 45 from Washington St to N of IL 120',
-        14109: 'I-55- Weber Road to US 30',
-        14138: 'IL 83 (Barron Blvd.), IL 120 (Belvidere Rd.) to IL 137 & At Atkinson Rd.',
-        14141: 'IL 120 from Wilson Rd to US 41 IL 53/120 Tollway (IL 120 Bypass)',
-        14142: 'US 12 Richmond West Bypass from Wisconsin State Line to IL 31 Tryon Grove Rd',
-        14161: 'I-57 Interchange Improvements',
-        # 32151: 'Metra BNSF Line Improvements',
-        # 33147: 'Metra Electric Line Improvements',
-        # 33148: 'Metra Rock Island Improvements',
-        # 33149: 'Metra SWS Line Improvements',
-        # 33150: 'Metra HC Line Improvements',
-        # 33152: 'Metra UPW Line Improvements',
-        # 33153: 'Metra MDW Line Improvements',
-        # 33154: 'Metra UPNW Line Improvements & Extension',
-        # 33155: 'Metra MDN Line Improvements',
-        # 33156: "Metra O'Hare Express & NCS Line Improvements",
-        # 33157: 'Metra UPN Line Improvements',
-        33158: 'A2 Crossing Modernization',
-        44101: 'North McHenry Fox River Crossing',
-        44102: 'Northern Algonquin Bypass',
-        54103: 'IL 390 Interchange to County Farm Road',
-        54105: '1-88 York Road Interchange Expansion',
-        62143: 'South Lakefront Busway',
-        62159: 'Elston-Armitage Intersection Improvements',
-        62160: 'Devon-Caldwell Intersection Improvements',
-        # 63144: 'AOK Station',
-        # 63145: 'Pink Line Madison Station',
-        # 63146: 'Divison Station'
-    }
-
-
-    def __init__(self, mhn_gdb_path, zone_gdb_path=None, bus_vintage_year=None):
-        arcpy.env.overwriteOutput = True
+    def __init__(self, mhn_gdb_path, zone_gdb_path=None, bus_vintage_year=None, storage=None):
+        if arcpy:
+            arcpy.env.overwriteOutput = True
 
         # -----------------------------------------------------------------------------
         #  SET GDB-SPECIFIC VARIABLES
         # -----------------------------------------------------------------------------
         self.gdb = mhn_gdb_path
-        arcpy.env.workspace = self.gdb
+        if arcpy:
+            arcpy.env.workspace = self.gdb
+
+        # Storage backend, bus vintage year & projection are set on first use (see properties below)
+        self._storage = storage
+        self._requested_bus_vintage_year = bus_vintage_year
+        self._bus_vintage_year = None
+        self._projection = None
 
         # Directories
         self.root_dir = os.path.dirname(self.gdb)
@@ -365,48 +55,11 @@ class MasterHighwayNetwork(object):
             self.src_dir = self.script_dir
             self.util_dir = os.path.join(self.src_dir, 'utilities')
         self.temp_dir = self.ensure_dir(os.path.realpath(os.path.join(self.src_dir, '../temp')))
+        self.path_cache_db = os.path.join(self.temp_dir, 'path_cache.sqlite')  # Used by shortest_path.py
         self.in_dir = os.path.realpath(os.path.join(self.src_dir, '../input'))
         self.mem = 'in_memory'
 
-        #auto-detect bus vintage year, unless specified
-        if not bus_vintage_year:
-            #look for vintages in suffix of itin tables
-            for fl in ['bus_current', 'bus_future']:
-                yr_check = []
-                all_itin = arcpy.ListTables(f'{fl}_itin*')
-                if len(all_itin) == 0:
-                    arcpy.AddError(f'Could not find any {fl}_itin tables in {self.gdb}!')
-                #if there's only one, use it
-                elif len(all_itin) == 1:
-                    yr = all_itin[0].split('_')[-1]
-                    yr_check.append(yr if yr.isdigit() else '')
-                #if more than one vintage, choose one with highest year
-                elif len(all_itin) > 1:
-                    yrs_tot = [y.split('_')[-1] for y in all_itin]
-                    yrs_num = [int(y) for y in yrs_tot if y.isdigit()]
-                    if len(yrs_num) != 0:
-                        yr_check.append(max(yrs_num))
-                    else:
-                        #if all non-numeric, need to specify in init of MHN object
-                        arcpy.AddError('All non-numerical bus datasets, cannot auto-pick. Specify a bus vintage year when creating the MHN object.')
-            #ensure current and future vintages match, else error
-            if len(set(yr_check)) == 1:
-                bus_vintage_year = yr_check[0]
-            else:
-                arcpy.AddError(f'bus_current latest vintage is {yr_check[0]}, and future is {yr_check[1]}. Cannot be different years.')
-
-        bus_vintage_year = str(bus_vintage_year)
-        self.bus_vintage_year = bus_vintage_year
-
-        for fl in ['bus_current', 'bus_future']:
-            ln_fl = os.path.join(self.gdb, f'{fl}_{bus_vintage_year}')
-            itin_fl = os.path.join(self.gdb, f'{fl}_itin_{bus_vintage_year}')
-        if not arcpy.Exists(ln_fl) and arcpy.Exists(itin_fl):
-            arcpy.AddError(f'Bus vintage year {bus_vintage_year} does not exist in MHN!')
-        
-        self.bus_years['current'] = int(bus_vintage_year)  # Set current bus year to the one specified in MHN object init
-        
-        # MHN geodatabase structure, projection
+        # MHN geodatabase structure
         self.hwynet_name = 'hwynet'
         self.hwynet = os.path.join(self.gdb, self.hwynet_name)
         self.arc_name = 'hwynet_arc'
@@ -415,17 +68,8 @@ class MasterHighwayNetwork(object):
         self.node = os.path.join(self.hwynet, self.node_name)
         self.hwyproj = os.path.join(self.hwynet, 'hwyproj')
         self.bus_base = os.path.join(self.hwynet, 'bus_base')
-        self.bus_current = os.path.join(self.hwynet, '_'.join(['bus_current', bus_vintage_year]))
-        self.bus_future = os.path.join(self.hwynet, '_'.join(['bus_future', bus_vintage_year]))
-        self.route_systems = {
-            self.hwyproj: (os.path.join(self.gdb, 'hwyproj_coding'), 'TIPID', None, None),
-            self.bus_base: (os.path.join(self.gdb, 'bus_base_itin'), 'TRANSIT_LINE', 'ITIN_ORDER', 0),
-            self.bus_current: (os.path.join(self.gdb, '_'.join(['bus_current_itin', bus_vintage_year])), 'TRANSIT_LINE', 'ITIN_ORDER', 50000),
-            self.bus_future: (os.path.join(self.gdb, '_'.join(['bus_future_itin', bus_vintage_year])), 'TRANSIT_LINE', 'ITIN_ORDER', 99000),
-        }
         self.pnr_name = 'parknride'
         self.pnr = os.path.join(self.gdb, self.pnr_name)
-        self.projection = arcpy.Describe(self.arc).spatialReference
 
         # Zone geodatabase structure (default to zone_systems.gdb in same dir as MHN gdb)
         if zone_gdb_path:
@@ -451,82 +95,135 @@ class MasterHighwayNetwork(object):
         self.mhn2iris_name = 'mhn2iris'
         self.mhn2iris = os.path.join(self.gdb, self.mhn2iris_name)
 
+        # Session snapshot of MHN datasets, each loaded on first use (see snapshot())
+        self._snapshot = {}
+
         ### End MasterHighwayNetwork.__init__() def ###
         return None
 
 
     # -----------------------------------------------------------------------------
-    #  DEFINE METHODS
+    #  SET GDB-SPECIFIC VARIABLES ON FIRST USE
     # -----------------------------------------------------------------------------
-    @staticmethod
-    def break_path(fullpath):
-        ''' Splits a full-path string into a dictionary, containing 'dir', 'name'
-            and 'ext' values. '''
-        split1 = os.path.split(fullpath)
-        directory = split1[0]
-        filename_ext = split1[1]
-        split2 = os.path.splitext(split1[1])
-        filename = split2[0]
-        extension = split2[1]
-        return {'dir': directory, 'name': filename, 'ext': extension, 'name_ext': filename_ext}
+    @property
+    def storage(self):
+        ''' Storage backend: arcpy for a geodatabase, sqlite3 for a GeoPackage
+            (see storage.py). '''
+        if self._storage is None:
+            self._storage = open_storage(self.gdb)
+        return self._storage
+
+    @property
+    def bus_vintage_year(self):
+        ''' Year suffix of the bus_current/bus_future datasets, as specified
+            when creating the MHN object, or else auto-detected from the itin
+            tables. '''
+        if self._bus_vintage_year is None:
+            bus_vintage_year = self._requested_bus_vintage_year
+
+            #auto-detect bus vintage year, unless specified
+            if not bus_vintage_year:
+                #look for vintages in suffix of itin tables
+                for fl in ['bus_current', 'bus_future']:
+                    yr_check = []
+                    all_itin = self.storage.list_tables(f'{fl}_itin*')
+                    if len(all_itin) == 0:
+                        add_error(f'Could not find any {fl}_itin tables in {self.gdb}!')
+                    #if there's only one, use it
+                    elif len(all_itin) == 1:
+                        yr = all_itin[0].split('_')[-1]
+                        yr_check.append(yr if yr.isdigit() else '')
+                    #if more than one vintage, choose one with highest year
+                    elif len(all_itin) > 1:
+                        yrs_tot = [y.split('_')[-1] for y in all_itin]
+                        yrs_num = [int(y) for y in yrs_tot if y.isdigit()]
+                        if len(yrs_num) != 0:
+                            yr_check.append(max(yrs_num))
+                        else:
+                            #if all non-numeric, need to specify in init of MHN object
+                            add_error('All non-numerical bus datasets, cannot auto-pick. Specify a bus vintage year when creating the MHN object.')
+                #ensure current and future vintages match, else error
+                if len(set(yr_check)) == 1:
+                    bus_vintage_year = yr_check[0]
+                else:
+                    add_error(f'bus_current latest vintage is {yr_check[0]}, and future is {yr_check[1]}. Cannot be different years.')
 
+            bus_vintage_year = str(bus_vintage_year)
 
-    @staticmethod
-    def build_geometry_dict(lyr, key_field):
+            for fl in ['bus_current', 'bus_future']:
+                ln_fl = os.path.join(self.gdb, f'{fl}_{bus_vintage_year}')
+                itin_fl = os.path.join(self.gdb, f'{fl}_itin_{bus_vintage_year}')
+            if not self.storage.exists(ln_fl) and self.storage.exists(itin_fl):
+                add_error(f'Bus vintage year {bus_vintage_year} does not exist in MHN!')
+            self._bus_vintage_year = bus_vintage_year
+        return self._bus_vintage_year
+
+    @property
+    def bus_years(self):
+        ''' MHNCore.bus_years, with the current year set to bus_vintage_year. '''
+        return dict(MHNCore.bus_years, current=int(self.bus_vintage_year))
+
+    @property
+    def bus_current(self):
+        return os.path.join(self.hwynet, '_'.join(['bus_current', self.bus_vintage_year]))
+
+    @property
+    def bus_future(self):
+        return os.path.join(self.hwynet, '_'.join(['bus_future', self.bus_vintage_year]))
+
+    @property
+    def route_systems(self):
+        return {
+            self.hwyproj: (os.path.join(self.gdb, 'hwyproj_coding'), 'TIPID', None, None),
+            self.bus_base: (os.path.join(self.gdb, 'bus_base_itin'), 'TRANSIT_LINE', 'ITIN_ORDER', 0),
+            self.bus_current: (os.path.join(self.gdb, '_'.join(['bus_current_itin', self.bus_vintage_year])), 'TRANSIT_LINE', 'ITIN_ORDER', 50000),
+            self.bus_future: (os.path.join(self.gdb, '_'.join(['bus_future_itin', self.bus_vintage_year])), 'TRANSIT_LINE', 'ITIN_ORDER', 99000),
+        }
+
+    @property
+    def projection(self):
+        ''' Spatial reference of the MHN arcs. '''
+        if self._projection is None:
+            self._projection = self.storage.spatial_reference(self.arc)
+        return self._projection
+
+
+    # -----------------------------------------------------------------------------
+    #  DEFINE METHODS
+    # -----------------------------------------------------------------------------
+    def build_geometry_dict(self, lyr, key_field):
         ''' For an input layer and a key field, returns a dictionary whose values
             are the arcpy geometry objects for the corresponding key. These objects
             can then be fetched by key and strung into a new array -- much faster
             than querying-and-dissolving if creating a large number of features,
             but some time is lost in the creation of this dict, so there is a
-            definite trade-off. '''
-        geom_dict = {}
-        with arcpy.da.SearchCursor(lyr, [key_field, 'SHAPE@']) as cursor:
-            for row in cursor:
-                key = row[0]
-                geom = row[1]
-                geom_dict[key] = arcpy.Array()
-                for part in geom:
-                    for point in part:
-                        geom_dict[key].add(point)
-        return geom_dict
-
+            definite trade-off. (With GeoPackage storage, the values are (n, 2)
+            NumPy arrays of vertices instead.) '''
+        return self.storage.geometry_dict(lyr, key_field)
 
-    def calculate_itin_measures(self, itin_table):
-        ''' Calculates the F_MEAS and T_MEAS values for each row in an itin table,
-            based on the MILES values of the corresponding MHN arc. '''
-        abb_miles_dict = self.make_attribute_dict(self.arc, 'ABB', attr_list=['MILES'])
-        route_miles_dict = {}
 
-        # 1st loop to determine total route lengths.
-        with arcpy.da.SearchCursor(itin_table, ['TRANSIT_LINE', 'ABB']) as cursor:
-            for row in cursor:
-                route = row[0]
-                abb = row[1]
-                if route in route_miles_dict:
-                    route_miles_dict[route] += abb_miles_dict[abb]['MILES']
-                else:
-                    route_miles_dict[route] = abb_miles_dict[abb]['MILES']
+    def build_network_graph(self, where_clause=None, cost_field='MILES', cost_scale=100, include_centroids=False):
+        ''' Build a NetworkGraph of directional links from the MHN arcs meeting
+            an optional SQL query. Arcs with DIRECTIONS > 1 are added in both
+            directions, with a cost of cost_field * cost_scale (default of
+            MILES * 100 matches the units of the SAS link dictionary). '''
+        min_node = None if include_centroids else self.max_poe + 1
+        fields = ['ANODE', 'BNODE', 'DIRECTIONS', cost_field]
+        with self.storage.search(self.arc, fields, where_clause) as cursor:
+            links = [(anode, bnode, directions, cost * cost_scale) for anode, bnode, directions, cost in cursor]
+        return NetworkGraph.from_links(links, min_node)
 
-        # 2nd loop to calculate F_MEAS and T_MEAS for each row.
-        sql = (None, 'ORDER BY TRANSIT_LINE, ITIN_ORDER')
-        with arcpy.da.UpdateCursor(itin_table, ['TRANSIT_LINE', 'ITIN_ORDER', 'ABB', 'F_MEAS', 'T_MEAS'], sql_clause=sql) as cursor:
-            order_tracker = 0
-            cumulative_percent = 0
-            for row in cursor:
-                route = row[0]
-                row_order = row[1]
-                abb = row[2]
-                if row_order == 1:  # Beginning of new route
-                    cumulative_percent = 0
-                segment_length = abb_miles_dict[abb]['MILES']
-                segment_percent = segment_length / route_miles_dict[route] * 100
-                row[3] = cumulative_percent
-                new_cumulative_percent = cumulative_percent + segment_percent
-                row[4] = new_cumulative_percent
-                cursor.updateRow(row)
-                order_tracker = row_order
-                cumulative_percent = new_cumulative_percent
 
+    def calculate_itin_measures(self, itin_table):
+        ''' Calculates the F_MEAS and T_MEAS values for each row in an itin table,
+            based on the MILES values of the corresponding MHN arc. The whole
+            table is read into arrays, the measures calculated with
+            itinerary_arrays.itin_measures(), and written back in one pass. '''
+        oid_field = self.determine_OID_fieldname(itin_table)
+        itin = self.storage.to_numpy(itin_table, [oid_field, 'TRANSIT_LINE', 'ITIN_ORDER', 'ABB'])
+        miles = self.snapshot('arc').lookup('MILES', itin['ABB'])
+        f_meas, t_meas = itin_measures(itin['TRANSIT_LINE'], itin['ITIN_ORDER'], miles)
+        self.update_attributes(itin_table, oid_field, itin[oid_field], {'F_MEAS': f_meas, 'T_MEAS': t_meas})
         return itin_table
 
 
@@ -562,79 +259,75 @@ class MasterHighwayNetwork(object):
             return False
 
 
-    @staticmethod
-    def delete_if_exists(filepath):
-        ''' Check if a file exists, and delete it if so. '''
-        if arcpy.Exists(filepath):
-            arcpy.Delete_management(filepath)
+    def copy_selected_rows(self, table, key_field, keys, out_table, field_list=None, exclude=False):
+        ''' Copy the rows of a feature class/table whose key_field value is one
+            of keys (or, if exclude is True, is not), with the fields in
+            field_list (default: all editable fields), to a new feature
+            class/table with the same fields (e.g. in memory), for use instead
+            of a SQL "key_field IN (...)" query. Rows are filtered by set
+            membership, so the number of keys doesn't affect the query. '''
+        keys = set(keys)
+        table_fields = [f.name for f in self.storage.editable_fields(table)]
+        if field_list is None:
+            fields = table_fields
+        else:
+            fields = [f for f in field_list if f in table_fields]
+        self.storage.copy_schema(table, out_table)
+        if self.storage.geometry_type(table):
+            fields = ['SHAPE@'] + fields
+        with self.storage.search(table, [key_field] + fields) as in_cursor:
+            with self.storage.insert(out_table, fields) as out_cursor:
+                for row in in_cursor:
+                    if (row[0] in keys) != exclude:
+                        out_cursor.insertRow(row[1:])
+        return out_table
+
+
+    def copy_snapshot_features(self, dataset, rows, out_fc, field_list):
+        ''' Copy the features of the selected rows (a boolean array or row
+            indices) of a snapshot() dataset with geometry ('arc' or 'node'),
+            with the fields in field_list, to a new feature class (e.g. in
+            memory). Features are matched to the rows by set membership of
+            their OIDs, rather than a SQL query. '''
+        fc = self.snapshot_source(dataset)[0]
+        oid_field = self.determine_OID_fieldname(fc)
+        oids = self.snapshot(dataset)[oid_field][rows].tolist()
+        return self.copy_selected_rows(fc, 'OID@', oids, out_fc, field_list)
+
+
+    def delete_if_exists(self, filepath):
+        ''' Check if a dataset or file exists, and delete it if so. '''
+        if self.storage.exists(filepath):
+            self.storage.delete(filepath)
+            message = '{} successfully deleted.'.format(filepath)
+        elif os.path.isfile(filepath):
+            os.remove(filepath)
             message = '{} successfully deleted.'.format(filepath)
         else:
             message = '{} does not exist.'.format(filepath)
         return message
 
 
-    @staticmethod
-    def determine_arc_bearing(line_geom):
-        ''' Determines the cardinal direction of a single arc, determined from its
-            two endpoints. The angle is determined by the atan2() function, and
-            after some numeric manipulation is then used to select the correct
-            cardinal direction from an ordered list of possibilities. '''
-        from math import atan2, degrees, floor
-        x1 = line_geom.firstPoint.X
-        y1 = line_geom.firstPoint.Y
-        x2 = line_geom.lastPoint.X
-        y2 = line_geom.lastPoint.Y
-        xdiff = x2 - x1
-        ydiff = y2 - y1
-        angle = degrees(atan2(ydiff, xdiff))
-        index = int(floor(((angle + 22.5) % 360) / 45))
-        cardinal_dirs = ('E', 'NE', 'N', 'NW', 'W', 'SW', 'S', 'SE')  # Order here is critical
-        bearing = cardinal_dirs[index]
-        return bearing
-
-
-    @staticmethod
-    def determine_OID_fieldname(fc):
+    def determine_OID_fieldname(self, fc):
         ''' Determines the Object ID fieldname for the specified fc/table. '''
-        return arcpy.Describe(fc).OIDFieldName
-
-
-    @staticmethod
-    def determine_tolltype(vdf, cost):
-        ''' Automatically determine TOLLTYPE code, based on link's VDF and
-            toll cost. '''
-        if cost > 0:
-            if vdf == '7':
-                tolltype = '1'  # Fixed cost toll (i.e. toll plaza)
-            else:
-                tolltype = '2'  # Per-mile rate (i.e. distance-based tolling)
-        else:
-            tolltype = '0'  # N/A (not tolled)
-        return tolltype
+        return self.storage.oid_field(fc)
 
 
     @staticmethod
     def die(error_message=''):
         ''' End processing prematurely. '''
-        arcpy.AddError('\n{}\n'.format(error_message))
+        add_error('\n{}\n'.format(error_message))
         sys.exit()
         return None
 
 
-    @staticmethod
-    def ensure_dir(directory):
-        ''' Checks for the existence of a directory, creating it if it doesn't
-            exist yet. '''
-        if not os.path.exists(directory):
-            os.makedirs(directory)
-        return directory
-
-
     @staticmethod
     def find_shortest_path(graph, start, end):
-        ''' Recursive function written by Chris Laffra to find shortest path
-            between 2 nodes in a graph; implementation of Dijkstra's algorithm.
-            Based on <http://code.activestate.com/recipes/119466/#c6>.
+        ''' Find the shortest path between 2 nodes in a graph, using Dijkstra's
+            algorithm. The graph may be a NetworkGraph (see
+            MHN.build_network_graph()) or a dict-of-dicts of link costs, which
+            will be converted to a NetworkGraph first. Returns (cost, path), or
+            None if there is no path.
 
             Example graph dictionary (sub-dicts contain distances):
 
@@ -645,19 +338,22 @@ class MasterHighwayNetwork(object):
                  'y': {'a': 9, 'w': 2, 'x': 10, 'z': 11},
                  'z': {'b': 6, 'x': 15, 'y': 11}}
         '''
-        import heapq
-        queue = [(0, start, [])]
-        seen = set()
-        while True:
-            (p_cost, node, path) = heapq.heappop(queue)
-            if node not in seen:
-                path = path + [node]
-                seen.add(node)
-                if node == end:
-                    return p_cost, path
-                if node in graph.keys():
-                    for (b_node, b_cost) in graph[node].items():
-                        heapq.heappush(queue, (p_cost + b_cost, b_node, path))
+        return find_shortest_path(graph, start, end)
+
+
+    def get_path_cache_totals(self):
+        ''' Return the cumulative (hits, misses) of the shortest path cache
+            used by shortest_path.py. '''
+        with PathCache(self.path_cache_db) as cache:
+            return cache.totals()
+
+
+    def report_path_cache(self, start_totals):
+        ''' Report the shortest path cache hits & misses since start_totals
+            (from get_path_cache_totals()) were recorded. '''
+        hits, misses = (now - then for now, then in zip(self.get_path_cache_totals(), start_totals))
+        add_message('\nShortest path cache: {0} hits, {1} misses.'.format(hits, misses))
+        return (hits, misses)
 
 
     def get_yearless_hwyproj(self):
@@ -665,30 +361,22 @@ class MasterHighwayNetwork(object):
             TIPIDs. '''
         common_id_field = self.route_systems[self.hwyproj][1]
         invalid_year_query = "{0} = 0 OR {0} IS NULL".format('COMPLETION_YEAR')
-        invalid_year_lyr = self.make_skinny_table_view(self.hwyproj, 'invalid_year_lyr', ['COMPLETION_YEAR', common_id_field], invalid_year_query)
-        invalid_year_count = int(arcpy.GetCount_management(invalid_year_lyr).getOutput(0))
-        if invalid_year_count > 0:
-            return [row[0] for row in arcpy.da.SearchCursor(invalid_year_lyr, [common_id_field])]
-        else:
-            return []
-
-
-    @staticmethod
-    def is_tipid(in_str):
-        ''' Check whether a string is a properly formatted TIPID. '''
-        is_tipid = False
-        try:
-            if len(in_str) == 10:
-                pt1, pt2, pt3 = (int(pt) for pt in in_str.split('-'))
-                if (0 <= pt1 <= 99) and (0 <= pt2 <= 99) and (0 <= pt3 <= 9999):
-                    return True
-        except:
-            pass
-        return is_tipid
+        with self.storage.search(self.hwyproj, [common_id_field], invalid_year_query) as cursor:
+            return [row[0] for row in cursor]
+
+
+    def invalidate_snapshot(self, *datasets):
+        ''' Discard the snapshot() of the specified datasets (all of them, if
+            none are specified), so that they are re-read on next use. Call
+            this after editing any of them. '''
+        for dataset in (datasets or list(self._snapshot)):
+            self._snapshot.pop(dataset, None)
+            if dataset == 'arc':
+                self._snapshot.pop('arc_geometry', None)
+        return None
 
 
-    @staticmethod
-    def make_attribute_dict(fc, key_field, attr_list=['*']):
+    def make_attribute_dict(self, fc, key_field, attr_list=['*']):
         ''' Create a dictionary of feature class/table attributes, using OID as the
             key. Default of ['*'] for attr_list (instead of actual attribute names)
             will create a dictionary of all attributes.
@@ -697,27 +385,42 @@ class MasterHighwayNetwork(object):
             - NOTE 2: using attr_list=[] will essentially build a list of unique
               key_field values. '''
         attr_dict = {}
-        fc_fields = [f.name for f in arcpy.ListFields(fc) if f.type != 'Geometry']
+        fc_fields = [f.name for f in self.storage.list_fields(fc) if f.type != 'Geometry']
         if attr_list == ['*']:
             valid_fields = fc_fields
         else:
             valid_fields = [f for f in attr_list if f in fc_fields]
         # Ensure that key_field is always the first field in the field list
         cursor_fields = [key_field] + list(set(valid_fields) - set([key_field]))
-        with arcpy.da.SearchCursor(fc, cursor_fields) as cursor:
+        with self.storage.search(fc, cursor_fields) as cursor:
             for row in cursor:
                 attr_dict[row[0]] = dict(zip(cursor.fields, row))
         return attr_dict
 
 
-    @staticmethod
-    def make_path(directory, filename, extension=''):
-        ''' Combines a directory, name and optional extension to create a full-path
-            string for a file. '''
-        fullpath = os.path.join(directory, filename)
-        if extension != '':
-            fullpath += '.' + extension.lstrip('.')  # Guarantee 1 (and only 1) '.' in front of extension
-        return fullpath
+    def make_attribute_table(self, fc, key_field, attr_list=['*'], where_clause=None, null_value=None):
+        ''' Create a columnar AttributeTable of feature class/table attributes
+            (one NumPy array per field), keyed by key_field, as a more compact
+            and faster to build alternative to make_attribute_dict(), whose
+            attributes can be looked up for whole arrays of keys at once.
+            - NOTE: if null_value is specified, the table is read with
+              arcpy.da.TableToNumPyArray(), replacing NULLs with null_value.
+              Otherwise it is read with a cursor, so that NULLs are kept (as
+              None, in object arrays) and can be written back unchanged. '''
+        fc_fields = [f.name for f in self.storage.list_fields(fc) if f.type != 'Geometry']
+        if attr_list == ['*']:
+            valid_fields = fc_fields
+        else:
+            valid_fields = [f for f in attr_list if f in fc_fields]
+        # Ensure that key_field is always the first field in the field list
+        table_fields = [key_field] + [f for f in valid_fields if f != key_field]
+        if null_value is not None:
+            records = self.storage.to_numpy(fc, table_fields, where_clause, null_value=null_value)
+            return AttributeTable.from_records(records, key_field)
+        with self.storage.search(fc, table_fields, where_clause) as cursor:
+            rows = [row for row in cursor]
+        columns = [list(column) for column in zip(*rows)] if rows else [[] for f in table_fields]
+        return AttributeTable(dict(zip(table_fields, (np.array(c) for c in columns))), key_field)
 
 
     @staticmethod
@@ -748,31 +451,110 @@ class MasterHighwayNetwork(object):
         return self.make_skinny(False, table, view, keep_fields_list, where_clause)
 
 
-    @staticmethod
-    def set_nulls(value, fc, fields):
-        ''' Recalculate all null values in a list of specified fields to a
-            specified replacement value. '''
-        if type(value) is str:
-            valid_types = ['String']
-        else:
-            valid_types = ['String', 'SmallInteger', 'Integer', 'Single', 'Double']
-        matched_fields = [f for f in arcpy.ListFields(fc) if f.name in fields and f.type in valid_types]
-        for field in matched_fields:
+    def replace_nulls(self, fc, field_values):
+        ''' Replace all null values in specified fields with a replacement value
+            for each, given as a {field: value} dict. String fields whose
+            value is 0 also have blanks ('' or ' ') replaced (with '0'), and
+            fields of other types are only replaced with numeric values.
+            Every field is updated in a single UpdateCursor pass over the rows
+            with anything to replace. Returns a {field: count} dict of the
+            number of values replaced in each field. '''
+        fields = []
+        null_values = []
+        new_values = []
+        where_clauses = []
+        for field in self.storage.list_fields(fc):
+            if field.name not in field_values:
+                continue
+            value = field_values[field.name]
             if field.type == 'String':
-                expression = "'{}'".format(value)
                 if value == 0:
-                    null_sql = "{0} IS NULL OR {0} IN ('', ' ')".format(field.name)  # Replace blanks, too
+                    null_values.append((None, '', ' '))  # Replace blanks, too
+                    where_clauses.append("{0} IS NULL OR {0} IN ('', ' ')".format(field.name))
                 else:
-                    null_sql = "{} IS NULL".format(field.name)
+                    null_values.append((None,))
+                    where_clauses.append("{} IS NULL".format(field.name))
+                new_values.append(str(value))
+            elif field.type in ('SmallInteger', 'Integer', 'Single', 'Double') and type(value) is not str:
+                null_values.append((None,))
+                where_clauses.append("{} IS NULL".format(field.name))
+                new_values.append(value)
             else:
-                expression = "{}".format(value)
-                null_sql = "{} IS NULL".format(field.name)
-            null_view = 'null_view'
-            arcpy.MakeTableView_management(fc, null_view, null_sql)
-            if int(arcpy.GetCount_management(null_view).getOutput(0)) > 0:
-                arcpy.CalculateField_management(null_view, field.name, expression, 'PYTHON')
-            arcpy.Delete_management(null_view)
-        return fc
+                continue
+            fields.append(field.name)
+        counts = dict.fromkeys(fields, 0)
+        if not fields:
+            return counts
+        with self.storage.update(fc, fields, ' OR '.join(where_clauses)) as cursor:
+            for row in cursor:
+                replaced = False
+                for i, field in enumerate(fields):
+                    if row[i] in null_values[i]:
+                        row[i] = new_values[i]
+                        counts[field] += 1
+                        replaced = True
+                if replaced:
+                    cursor.updateRow(row)
+        return counts
+
+
+    def select_completed_projects(self, year):
+        ''' Return a boolean array of the hwyproj snapshot() rows completed by
+            a year, i.e. "COMPLETION_YEAR" <= year (and not NULL). '''
+        hwyproj = self.snapshot('hwyproj')
+        known_year = hwyproj.notnull('COMPLETION_YEAR')
+        completion_year = np.where(known_year, hwyproj['COMPLETION_YEAR'], 0).astype(int)
+        return known_year & (completion_year <= int(year))
+
+
+    def select_rows(self, dataset, field, keys):
+        ''' Return a boolean array of the rows of a snapshot() dataset whose
+            field value is one of keys (any iterable, converted to the type of
+            the field), for use instead of a SQL "field IN (...)" query. The
+            cached column is tested for set membership, so the number of keys
+            doesn't affect the query. '''
+        column = self.snapshot(dataset)[field]
+        keys = list(keys)
+        if not keys:
+            return np.zeros(len(column), dtype=bool)
+        if column.dtype == object:  # Field with NULLs
+            key_set = set(keys)
+            return np.array([value in key_set for value in column.tolist()], dtype=bool)
+        return np.isin(column, np.asarray(keys).astype(column.dtype))
+
+
+    def select_scenario_network(self, projects):
+        ''' For a boolean array of selected hwyproj snapshot() rows (e.g. from
+            select_completed_projects()), return (coding, arcs): boolean arrays
+            of the coding snapshot rows of those projects, and of the arc
+            snapshot rows of the network they are applied to -- all baselinks,
+            plus the skeleton links used by their coding. '''
+        hwyproj_id_field = self.route_systems[self.hwyproj][1]
+        project_ids = self.snapshot('hwyproj').keys[projects].tolist()
+        coding = self.select_rows('coding', hwyproj_id_field, project_ids)
+        project_arcs = set(self.snapshot('coding')['ABB'][coding].tolist())
+        arcs = self.snapshot('arc')['BASELINK'] == '1'
+        arcs |= self.select_rows('arc', 'ABB', (abb for abb in project_arcs if abb[-1] != '1'))
+        return (coding, arcs)
+
+
+    def select_table_rows(self, table, field_list, key_field, keys, where_clause=None):
+        ''' Return a list of the field_list values of the rows of a feature
+            class/table (or view) whose key_field value is one of keys, for use
+            instead of a SQL "key_field IN (...)" query on a table with no
+            snapshot() (e.g. a route system's itineraries). A cursor is
+            filtered by set membership, so the number of keys doesn't affect
+            the query. '''
+        keys = set(keys)
+        with self.storage.search(table, [key_field] + list(field_list), where_clause) as cursor:
+            return [row[1:] for row in cursor if row[0] in keys]
+
+
+    def set_nulls(self, value, fc, fields):
+        ''' Recalculate all null values in a list of specified fields to a
+            specified replacement value, with replace_nulls(). Returns a
+            {field: count} dict of the number of values replaced. '''
+        return self.replace_nulls(fc, dict((field, value) for field in fields))
 
     # Wrapper functions for set_nulls()
     def set_nulls_to_space(self, fc, fields):
@@ -781,6 +563,43 @@ class MasterHighwayNetwork(object):
         return self.set_nulls(0, fc, fields)
 
 
+    def snapshot(self, dataset):
+        ''' Return an AttributeTable of all the attributes of an MHN dataset:
+            'arc' (keyed by ABB), 'node' (NODE), 'hwyproj' (TIPID) or 'coding'
+            (the hwyproj coding table, keyed by OID). Each is read once, on
+            first use, and shared by all methods for the rest of the session,
+            until invalidate_snapshot() is called. Fields with NULL values
+            are object arrays, containing None. '''
+        if dataset not in self._snapshot:
+            fc, key_field = self.snapshot_source(dataset)
+            self._snapshot[dataset] = self.make_attribute_table(fc, key_field)
+        return self._snapshot[dataset]
+
+
+    def snapshot_source(self, dataset):
+        ''' Return the (feature class/table, key field) of a snapshot()
+            dataset. '''
+        if dataset == 'arc':
+            return (self.arc, 'ABB')
+        if dataset == 'node':
+            return (self.node, 'NODE')
+        coding_table, common_id_field = self.route_systems[self.hwyproj][:2]
+        if dataset == 'hwyproj':
+            return (self.hwyproj, common_id_field)
+        if dataset == 'coding':
+            return (coding_table, self.determine_OID_fieldname(coding_table))
+        raise ValueError('No snapshot of "{}" (use one of arc, coding, hwyproj, node).'.format(dataset))
+
+
+    def snapshot_geometry(self):
+        ''' Return build_geometry_dict(self.arc, 'ABB'), built once per session
+            (until invalidate_snapshot('arc') is called). The arcpy.Arrays
+            (or vertex arrays) are shared, so must not be modified. '''
+        if 'arc_geometry' not in self._snapshot:
+            self._snapshot['arc_geometry'] = self.build_geometry_dict(self.arc, 'ABB')
+        return self._snapshot['arc_geometry']
+
+
     def submit_sas(self, sas_file, sas_log, sas_lst, arg_list=None):
         ''' Calls a specified SAS program with optional arguments specified in a
             $-separated string. '''
@@ -799,56 +618,22 @@ class MasterHighwayNetwork(object):
         return subprocess.check_call(cmd, startupinfo=startupinfo)
 
 
-    @staticmethod
-    def timestamp(ts_format='%Y%m%d%H%M%S'):
-        ''' Creates a timestamp string, defaulting to the form YYYYMMDDHHMMSS, but
-            any standard date formatting is accepted. See docs for details:
-            <http://docs.python.org/2/library/datetime.html#strftime-strptime-behavior>.
-
-            %a day of week, using locale's abbreviated weekday names
-            %A day of week, using locale's full weekday names
-            %b,%h month, using locale's abbreviated month names
-            %B month, using locale's full month names #%c date and time as %x %X
-            %d day of month (01-31)
-            %H hour (00-23)
-            %I hour (00-12)
-            %j day number of year (001-366)
-            %m month number (01-12)
-            %M minute (00-59)
-            %p locale's equivalent of AM or PM, whichever is appropriate
-            %r time as %I:%M:%S %p
-            %S seconds (00-59)
-            %U week number of year (01-52), Sunday is the first day of the week
-            %w day of week; Sunday is day 0
-            %W week number of year (01-52), Monday is the first
-            %x date, using locale's date format
-            %X time, using locale's time format
-            %y year within century (00-99)
-            %Y year, including century (for example, 1994)
-            %Z time zone abbreviation
-        '''
-        from datetime import datetime
-        ts = datetime.now().strftime(ts_format)
-        return ts
-
-
-    def tipid_from_int(self, n):
-        ''' Format an integer < 100,000,000 as a TIPID string. '''
-        try:
-            n_str = str(int(n)).zfill(8)
-            tipid = '-'.join([n_str[:2], n_str[2:4], n_str[4:]])
-        except:
-            return None
-        return tipid if self.is_tipid(tipid) else None
-
-
-    def tipid_to_int(self, tipid):
-        ''' Convert a TIPID string to an integer. '''
-        if self.is_tipid(tipid):
-            n_str = tipid.replace('-', '')
-            return int(n_str)
-        else:
-            return None
+    def update_attributes(self, table, oid_field, oids, values):
+        ''' Write new attribute values to the rows of a table, in a single
+            UpdateCursor pass. values is a {field: array} dict of equal-length
+            arrays, giving the new values for the rows with the corresponding
+            oids; other rows are left unchanged. Returns the number of rows
+            updated. '''
+        fields = list(values)
+        columns = [np.asarray(values[field]).tolist() for field in fields]
+        new_values = dict(zip(np.asarray(oids).tolist(), zip(*columns)))
+        updated = 0
+        with self.storage.update(table, [oid_field] + fields) as cursor:
+            for row in cursor:
+                if row[0] in new_values:
+                    cursor.updateRow((row[0],) + new_values[row[0]])
+                    updated += 1
+        return updated
 
 
     def validate_itin_times(self, itin_table):
@@ -856,51 +641,31 @@ class MasterHighwayNetwork(object):
             values for each row in an itin table, based on the MILES values
             of the corresponding MHN arc and the original DEP_TIME/ARR_TIME
             values themselves. Any segments where ARR_TIME = DEP_TIME will
-            have travel time estimated by distance of link, at 30mph. '''
-        abb_miles_dict = self.make_attribute_dict(self.arc, 'ABB', attr_list=['MILES'])
-
-        # Loop to update times for each row, as appropriate
-        sql = (None, 'ORDER BY TRANSIT_LINE, ITIN_ORDER')
-        cursor_fields = ['TRANSIT_LINE', 'ITIN_ORDER', 'ABB', 'DEP_TIME', 'ARR_TIME', 'LINE_SERV_TIME']
-        with arcpy.da.UpdateCursor(itin_table, cursor_fields, sql_clause=sql) as cursor:
-            prev_arr_time = 0
-            for row in cursor:
-                route = row[0]
-                row_order = row[1]
-                abb = row[2]
-                dep_time = row[3]
-                arr_time = row[4]
-                ltime = row[5]
-
-                # Adjust dep_time & arr_time to accommodate changes to last segment
-                if row_order > 1 and dep_time < prev_arr_time:
-                    discrep_d = prev_arr_time - dep_time
-                    dep_time += discrep_d
-                    if arr_time < dep_time:
-                        discrep_a = dep_time - arr_time  # Likely = discrep_d, but may be lower
-                        arr_time += discrep_a
-
-                # Re-estimate segment travel time (@ 30mph) when dep_time = arr_time
-                if dep_time == arr_time:
-                    segment_length = abb_miles_dict[abb]['MILES']
-                    time_est = int(round(segment_length / 30 * 60 * 60))  # Seconds
-                    arr_time += time_est
-                    ltime = max(round(time_est / 60., 1), 0.1)  # Minutes (1 d.p.)
-
-                # Update row with adjusted values and update prev_arr_time
-                row[3:6] = [dep_time, arr_time, ltime]
-                cursor.updateRow(row)
-                prev_arr_time = arr_time
-
+            have travel time estimated by distance of link, at 30mph. The
+            times are calculated for the whole table at once with
+            itinerary_arrays.itin_times(), and changed rows written back in
+            one pass. '''
+        oid_field = self.determine_OID_fieldname(itin_table)
+        time_fields = ['DEP_TIME', 'ARR_TIME', 'LINE_SERV_TIME']
+        null_values = {'LINE_SERV_TIME': -1}  # Written back as NULL, unless re-estimated
+        itin = self.storage.to_numpy(
+            itin_table, [oid_field, 'TRANSIT_LINE', 'ITIN_ORDER', 'ABB'] + time_fields, null_value=null_values
+        )
+        miles = self.snapshot('arc').lookup('MILES', itin['ABB'], default=np.nan)
+        try:
+            new_times = itin_times(itin['TRANSIT_LINE'], itin['ITIN_ORDER'], *[itin[f] for f in time_fields], miles=miles)
+        except KeyError as row:
+            raise KeyError(itin['ABB'][row.args[0]])  # Segment needing an estimate has an unknown ABB
+        changed, values = changed_itin_values(
+            [itin[f] for f in time_fields], new_times, [null_values.get(f) for f in time_fields]
+        )
+        self.update_attributes(itin_table, oid_field, itin[oid_field][changed], dict(zip(time_fields, values)))
         return itin_table
 
 
     def write_arc_flag_file(self, flag_file, flag_query, csv_mode=False):
         ''' Create a file containing l=anode,bnode rows for all directional links
             meeting a specified criterion. '''
-        self.delete_if_exists(flag_file)
-        flag_lyr = 'flag_lyr'
-        arcpy.MakeFeatureLayer_management(self.arc, flag_lyr, flag_query)
         with open(flag_file, 'w') as w:
             if csv_mode:
                 row_prefix = ''
@@ -908,7 +673,7 @@ class MasterHighwayNetwork(object):
             else:
                 row_prefix = 'l='
                 w.write('~# {} links\n'.format(flag_query.strip()))
-            with arcpy.da.SearchCursor(flag_lyr, ['ANODE', 'BNODE', 'DIRECTIONS']) as cursor:
+            with self.storage.search(self.arc, ['ANODE', 'BNODE', 'DIRECTIONS'], flag_query) as cursor:
                 for row in cursor:
                     anode = row[0]
                     bnode = row[1]
@@ -916,25 +681,85 @@ class MasterHighwayNetwork(object):
                     w.write('{0}{1},{2}\n'.format(row_prefix, anode, bnode))
                     if directions > 1:
                         w.write('{0}{2},{1}\n'.format(row_prefix, anode, bnode))
-        arcpy.Delete_management(flag_lyr)
         return flag_file
 
 
-    @staticmethod
-    def write_attribute_csv(in_obj, textfile, field_list=None, include_headers=True):
+    def write_arc_flag_files(self, flags, out_dir, csv_mode=False, rows=None, descriptions=None):
+        ''' Write a file of l=anode,bnode rows (or ANODE,BNODE in csv_mode) for
+            each of a {name: predicate} dict of flags, to {name}.flag (or
+            {name}.csv) in out_dir. Each predicate is a function of the
+            snapshot('arc') AttributeTable, returning a boolean array of the
+            arcs to flag, e.g. lambda arcs: arcs['CHIBLVD'] == 1. All of them
+            are evaluated over the one snapshot, rather than a feature layer
+            per flag. Two-way arcs are written in both directions, as in
+            write_arc_flag_file(). rows optionally restricts the arcs to a
+            selection (e.g. the arcs mask of select_scenario_network()).
+            descriptions optionally gives the text of a flag's "~# ... links"
+            header (e.g. the query it replaces), which is otherwise its name.
+            Returns a {name: flag file} dict. '''
+        arcs = self.snapshot('arc')
+        selected = np.ones(len(arcs), dtype=bool) if rows is None else np.zeros(len(arcs), dtype=bool)
+        if rows is not None:
+            selected[rows] = True
+        anodes = arcs['ANODE']
+        bnodes = arcs['BNODE']
+        two_way = arcs['DIRECTIONS'].astype(int) > 1
+        if descriptions is None:
+            descriptions = {}
+        flag_files = {}
+        for name, predicate in flags.items():
+            flagged = np.flatnonzero(selected & np.asarray(predicate(arcs), dtype=bool))
+            # Interleave each arc's (anode, bnode) with its reverse, keeping the reverse of two-way arcs only
+            links = np.empty((2 * len(flagged), 2), dtype=anodes.dtype)
+            links[0::2, 0] = links[1::2, 1] = anodes[flagged]
+            links[0::2, 1] = links[1::2, 0] = bnodes[flagged]
+            keep = np.ones(len(links), dtype=bool)
+            keep[1::2] = two_way[flagged]
+            flag_file = os.path.join(out_dir, '{0}.{1}'.format(name, 'csv' if csv_mode else 'flag'))
+            with open(flag_file, 'w') as w:
+                if csv_mode:
+                    row_prefix = ''
+                    w.write('ANODE,BNODE\n')
+                else:
+                    row_prefix = 'l='
+                    w.write('~# {} links\n'.format(descriptions.get(name, name).strip()))
+                template = row_prefix + '%s,%s\n'
+                w.write(''.join([template % tuple(link) for link in links[keep].tolist()]))
+            flag_files[name] = flag_file
+        return flag_files
+
+
+    def write_attribute_csv(self, in_obj, textfile, field_list=None, include_headers=True, key_field=None, keys=None):
         ''' Write attributes of a feature class/table to a specified text file.
             Input field_list allows output field order to be specified. Defaults to
-            all non-shape fields. '''
-        valid_field_names = [f.name for f in arcpy.ListFields(in_obj) if f.name != '' and f.type != 'Geometry']
+            all non-shape fields. If keys is specified, only the rows whose
+            key_field value is one of them are written (see
+            select_table_rows()). Rows are formatted & written in chunks by
+            table_export.write_rows(). '''
+        valid_field_names = [f.name for f in self.storage.list_fields(in_obj) if f.name != '' and f.type != 'Geometry']
         if not field_list:
             fields = valid_field_names
         else:
             fields = [f for f in field_list if f in valid_field_names]
-        csv = open(textfile,'w')
-        if include_headers:
-            csv.write(','.join(fields) + '\n')
-        with arcpy.da.SearchCursor(in_obj, fields) as cursor:
-            for row in cursor:
-                csv.write(','.join(map(str, row)) + '\n')
-        csv.close()
+        with open(textfile, 'w') as w:
+            if include_headers:
+                w.write(','.join(fields) + '\n')
+            if keys is not None:
+                write_rows(self.select_table_rows(in_obj, fields, key_field, keys), w)
+            else:
+                with self.storage.search(in_obj, fields) as cursor:
+                    write_rows(cursor, w)
+        return textfile
+
+
+    def write_snapshot_csv(self, dataset, rows, textfile, field_list, include_headers=True):
+        ''' Write the attributes of the selected rows (a boolean array or row
+            indices) of a snapshot() dataset to a text file, in the same format
+            as write_attribute_csv(), without querying the dataset again. '''
+        table = self.snapshot(dataset)
+        fields = [f for f in field_list if f in table.columns]
+        with open(textfile, 'w') as w:
+            if include_headers:
+                w.write(','.join(fields) + '\n')
+            write_rows(zip(*[table[field][rows].tolist() for field in fields]), w)
         return textfile
@@ -0,0 +1,174 @@
+#!/usr/bin/env python
+'''
+    attribute_table.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    A columnar alternative to the dict-of-dicts built by
+    MHN.make_attribute_dict(): one NumPy array per field, plus a sorted index
+    of the key field, so that the attributes of a whole array of keys can be
+    looked up at once. Build one from a feature class/table with
+    MHN.make_attribute_table().
+
+    Compared to a dict-of-dicts, which holds a dict (and a Python object per
+    value) for every row, each row costs only the bytes of its values. Run
+    this script to measure the build time, memory and lookup time of both on
+    a synthetic table the size of the MHN arcs:
+
+      attribute_table.py [row_count]
+
+'''
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+
+class AttributeTable(object):
+    ''' Columns of feature class/table attributes, keyed by one of them. '''
+
+    def __init__(self, columns, key_field):
+        ''' columns is a {field: array} dict of equal-length arrays, one of
+            which is key_field, whose values must be unique. '''
+        self.columns = dict((field, np.asarray(values)) for field, values in columns.items())
+        self.key_field = key_field
+        self.fields = list(self.columns)
+        keys = self.columns[key_field]
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_keys = keys[self._order]
+        if len(keys) > 1 and np.any(self._sorted_keys[1:] == self._sorted_keys[:-1]):
+            raise ValueError('{} values are not unique.'.format(key_field))
+
+    @classmethod
+    def from_records(cls, records, key_field):
+        ''' Build a table from a NumPy structured array, e.g. the output of
+            arcpy.da.TableToNumPyArray(). Each field is copied to its own
+            contiguous array. '''
+        return cls(dict((field, np.ascontiguousarray(records[field])) for field in records.dtype.names), key_field)
+
+    def __len__(self):
+        return len(self._order)
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __contains__(self, key):
+        return bool(self.contains([key])[0])
+
+    @property
+    def keys(self):
+        return self.columns[self.key_field]
+
+    @property
+    def nbytes(self):
+        ''' Bytes used by the columns and key index. '''
+        return sum(values.nbytes for values in self.columns.values()) + self._order.nbytes + self._sorted_keys.nbytes
+
+    def contains(self, keys):
+        ''' Return a boolean array of whether each of keys is in the table. '''
+        keys = np.asarray(keys)
+        if len(self) == 0:
+            return np.zeros(keys.shape, dtype=bool)
+        position = np.minimum(np.searchsorted(self._sorted_keys, keys), len(self) - 1)
+        return self._sorted_keys[position] == keys
+
+    def notnull(self, field):
+        ''' Return a boolean array of whether each row's field value is not
+            NULL (None, in an object array). '''
+        values = self.columns[field]
+        if values.dtype != object:
+            return np.ones(values.shape, dtype=bool)
+        return np.array([value is not None for value in values.tolist()], dtype=bool)
+
+    def rows(self, keys, missing=None):
+        ''' Return the row index of each of keys. Keys not in the table raise
+            a KeyError, unless missing is specified, in which case their index
+            is missing (e.g. -1). '''
+        keys = np.asarray(keys)
+        found = self.contains(keys)
+        if len(self):
+            rows = self._order[np.minimum(np.searchsorted(self._sorted_keys, keys), len(self) - 1)]
+        else:
+            rows = np.zeros(keys.shape, dtype=np.intp)
+        if not found.all():
+            if missing is None:
+                raise KeyError(keys[~found][0])
+            rows = np.where(found, rows, missing)
+        return rows
+
+    def lookup(self, field, keys, default=None):
+        ''' Return an array of field's values for each of keys. Keys not in
+            the table raise a KeyError, unless default is specified, in which
+            case their value is default. '''
+        keys = np.asarray(keys)
+        if default is None:
+            return self.columns[field][self.rows(keys)]
+        found = self.contains(keys)
+        values = self.columns[field][self.rows(keys, missing=0)] if len(self) else np.empty(keys.shape, self.columns[field].dtype)
+        return np.where(found, values, default)
+
+    def get(self, key, field, default=None):
+        ''' Return field's value for a single key, or default if it is not in
+            the table. '''
+        row = self.rows([key], missing=-1)[0]
+        return default if row < 0 else self.columns[field][row:row + 1].tolist()[0]
+
+    def record(self, key):
+        ''' Return a {field: value} dict of a single key's row, like an item
+            of MHN.make_attribute_dict(). Keys not in the table raise a
+            KeyError. '''
+        row = self.rows([key])[0]
+        return dict((field, values[row:row + 1].tolist()[0]) for field, values in self.columns.items())
+
+    def to_dict(self):
+        ''' Return the same dict-of-dicts as MHN.make_attribute_dict(). '''
+        columns = [self.columns[field].tolist() for field in self.fields]
+        return dict(
+            (row[self.fields.index(self.key_field)], dict(zip(self.fields, row)))
+            for row in zip(*columns)
+        )
+
+
+# -----------------------------------------------------------------------------
+#  Compare to a dict-of-dicts.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    row_count = int(sys.argv[1]) if len(sys.argv) > 1 else 60000
+    rng = np.random.default_rng(0)
+    fields = ['ABB', 'ANODE', 'BNODE', 'DIRECTIONS', 'MILES', 'THRULANES1', 'TYPE1']
+    anodes = 5001 + np.arange(row_count) // 3
+    bnodes = rng.integers(5001, 30000, row_count)
+    abbs = np.array(['{}-{}-{}'.format(a, b, i % 3) for i, (a, b) in enumerate(zip(anodes, bnodes))])
+    cursor_rows = list(zip(
+        abbs.tolist(), anodes.tolist(), bnodes.tolist(), rng.integers(1, 4, row_count).tolist(),
+        rng.random(row_count).tolist(), rng.integers(1, 5, row_count).tolist(), rng.integers(1, 8, row_count).tolist()
+    ))
+    records = np.array(cursor_rows, dtype=[
+        ('ABB', abbs.dtype), ('ANODE', 'i4'), ('BNODE', 'i4'), ('DIRECTIONS', 'i2'),
+        ('MILES', 'f8'), ('THRULANES1', 'i2'), ('TYPE1', 'i2')
+    ])
+    lookup_keys = abbs[rng.integers(0, row_count, row_count)]
+
+    def build_dict():
+        return dict((row[0], dict(zip(fields, row))) for row in cursor_rows)  # As make_attribute_dict()
+
+    def build_table():
+        return AttributeTable.from_records(records, 'ABB')
+
+    for name, build in (('dict-of-dicts', build_dict), ('AttributeTable', build_table)):
+        start_time = time.perf_counter()
+        table = build()
+        build_seconds = time.perf_counter() - start_time
+        tracemalloc.start()
+        table = build()
+        peak_mb = tracemalloc.get_traced_memory()[1] / 1048576.
+        tracemalloc.stop()
+        start_time = time.perf_counter()
+        if isinstance(table, dict):
+            miles = np.array([table[abb]['MILES'] for abb in lookup_keys.tolist()])
+        else:
+            miles = table.lookup('MILES', lookup_keys)
+        lookup_seconds = time.perf_counter() - start_time
+        print('{0:<15} {1:>8.3f} s build {2:>8.1f} MB {3:>8.3f} s for {4} lookups'.format(
+            name, build_seconds, peak_mb, lookup_seconds, row_count))
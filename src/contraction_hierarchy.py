@@ -0,0 +1,351 @@
+#!/usr/bin/env python
+'''
+    contraction_hierarchy.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    A contraction hierarchy (CH) for answering many shortest path queries on a
+    fixed NetworkGraph, e.g. a scenario/TOD highway network while its transit
+    itineraries are being processed.
+
+    Building the hierarchy contracts nodes in turn (least important first),
+    adding shortcut links between each node's remaining neighbors wherever it
+    lies on their only shortest path. A query is then a bidirectional Dijkstra
+    search that only ever moves "up" the hierarchy, settling a few hundred
+    nodes instead of a large part of the network. Shortcuts remember the node
+    they bypass, so that full paths can be unpacked. Path costs are identical
+    to Dijkstra's, although equal-cost ties may be broken differently.
+
+    Hierarchies are saved to binary files (memory-mapped when loaded, like
+    NetworkGraph.save()/load()) that record a fingerprint of the graph they
+    were built from, so that one built for an older network is never used.
+
+'''
+from __future__ import print_function  # Keep in case system Python is 2.x
+import heapq
+import mmap
+import struct
+import sys
+from array import array
+from network_graph import INF, array_bytes, map_section
+
+WITNESS_SETTLE_LIMIT = 100  # Max nodes settled by each witness search during build
+ESTIMATE_SETTLE_LIMIT = 5  # ... when only estimating a node's priority
+CORE_DEGREE = 100  # Leave nodes uncontracted once the next has this many links
+CH_MAGIC = b'MHNCHIER'
+CH_VERSION = 1
+CH_HEADER = struct.Struct('<8sII40sII')  # magic, version, nodes, graph fingerprint, up links, down links
+
+
+class ContractionHierarchy(object):
+    ''' Upward (forward search) and downward (backward search) CSR graphs of
+        original links and shortcuts, indexed like the NetworkGraph they were
+        built from. For up, targets[k] is the B-node of link k from the row's
+        node; for down, targets[k] is the A-node of link k into the row's
+        node. middles[k] is the node bypassed by a shortcut (-1 for original
+        links). '''
+
+    def __init__(self, rank, up, down, fingerprint):
+        self.rank = rank  # Contraction order of each node index
+        self.up_offsets, self.up_targets, self.up_costs, self.up_middles = up
+        self.down_offsets, self.down_targets, self.down_costs, self.down_middles = down
+        self.fingerprint = fingerprint  # NetworkGraph.fingerprint(coordinates=False)
+        self.last_settled = 0
+        self.ch_file = None  # Binary hierarchy file matching this hierarchy, if any
+        return None
+
+    @property
+    def node_count(self):
+        return len(self.rank)
+
+    @property
+    def link_count(self):
+        return len(self.up_targets) + len(self.down_targets)
+
+
+    # -------------------------------------------------------------------------
+    #  Preprocessing
+    # -------------------------------------------------------------------------
+    @classmethod
+    def build(cls, graph, witness_limit=WITNESS_SETTLE_LIMIT, estimate_limit=ESTIMATE_SETTLE_LIMIT,
+              core_degree=CORE_DEGREE):
+        ''' Build a hierarchy for a NetworkGraph. Nodes are contracted in order
+            of priority: twice the edge difference (shortcuts added minus links
+            removed), plus the number of neighbors already contracted and the
+            node's depth in the hierarchy. Neighbors' priorities are
+            re-estimated (with witness searches limited to estimate_limit
+            settled nodes) after each contraction, and a node's priority is
+            recomputed when it comes off the queue. Witness searches are
+            limited to witness_limit settled nodes, which can only add
+            unnecessary shortcuts, never omit needed ones.
+
+            Once the next node to contract has core_degree or more links, the
+            remaining nodes are left uncontracted as the "core" at the top of
+            the hierarchy, with all of their links in both search graphs.
+            Contracting the densely connected last few nodes would otherwise
+            take most of the build time for little query speed-up. '''
+        n = graph.node_count
+        out = [dict() for i in range(n)]
+        inn = [dict() for i in range(n)]
+        offsets, targets, costs = graph.offsets, graph.targets, graph.costs
+        for u in range(n):
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                if v != u and costs[k] < out[u].get(v, INF):
+                    out[u][v] = inn[v][u] = costs[k]
+        middle = {}
+
+        heappush, heappop = heapq.heappush, heapq.heappop
+
+        def find_shortcuts(v, limit=witness_limit):
+            ''' Return the (u, w, cost) shortcuts needed to contract v. '''
+            shortcuts = []
+            outs = out[v]
+            if not outs:
+                return shortcuts
+            for u, u_cost in inn[v].items():
+                candidates = [(w, u_cost + w_cost) for w, w_cost in outs.items() if w != u]
+                if not candidates:
+                    continue
+                max_cost = max(cost for w, cost in candidates)
+                dist = {u: 0}
+                dist_get = dist.get
+                queue = [(0, u)]
+                settled = 0
+                unsettled = len(candidates)  # Stop once every possible shortcut target is settled
+                while queue and settled < limit:
+                    d, x = heappop(queue)
+                    if d > dist[x]:
+                        continue
+                    if d > max_cost:
+                        break
+                    settled += 1
+                    if x in outs and x != u:
+                        unsettled -= 1
+                        if not unsettled:
+                            break
+                    for y, cost in out[x].items():
+                        y_cost = d + cost
+                        if y_cost < dist_get(y, INF) and y != v:
+                            dist[y] = y_cost
+                            heappush(queue, (y_cost, y))
+                for w, cost in candidates:
+                    if dist_get(w, INF) > cost:
+                        shortcuts.append((u, w, cost))
+            return shortcuts
+
+        contracted_neighbors = [0] * n
+        level = [0] * n  # Depth of each node in the hierarchy so far
+        def priority(v, shortcuts):
+            edge_difference = len(shortcuts) - len(inn[v]) - len(out[v])
+            return 2 * edge_difference + contracted_neighbors[v] + level[v]
+
+        current = [priority(v, find_shortcuts(v, estimate_limit)) for v in range(n)]
+        queue = [(p, v) for v, p in enumerate(current)]
+        heapq.heapify(queue)
+        rank = array('i', [0]) * n
+        up_links = [None] * n
+        down_links = [None] * n
+        order = 0
+        while queue:
+            p, v = heapq.heappop(queue)
+            if out[v] is None or p != current[v]:
+                continue  # Already contracted, or superseded by a newer priority
+            shortcuts = find_shortcuts(v)
+            current[v] = priority(v, shortcuts)
+            if queue and current[v] > queue[0][0]:
+                heapq.heappush(queue, (current[v], v))  # Priority was stale; try again later
+                continue
+            if len(out[v]) + len(inn[v]) >= core_degree:
+                break
+            rank[v] = order
+            order += 1
+            up_links[v] = [(w, cost, middle.get((v, w), -1)) for w, cost in out[v].items()]
+            down_links[v] = [(u, cost, middle.get((u, v), -1)) for u, cost in inn[v].items()]
+            neighbors = set(out[v]) | set(inn[v])
+            for w in out[v]:
+                del inn[w][v]
+            for u in inn[v]:
+                del out[u][v]
+            out[v] = inn[v] = None
+            for u, w, cost in shortcuts:
+                if cost < out[u].get(w, INF):
+                    out[u][w] = inn[w][u] = cost
+                    middle[(u, w)] = v
+            for x in neighbors:
+                contracted_neighbors[x] += 1
+                level[x] = max(level[x], level[v] + 1)
+                current[x] = priority(x, find_shortcuts(x, estimate_limit))
+                heapq.heappush(queue, (current[x], x))
+
+        for v in range(n):
+            if out[v] is not None:
+                rank[v] = order  # Core nodes share the top rank
+                up_links[v] = [(w, cost, middle.get((v, w), -1)) for w, cost in out[v].items()]
+                down_links[v] = [(u, cost, middle.get((u, v), -1)) for u, cost in inn[v].items()]
+
+        def to_csr(links):
+            offsets = array('i', [0])
+            targets, costs, middles = array('i'), array('d'), array('i')
+            for row in links:
+                for target, cost, mid in sorted(row):
+                    targets.append(target)
+                    costs.append(cost)
+                    middles.append(mid)
+                offsets.append(len(targets))
+            return (offsets, targets, costs, middles)
+
+        return cls(rank, to_csr(up_links), to_csr(down_links), graph.fingerprint(coordinates=False))
+
+
+    # -------------------------------------------------------------------------
+    #  Queries
+    # -------------------------------------------------------------------------
+    def query(self, source, target):
+        ''' Find the shortest path between node indices source and target.
+            Returns (cost, [source, ..., target]) with node indices, or None
+            if target cannot be reached. The number of nodes settled is stored
+            in self.last_settled. '''
+        if source == target:
+            self.last_settled = 0
+            return (0, [source])
+        up = (self.up_offsets, self.up_targets, self.up_costs)
+        down = (self.down_offsets, self.down_targets, self.down_costs)
+        sides = ((up, down), (down, up))  # (links to search, links to check for stalling)
+        dist = ({source: 0}, {target: 0})
+        pred = ({source: (-1, -1)}, {target: (-1, -1)})
+        queues = ([(0, source)], [(0, target)])
+        best = INF
+        meet = -1
+        settled = 0
+        while True:
+            f_min = queues[0][0][0] if queues[0] else INF
+            b_min = queues[1][0][0] if queues[1] else INF
+            if min(f_min, b_min) >= best:
+                break
+            side = 0 if f_min <= b_min else 1
+            d, u = heapq.heappop(queues[side])
+            s_dist = dist[side]
+            if d > s_dist[u]:
+                continue
+            settled += 1
+            if u in dist[1 - side] and d + dist[1 - side][u] < best:
+                best = d + dist[1 - side][u]
+                meet = u
+            (offsets, targets, costs), (s_offsets, s_targets, s_costs) = sides[side]
+            # Stall on demand: if a higher node reached u more cheaply via a
+            # link this search cannot use, u is not on a shortest path.
+            stalled = False
+            for k in range(s_offsets[u], s_offsets[u + 1]):
+                if s_dist.get(s_targets[k], INF) + s_costs[k] < d:
+                    stalled = True
+                    break
+            if stalled:
+                continue
+            s_pred, queue = pred[side], queues[side]
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                v_cost = d + costs[k]
+                if v_cost < s_dist.get(v, INF):
+                    s_dist[v] = v_cost
+                    s_pred[v] = (u, k)
+                    heapq.heappush(queue, (v_cost, v))
+        self.last_settled = settled
+        if meet < 0:
+            return None
+
+        # Walk back from the meeting node to the source along up links, then
+        # forward to the target along down links, unpacking shortcuts.
+        links = []
+        node = meet
+        while node != source:
+            u, k = pred[0][node]
+            links.append((u, node, self.up_middles[k]))
+            node = u
+        links.reverse()
+        node = meet
+        while node != target:
+            v, k = pred[1][node]
+            links.append((node, v, self.down_middles[k]))
+            node = v
+        path = [source]
+        for link in links:
+            self._unpack(link, path)
+        return (best, path)
+
+    def _unpack(self, link, path):
+        ''' Append the nodes of a (possibly shortcut) link, excluding its
+            A-node, to path. A shortcut a->b bypassing m consists of links a->m
+            (in m's down row) and m->b (in m's up row). '''
+        stack = [link]
+        while stack:
+            a, b, m = stack.pop()
+            if m < 0:
+                path.append(b)
+                continue
+            a_link = self._find(self.down_offsets, self.down_targets, m, a)
+            b_link = self._find(self.up_offsets, self.up_targets, m, b)
+            stack.append((m, b, self.up_middles[b_link]))
+            stack.append((a, m, self.down_middles[a_link]))
+        return path
+
+    @staticmethod
+    def _find(offsets, targets, row, target):
+        for k in range(offsets[row], offsets[row + 1]):
+            if targets[k] == target:
+                return k
+        raise ValueError('Contraction hierarchy is missing a shortcut link.')
+
+
+    # -------------------------------------------------------------------------
+    #  Binary hierarchy files
+    # -------------------------------------------------------------------------
+    def save(self, ch_file):
+        ''' Write the hierarchy to a binary file that can be memory-mapped by
+            ContractionHierarchy.load(). '''
+        sections = [array('i', self.rank),
+                    array('i', self.up_offsets), array('i', self.up_targets),
+                    array('d', self.up_costs), array('i', self.up_middles),
+                    array('i', self.down_offsets), array('i', self.down_targets),
+                    array('d', self.down_costs), array('i', self.down_middles)]
+        with open(ch_file, 'wb') as w:
+            w.write(CH_HEADER.pack(
+                CH_MAGIC, CH_VERSION, len(self.rank), self.fingerprint.encode('ascii'),
+                len(self.up_targets), len(self.down_targets)
+            ))
+            for section in sections:
+                if sys.byteorder != 'little':
+                    section.byteswap()
+                data = array_bytes(section)
+                w.write(data)
+                w.write(b'\0' * (-len(data) % 8))
+        self.ch_file = ch_file
+        return ch_file
+
+    @classmethod
+    def load(cls, ch_file):
+        ''' Memory-map a binary hierarchy file written by save(). '''
+        with open(ch_file, 'rb') as r:
+            mm = mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < CH_HEADER.size:
+            raise ValueError('{0} is not a contraction hierarchy file.'.format(ch_file))
+        magic, version, n, fingerprint, m_up, m_down = CH_HEADER.unpack_from(mm, 0)
+        if magic != CH_MAGIC or version != CH_VERSION:
+            raise ValueError('{0} is not a version {1} contraction hierarchy file.'.format(ch_file, CH_VERSION))
+        if sys.byteorder != 'little':
+            raise ValueError('Contraction hierarchy files can only be memory-mapped on little-endian systems.')
+        pos = [CH_HEADER.size]
+        def section(typecode, count):
+            size = struct.calcsize(typecode) * count
+            start = pos[0]
+            if start + size > len(mm):
+                raise ValueError('{0} is truncated.'.format(ch_file))
+            pos[0] += size + (-size % 8)
+            return map_section(mm, typecode, start, size)
+        rank = section('i', n)
+        up = (section('i', n + 1), section('i', m_up), section('d', m_up), section('i', m_up))
+        down = (section('i', n + 1), section('i', m_down), section('d', m_down), section('i', m_down))
+        ch = cls(rank, up, down, fingerprint.decode('ascii'))
+        ch._mmap = mm  # Keep the mapping open for the life of the hierarchy
+        ch.ch_file = ch_file
+        return ch
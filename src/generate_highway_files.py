@@ -11,6 +11,7 @@
 
 '''
 import os
+import time
 import arcpy
 # from operator import itemgetter
 import numpy as np
@@ -109,8 +110,10 @@ MHN.delete_if_exists(sas1_lst)
 # -----------------------------------------------------------------------------
 if create_tollsys_flag or abm_output:
     arcpy.AddMessage('\nGenerating tollsys.flag file...')
-    tollsys_flag = os.path.join(hwy_path, 'tollsys.flag')
-    MHN.write_arc_flag_file(tollsys_flag, '"TOLLSYS" = 1')
+    arc_flags = {
+        'tollsys': lambda arcs: arcs['TOLLSYS'] == 1,
+    }
+    tollsys_flag = MHN.write_arc_flag_files(arc_flags, hwy_path, descriptions={'tollsys': '"TOLLSYS" = 1'})['tollsys']
 
 # -----------------------------------------------------------------------------
 # Generate any scenario-independent, ABM-specific files, if desired.
@@ -141,15 +144,15 @@ arcpy.AddMessage('\nChecking for conflicting highway project coding '
 hwyproj_id_field = MHN.route_systems[MHN.hwyproj][1]
 
 # Export projects with valid completion years.
+# (Projects, coding & arcs are selected from the session snapshot, rather
+# than queried with IN-lists of their IDs.)
 overlap_year_attr = [hwyproj_id_field, 'COMPLETION_YEAR']
-overlap_year_query = '"COMPLETION_YEAR" NOT IN (0,9999)'
-overlap_year_view = MHN.make_skinny_table_view(
-    MHN.hwyproj, 'overlap_year_view', 
-    overlap_year_attr, overlap_year_query)
-MHN.write_attribute_csv(overlap_year_view, overlap_year_csv, 
-                        overlap_year_attr)
-overlap_projects = [r[0] for r in arcpy.da.SearchCursor(overlap_year_view, [hwyproj_id_field])]
-arcpy.Delete_management(overlap_year_view)
+known_year = MHN.snapshot('hwyproj').notnull('COMPLETION_YEAR')
+completion_year = np.where(known_year, MHN.snapshot('hwyproj')['COMPLETION_YEAR'], 0).astype(int)
+overlap_projects = known_year & ~np.isin(completion_year, [0, 9999])  # "COMPLETION_YEAR" NOT IN (0,9999)
+MHN.write_snapshot_csv('hwyproj', overlap_projects, overlap_year_csv,
+                       overlap_year_attr)
+overlap_coding, overlap_arcs = MHN.select_scenario_network(overlap_projects)
 
 # Export coding for valid projects.
 overlap_transact_attr = [
@@ -160,16 +163,9 @@ overlap_transact_attr = [
     'ADD_PARKLANES2', 'ADD_SIGIC', 'ADD_CLTL', 'ADD_RRGRADECROSS',
     'NEW_TOLLDOLLARS', 'NEW_MODES', 'ABB', 'REP_ANODE', 'REP_BNODE'
 ]
-overlap_transact_query = ''' "{}" IN ('{}') '''.format(
-    hwyproj_id_field, "','".join((hwyproj_id for hwyproj_id in overlap_projects)))
-overlap_transact_view = MHN.make_skinny_table_view(
-    MHN.route_systems[MHN.hwyproj][0], 'overlap_transact_view', 
-    overlap_transact_attr, overlap_transact_query)
-MHN.write_attribute_csv(
-    overlap_transact_view, overlap_transact_csv, 
+MHN.write_snapshot_csv(
+    'coding', overlap_coding, overlap_transact_csv,
     overlap_transact_attr)
-overlap_project_arcs = [r[0] for r in arcpy.da.SearchCursor(overlap_transact_view, ['ABB'])]
-arcpy.Delete_management(overlap_transact_view)
 
 # Export base year arc attributes.
 overlap_network_attr = [
@@ -178,15 +174,9 @@ overlap_network_attr = [
     'THRULANEWIDTH1', 'THRULANEWIDTH2', 'PARKLANES1', 'PARKLANES2', 
     'SIGIC', 'CLTL', 'RRGRADECROSS', 'TOLLDOLLARS', 'MODES', 'MILES'
 ]
-overlap_network_query = ''' "BASELINK" = '1' OR "ABB" IN ('{}') '''.format(
-    "','".join((abb for abb in overlap_project_arcs if abb[-1] != '1')))
-overlap_network_view = MHN.make_skinny_table_view(
-    MHN.arc, 'overlap_network_view',
-    overlap_network_attr, overlap_network_query)
-MHN.write_attribute_csv(
-    overlap_network_view, overlap_network_csv, 
+MHN.write_snapshot_csv(
+    'arc', overlap_arcs, overlap_network_csv,
     overlap_network_attr)
-arcpy.Delete_management(overlap_network_view)
 
 # Process attribute tables with coding_overlap.sas.
 sas1_sas = ''.join((MHN.src_dir, '/', sas1_name, '.sas'))
@@ -206,6 +196,15 @@ else:
 # -----------------------------------------------------------------------------
 #  Write data relevant to specified scenario and pass to SAS for processing.
 # -----------------------------------------------------------------------------
+# Projects and their coding are read once, from the session snapshot, rather
+# than queried again for every scenario.
+hwyproj_table = MHN.snapshot('hwyproj')
+coding_table = MHN.snapshot('coding')
+
+def snapshot_frame(table, fields, rows):
+    ''' Return a DataFrame of the specified fields of a snapshot table, for
+        the selected rows (a boolean mask or an array of row indices). '''
+    return pd.DataFrame(dict((field, table[field][rows]) for field in fields))
 
 for scen in scen_list:
     # Set scenario-specific parameters.
@@ -214,9 +213,9 @@ for scen in scen_list:
         scen_path = MHN.ensure_dir(os.path.join(hwy_path, scen)) #for output location
         sas2_log = os.path.join(hwy_path, f'{sas2_name}_{scen}.log')
         sas2_lst = os.path.join(hwy_path, f'{sas2_name}_{scen}.lst')
-        projects_query = f'''TIPID IN ('{"','".join(tipid for tipid in nobuild_tipids)}')'''
+        hwy_projects = MHN.select_rows('hwyproj', hwyproj_id_field, nobuild_tipids)
         if rsp_number.isnumeric():
-            projects_query += f'OR "{rsp_column}" = {rsp_number}'
+            hwy_projects |= (hwyproj_table[rsp_column] == int(rsp_number))
         scen_message = 'Generating highway files...'
         
     else:
@@ -224,7 +223,7 @@ for scen in scen_list:
         scen_path = MHN.ensure_dir(os.path.join(hwy_path, scen))
         sas2_log = os.path.join(hwy_path, f'{sas2_name}_{scen}.log')
         sas2_lst = os.path.join(hwy_path, f'{sas2_name}_{scen}.lst')
-        projects_query = f'"COMPLETION_YEAR" <= {scen_year}'
+        hwy_projects = MHN.select_completed_projects(scen_year)
         scen_message = 'Generating Scenario {} ({}) highway files...'.format(scen, scen_year)
         
     hwy_year_csv = os.path.join(scen_path, 'year.csv')
@@ -240,13 +239,12 @@ for scen in scen_list:
     MHN.delete_if_exists(hwy_nodes_csv)
     
     arcpy.AddMessage(scen_message)  
+    export_start = time.time()
     
     # Export coding for highway projects completed by scenario year.
     hwy_year_attr = [hwyproj_id_field, 'COMPLETION_YEAR']
-    hwy_year_view = MHN.make_skinny_table_view(MHN.hwyproj, 'hwy_year_view', hwy_year_attr, projects_query)
-    MHN.write_attribute_csv(hwy_year_view, hwy_year_csv, hwy_year_attr)
-    hwy_projects = [r for r in arcpy.da.SearchCursor(hwy_year_view, [hwyproj_id_field, 'COMPLETION_YEAR'])]
-    arcpy.Delete_management(hwy_year_view)
+    MHN.write_snapshot_csv('hwyproj', hwy_projects, hwy_year_csv, hwy_year_attr)
+    hwy_coding, hwy_arcs = MHN.select_scenario_network(hwy_projects)
 
     hwy_transact_attr = [
         hwyproj_id_field, 'ACTION_CODE', 'NEW_DIRECTIONS', 'NEW_TYPE1', 
@@ -256,18 +254,9 @@ for scen in scen_list:
         'ADD_PARKLANES2', 'ADD_SIGIC', 'ADD_CLTL', 'ADD_RRGRADECROSS', 
         'NEW_TOLLDOLLARS', 'NEW_MODES', 'TOD', 'ABB', 'REP_ANODE', 'REP_BNODE'
     ]
-    hwy_transact_query = ''' "{}" IN ('{}') '''.format(
-        hwyproj_id_field, 
-        "','".join((hwyproj_id for hwyproj_id, comp_year in hwy_projects))
-        )
-    hwy_transact_view = MHN.make_skinny_table_view(
-        MHN.route_systems[MHN.hwyproj][0], 'hwy_transact_view', 
-        hwy_transact_attr, hwy_transact_query)
-    MHN.write_attribute_csv(
-        hwy_transact_view, hwy_transact_csv, 
+    MHN.write_snapshot_csv(
+        'coding', hwy_coding, hwy_transact_csv,
         hwy_transact_attr)
-    hwy_abb = [r[0] for r in arcpy.da.SearchCursor(hwy_transact_view, ['ABB'])]
-    arcpy.Delete_management(hwy_transact_view)
 
     # Export arc & node attributes of all baselinks and skeletons used in
     # projects completed by scenario year.
@@ -278,26 +267,18 @@ for scen in scen_list:
         'PARKRES1', 'PARKRES2', 'SIGIC', 'CLTL', 'RRGRADECROSS', 'TOLLDOLLARS', 
         'MODES', 'CHIBLVD', 'TRUCKRES', 'VCLEARANCE', 'MILES'
         ]
-    abb_lst = (abb for abb in hwy_abb if abb[-1] != '1')
-    hwy_network_query = f'''"BASELINK" = '1' OR "ABB" IN ('{"','".join(abb_lst)}')'''
-    hwy_network_lyr = MHN.make_skinny_feature_layer(
-        MHN.arc, 'hwy_network_lyr', 
-        hwy_network_attr, hwy_network_query)
-    MHN.write_attribute_csv(hwy_network_lyr, hwy_network_csv, 
-                            hwy_network_attr)
-    hwy_abb_2 = [r[0] for r in arcpy.da.SearchCursor(hwy_network_lyr, ['ABB'])]
+    MHN.write_snapshot_csv('arc', hwy_arcs, hwy_network_csv,
+                           hwy_network_attr)
+    hwy_abb_2 = MHN.snapshot('arc').keys[hwy_arcs].tolist()
 
     hwy_anodes = [abb.split('-')[0] for abb in hwy_abb_2]
     hwy_bnodes = [abb.split('-')[1] for abb in hwy_abb_2]
     hwy_nodes_list = list(set(hwy_anodes).union(set(hwy_bnodes)))
     hwy_nodes_attr = ['NODE', 'POINT_X', 'POINT_Y', MHN.zone_attr, 
                       MHN.capzone_attr, MHN.imarea_attr]
-    hwy_nodes_query = f'"NODE" IN ({",".join(hwy_nodes_list)})'
-    hwy_nodes_view = MHN.make_skinny_table_view(
-        MHN.node, 'hwy_nodes_view', 
-        hwy_nodes_attr, hwy_nodes_query)
-    MHN.write_attribute_csv(hwy_nodes_view, hwy_nodes_csv, hwy_nodes_attr)
-    arcpy.Delete_management(hwy_nodes_view)
+    hwy_nodes = MHN.select_rows('node', 'NODE', hwy_nodes_list)
+    MHN.write_snapshot_csv('node', hwy_nodes, hwy_nodes_csv, hwy_nodes_attr)
+    arcpy.AddMessage('-- Scenario {} attributes exported in {:.1f} seconds.'.format(scen, time.time() - export_start))
 
     # Process attribute tables with generate_highway_files_2.sas.
     sas2_sas = os.path.join(MHN.src_dir, f'{sas2_name}.sas')
@@ -343,22 +324,19 @@ for scen in scen_list:
     #SEE COMMENTED SECTION BELOW FOR CODE BEGINNINGS
     
     scen_rsp_tipids = {}
-    scen_rsp_query = f''' "COMPLETION_YEAR" <= {scen_year} AND "RSP_ID" IS NOT NULL '''
-    with arcpy.da.SearchCursor(MHN.hwyproj, ['RSP_ID', hwyproj_id_field], scen_rsp_query) as c:
-        for rsp_id, tipid in c:
-            if rsp_id not in scen_rsp_tipids:
-                scen_rsp_tipids[rsp_id] = set([tipid])
-            else:
-                scen_rsp_tipids[rsp_id].add(tipid)
+    scen_rsp = MHN.select_completed_projects(scen_year) & hwyproj_table.notnull('RSP_ID')
+    for rsp_id, tipid in zip(hwyproj_table['RSP_ID'][scen_rsp].tolist(), hwyproj_table.keys[scen_rsp].tolist()):
+        if rsp_id not in scen_rsp_tipids:
+            scen_rsp_tipids[rsp_id] = set([tipid])
+        else:
+            scen_rsp_tipids[rsp_id].add(tipid)
 
     rsp_stats = os.path.join(scen_path, 'rsp_stats.csv')
     with open(rsp_stats, 'w') as w:
         w.write(f'RSP_ID,RSP_NAME,MAINLINE_LANEMILES\n')
         for rsp_id in sorted(scen_rsp_tipids.keys()):
-            rsp_query = ''' "{}" IN ('{}') '''.format(hwyproj_id_field, "','".join(scen_rsp_tipids[rsp_id]))
-            sc = arcpy.da.SearchCursor(MHN.route_systems[MHN.hwyproj][0], 
-                                       ['ABB'], rsp_query)
-            rsp_ab = set((r[0].rsplit('-', 1)[0] for r in sc))
+            rsp_coding = MHN.select_rows('coding', hwyproj_id_field, scen_rsp_tipids[rsp_id])
+            rsp_ab = set((abb.rsplit('-', 1)[0] for abb in coding_table['ABB'][rsp_coding].tolist()))
             rsp_lanemiles = sum((mainline_lanemiles[ab] for ab in rsp_ab if ab in mainline_lanemiles))
             w.write('{},{},{}\n'.format(rsp_id, MHN.rsps[rsp_id], rsp_lanemiles))
 
@@ -448,8 +426,11 @@ for scen in scen_list:
         arcpy.Delete_management(arcs_mem_flipped)
         return linkshape
 
-    scen_linkshape = generate_linkshape(hwy_network_lyr, scen_path)
-    arcpy.Delete_management(hwy_network_lyr)
+    hwy_network_fc = MHN.copy_snapshot_features(
+        'arc', hwy_arcs, os.path.join(MHN.mem, 'hwy_network'),
+        hwy_network_attr)
+    scen_linkshape = generate_linkshape(hwy_network_fc, scen_path)
+    arcpy.Delete_management(hwy_network_fc)
     arcpy.AddMessage('-- Scenario {} highway.linkshape generated successfully.\n'.format(scen))
     
 
@@ -463,37 +444,25 @@ if rsp_eval:
             os.remove(sl_dir)
 
         proj_id_field = MHN.route_systems[MHN.hwyproj][1] #TIPID
-        tipid_yr = arcpy.da.TableToNumPyArray(
-            in_table = MHN.hwyproj,
-            field_names=[proj_id_field,'COMPLETION_YEAR'],
-            where_clause=f'"{rsp_column}" = {rsp_number}'
-        )
-
-        tipid_yr.sort(order='COMPLETION_YEAR')
-        tipid = list(tipid_yr[proj_id_field])
+        rsp_projects = hwyproj_table[rsp_column] == int(rsp_number)
+        tipid_yr = sorted(zip(hwyproj_table['COMPLETION_YEAR'][rsp_projects].tolist(),
+                              hwyproj_table.keys[rsp_projects].tolist()))
+        tipid = [t for yr, t in tipid_yr]
 
         arcpy.AddMessage(f"  - TIPID(s) for RSP {rsp_number}: \n{', '.join(t for t in tipid)}")
 
 
-        tipid_q = f''' TIPID IN ('{"','".join(t for t in tipid)}') '''
-        action_q = "ACTION_CODE IN ('1','2','4')"
-        proj_coding = arcpy.da.TableToNumPyArray(
-            in_table = MHN.route_systems[MHN.hwyproj][0],
-            field_names=['ABB', 'REP_ANODE', 'REP_BNODE', 'TIPID', 'ACTION_CODE', 'NEW_DIRECTIONS'],
-            where_clause= f'{tipid_q} AND {action_q}'''
+        proj_coding = snapshot_frame(
+            coding_table,
+            ['ABB', 'REP_ANODE', 'REP_BNODE', 'TIPID', 'ACTION_CODE', 'NEW_DIRECTIONS'],
+            MHN.select_rows('coding', 'TIPID', tipid) & MHN.select_rows('coding', 'ACTION_CODE', ['1', '2', '4'])
             )
-        
-        proj_coding = pd.DataFrame(proj_coding)
+        arc_table = MHN.snapshot('arc')
         
         #get directions info on baselinks that were modified/added, join to coding
         proj_coding_add_modify = proj_coding.loc[proj_coding['ACTION_CODE'].astype(int).isin([1,4])]
         add_mod_lks = proj_coding_add_modify['ABB'].unique().tolist()
-        add_mod_lks = arcpy.da.TableToNumPyArray(
-            in_table = MHN.arc,
-            field_names=['ABB', 'DIRECTIONS'],
-            where_clause=f''' ABB IN ('{"','".join(add_mod_lks)}')'''
-        )
-        add_mod_lks = pd.DataFrame(add_mod_lks)
+        add_mod_lks = snapshot_frame(arc_table, ['ABB', 'DIRECTIONS'], MHN.select_rows('arc', 'ABB', add_mod_lks))
         proj_coding_add_modify = pd.merge(proj_coding_add_modify, add_mod_lks, on='ABB', how='left')
         proj_coding_add_modify['DIRECTIONS'] = np.where(
             proj_coding_add_modify['NEW_DIRECTIONS'].astype(str).str.strip() == '0',
@@ -513,12 +482,7 @@ if rsp_eval:
         proj_coding_replace['ABB_REP'] = proj_coding_replace['REP_ANODE'].astype(str) + '-' + proj_coding_replace['REP_BNODE'].astype(str) + '-1' #make abb for replaced
         arcpy.AddMessage(f'links that are replaced: {proj_coding_replace["ABB_REP"].unique().tolist()}')
         lks_replace = proj_coding_replace['ABB_REP'].unique().tolist()
-        lks_replace = arcpy.da.TableToNumPyArray(
-            in_table = MHN.arc,
-            field_names=['ABB', 'DIRECTIONS'],
-            where_clause=f'''ABB IN ('{"','".join(lks_replace)}')'''
-        )
-        lks_replace = pd.DataFrame(lks_replace)
+        lks_replace = snapshot_frame(arc_table, ['ABB', 'DIRECTIONS'], MHN.select_rows('arc', 'ABB', lks_replace))
         lks_replace.rename(columns={'ABB': 'ABB_REP'}, inplace=True)
         proj_coding_replace = pd.merge(proj_coding_replace, lks_replace, on='ABB_REP', how='left')
         proj_coding_replace = proj_coding_replace[['ABB', 'DIRECTIONS']]
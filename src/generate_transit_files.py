@@ -23,7 +23,9 @@ import os
 import re
 import operator
 import arcpy
+import numpy as np
 from MHN import MasterHighwayNetwork  # Custom class for MHN processing functionality
+import gtfs_representative_runs
 
 # -----------------------------------------------------------------------------
 #  Set parameters.
@@ -57,6 +59,7 @@ if not os.path.exists(tran_path):
     MHN.die("{} contains no transit folder! Please run the Master Rail Network's Create Emme Scenario Files tool first.".format(root_path))
 
 sas1_name = 'gtfs_reformat_feed'
+rep_runs_engine = 'sas'  # Representative runs from 'sas' (gtfs_reformat_feed.sas), 'python' (gtfs_representative_runs.py) or 'both' (SAS, checked against Python)
 sas2_name = 'generate_transit_files_2'
 sas3_name = 'generate_transit_files_3'
 
@@ -106,6 +109,8 @@ oneline_itin_txt = os.path.join(MHN.temp_dir, 'oneline_itin.txt')  # gtfs_collap
 feed_groups_txt = os.path.join(MHN.temp_dir, 'feed_groups.txt')    # gtfs_collapse_routes.py output file
 missing_links_csv = os.path.join(MHN.temp_dir, 'missing_bus_links.csv')
 link_dict_txt = os.path.join(MHN.temp_dir, 'link_dictionary.txt')  # shortest_path.py input file (called by generate_transit_files_2.sas)
+path_pairs_txt = os.path.join(MHN.temp_dir, 'path_pairs.txt')      # shortest_path.py input file (itinerary gaps)
+path_nodes_csv = os.path.join(MHN.temp_dir, 'path_nodes.csv')      # shortest_path.py input file (node coordinates)
 short_path_txt = os.path.join(MHN.temp_dir, 'short_path.txt')      # shortest_path.py output file
 path_errors_txt = os.path.join(MHN.temp_dir, 'path_errors.txt')
 
@@ -125,6 +130,8 @@ MHN.delete_if_exists(oneline_itin_txt)
 MHN.delete_if_exists(feed_groups_txt)
 MHN.delete_if_exists(missing_links_csv)
 MHN.delete_if_exists(link_dict_txt)
+MHN.delete_if_exists(path_pairs_txt)
+MHN.delete_if_exists(path_nodes_csv)
 MHN.delete_if_exists(short_path_txt)
 MHN.delete_if_exists(path_errors_txt)
 
@@ -171,36 +178,60 @@ for bus_fc in bus_fc_dict:
         bus_route_attr = [bus_id_field, 'DESCRIPTION', 'MODE', 'VEHICLE_TYPE', 'HEADWAY', 'SPEED', 'ROUTE_ID', 'START']
         bus_route_query = MHN.tod_periods['transit'][tod][1]
         bus_route_view = MHN.make_skinny_table_view(bus_fc, 'bus_route_view', bus_route_attr, bus_route_query)
-        MHN.write_attribute_csv(bus_route_view, bus_route_csv, bus_route_attr)
-        selected_bus_routes = MHN.make_attribute_dict(bus_route_view, bus_id_field, attr_list=[])
+        if rep_runs_engine != 'python':
+            MHN.write_attribute_csv(bus_route_view, bus_route_csv, bus_route_attr)
+        with arcpy.da.SearchCursor(bus_route_view, [bus_id_field, 'MODE', 'ROUTE_ID', 'START']) as cursor:
+            selected_bus_routes = dict((row[0], row[1:]) for row in cursor)
         arcpy.Delete_management(bus_route_view)
 
         # Export itineraries for selected runs.
         bus_order_field = MHN.route_systems[bus_fc][2]
         bus_itin_attr = [bus_id_field, 'ITIN_A', 'ITIN_B', bus_order_field, 'LAYOVER', 'DWELL_CODE', 'ZONE_FARE', 'LINE_SERV_TIME', 'TTF']
-        bus_itin_query = ''' "{}" IN ('{}') '''.format(bus_id_field, "','".join((bus_id for bus_id in selected_bus_routes)))
-        bus_itin_view = MHN.make_skinny_table_view(MHN.route_systems[bus_fc][0], 'bus_itin_view', bus_itin_attr, bus_itin_query)
-        MHN.write_attribute_csv(bus_itin_view, bus_itin_csv, bus_itin_attr)
-        arcpy.Delete_management(bus_itin_view)
+        bus_itin_table = MHN.route_systems[bus_fc][0]
+        if rep_runs_engine != 'python':
+            MHN.write_attribute_csv(bus_itin_table, bus_itin_csv, bus_itin_attr, key_field=bus_id_field, keys=selected_bus_routes)
+        if rep_runs_engine != 'sas':
+            selected_bus_itins = MHN.select_table_rows(
+                bus_itin_table, [bus_id_field, 'ITIN_A', 'ITIN_B', bus_order_field, 'DWELL_CODE'], bus_id_field, selected_bus_routes
+            )
 
-        # Process exported route & itin tables with gtfs_reformat_feed.sas.
-        sas1_sas = os.path.join(MHN.src_dir, '{}.sas'.format(sas1_name))
         sas1_output = os.path.join(MHN.temp_dir, 'bus_{}_runs_{}.csv'.format(which_bus, tod))
-        sas1_args = [MHN.src_dir, bus_route_csv, bus_itin_csv, oneline_itin_txt, feed_groups_txt, sas1_output, tod]
         MHN.delete_if_exists(sas1_output)
-        MHN.submit_sas(sas1_sas, sas1_log, sas1_lst, sas1_args)
-        if not os.path.exists(sas1_log):
-            MHN.die('{} did not run!'.format(sas1_sas))
-        elif not os.path.exists(feed_groups_txt):
-            MHN.die('{} did not run! (Called by {}.)'.format(os.path.join(MHN.src_dir, 'gtfs_collapse_routes.py'), sas1_sas))
-        elif os.path.exists(sas1_lst) or not os.path.exists(sas1_output):
-            MHN.die('{} did not run successfully. Please review {}.'.format(sas1_sas, sas1_log))
-        else:
-            os.remove(sas1_log)
-            os.remove(bus_route_csv)
-            os.remove(bus_itin_csv)
-            os.remove(oneline_itin_txt)
-            os.remove(feed_groups_txt)
+
+        # Select representative runs in-process, if requested.
+        if rep_runs_engine != 'sas':
+            rep_runs = gtfs_representative_runs.select_representative_runs(selected_bus_routes, selected_bus_itins, tod)
+            python_output = sas1_output if rep_runs_engine == 'python' else sas1_output.replace('.csv', '_py.csv')
+            gtfs_representative_runs.write_representative_runs(rep_runs, python_output)
+
+        # Process exported route & itin tables with gtfs_reformat_feed.sas.
+        if rep_runs_engine != 'python':
+            sas1_sas = os.path.join(MHN.src_dir, '{}.sas'.format(sas1_name))
+            sas1_args = [MHN.src_dir, bus_route_csv, bus_itin_csv, oneline_itin_txt, feed_groups_txt, sas1_output, tod]
+            MHN.submit_sas(sas1_sas, sas1_log, sas1_lst, sas1_args)
+            if not os.path.exists(sas1_log):
+                MHN.die('{} did not run!'.format(sas1_sas))
+            elif not os.path.exists(feed_groups_txt):
+                MHN.die('{} did not run! (Called by {}.)'.format(os.path.join(MHN.src_dir, 'gtfs_collapse_routes.py'), sas1_sas))
+            elif os.path.exists(sas1_lst) or not os.path.exists(sas1_output):
+                MHN.die('{} did not run successfully. Please review {}.'.format(sas1_sas, sas1_log))
+            else:
+                os.remove(sas1_log)
+                os.remove(bus_route_csv)
+                os.remove(bus_itin_csv)
+                os.remove(oneline_itin_txt)
+                os.remove(feed_groups_txt)
+
+        # Check the in-process representative runs against SAS's, if both were run.
+        if rep_runs_engine == 'both':
+            differences = gtfs_representative_runs.compare_representative_runs(sas1_output, python_output)
+            if differences:
+                arcpy.AddWarning('---- Representative runs differ between SAS and Python ({} differences):'.format(len(differences)))
+                for difference in differences[:20]:
+                    arcpy.AddWarning('------ {}'.format(difference))
+            else:
+                arcpy.AddMessage('---- Representative runs match between SAS and Python.')
+            os.remove(python_output)
 
         rep_runs_dict[which_bus][tod] = sas1_output
 
@@ -240,6 +271,7 @@ if any(MHN.scenario_years[scen] > MHN.base_year for scen in scen_list):
 # -----------------------------------------------------------------------------
 #  Iterate through scenarios, if more than one requested.
 # -----------------------------------------------------------------------------
+path_cache_totals = MHN.get_path_cache_totals()  # Reported once all scenarios are done
 
 for scen in scen_list:
     # Set scenario-specific parameters.
@@ -353,11 +385,10 @@ for scen in scen_list:
         # Export itineraries for selected runs.
         bus_order_field = MHN.route_systems[bus_fc][2]
         rep_runs_itin_attr = [bus_id_field, 'ITIN_A', 'ITIN_B', bus_order_field, 'LAYOVER', 'DWELL_CODE', 'ZONE_FARE', 'LINE_SERV_TIME', 'TTF', 'F_MEAS', 'T_MEAS', 'MILES']
-        rep_runs_itin_query = ''' "{}" IN ('{}') '''.format(bus_id_field, "','".join((bus_id for bus_id in selected_runs)))
-        rep_runs_itin_view = MHN.make_skinny_table_view(all_runs_itin_miles_dict[which_bus], 'rep_runs_itin_view', rep_runs_itin_attr, rep_runs_itin_query)
         rep_runs_itin_csv = os.path.join(scen_tran_path, 'rep_runs_itin.csv')
-        MHN.write_attribute_csv(rep_runs_itin_view, rep_runs_itin_csv, rep_runs_itin_attr)
-        arcpy.Delete_management(rep_runs_itin_view)
+        MHN.write_attribute_csv(
+            all_runs_itin_miles_dict[which_bus], rep_runs_itin_csv, rep_runs_itin_attr, key_field=bus_id_field, keys=selected_runs
+        )
 
         # If scenario has future bus coding, process it.
         if scen_year > MHN.base_year:
@@ -413,11 +444,12 @@ for scen in scen_list:
             # Corresponding future bus itineraries.
             bus_future_order_field = MHN.route_systems[MHN.bus_future][2]
             bus_future_itin_attr = [bus_future_id_field, 'ITIN_A', 'ITIN_B', bus_future_order_field, 'LAYOVER', 'DWELL_CODE', 'ZONE_FARE', 'LINE_SERV_TIME', 'TTF', 'F_MEAS', 'T_MEAS', 'MILES']
-            bus_future_itin_query = ''' "{}" IN ('{}') '''.format(bus_future_id_field, "','".join((bus_future_id for bus_future_id in selected_future_runs)))
-            bus_future_itin_view = MHN.make_skinny_table_view(all_runs_itin_miles_dict['future'], 'bus_future_itin_view', bus_future_itin_attr, bus_future_itin_query)
             bus_future_itin_csv = os.path.join(scen_tran_path, 'bus_future_itin.csv')
-            MHN.write_attribute_csv(bus_future_itin_view, bus_future_itin_csv, bus_future_itin_attr, include_headers=False)  # Skip headers for easier appending
-            arcpy.Delete_management(bus_future_itin_view)
+            MHN.write_attribute_csv(
+                all_runs_itin_miles_dict['future'], bus_future_itin_csv, bus_future_itin_attr,
+                include_headers=False,  # Skip headers for easier appending
+                key_field=bus_future_id_field, keys=selected_future_runs
+            )
 
             # Append future header/itin data to base/current header/itin files.
             with open(rep_runs_csv, 'a') as writer:
@@ -490,21 +522,23 @@ for scen in scen_list:
 
         missing_pnr_nodes = pnr_nodes - scen_nodes
 
+        # Copy the scenario network's nodes, to search for replacements in.
+        if missing_endpoints or missing_pnr_nodes:
+            scen_nodes_fc = os.path.join(MHN.mem, 'scen_nodes_fc')
+            MHN.copy_snapshot_features('node', MHN.select_rows('node', 'NODE', scen_nodes), scen_nodes_fc, ['NODE', MHN.zone_attr])
+            scen_nodes_by_oid = {r[0]: str(r[1]) for r in arcpy.da.SearchCursor(scen_nodes_fc, ['OID@', 'NODE'])}
+
         # Replace any missing itinerary endpoints with closest existing node.
         if missing_endpoints:
             replacements = {}
             node_oid_field = MHN.determine_OID_fieldname(MHN.node)
-            scen_nodes_query = ''' "NODE" IN ({}) '''.format(','.join(scen_nodes))
-            scen_nodes_lyr = MHN.make_skinny_feature_layer(MHN.node, 'scen_nodes_lyr', [node_oid_field, 'NODE'], scen_nodes_query)
             for node in missing_endpoints:
                 missing_node_lyr = MHN.make_skinny_feature_layer(MHN.node, 'missing_node_lyr', [node_oid_field, 'NODE'], '"NODE" = {}'.format(node))
                 closest_node_table = '/'.join((MHN.mem, 'closest_node_table'))
-                arcpy.GenerateNearTable_analysis(missing_node_lyr, scen_nodes_lyr, closest_node_table)  # Defaults to single closest feature
+                arcpy.GenerateNearTable_analysis(missing_node_lyr, scen_nodes_fc, closest_node_table)  # Defaults to single closest feature
                 with arcpy.da.SearchCursor(closest_node_table, ['NEAR_FID']) as cursor:
                     for row in cursor:
-                        closest_node_query = '"{}" = {}'.format(node_oid_field, row[0])
-                        closest_node_layer = arcpy.MakeFeatureLayer_management(MHN.node, 'closest_node_lyr', closest_node_query)
-                        replacements[node] = [str(row[0]) for row in arcpy.da.SearchCursor(closest_node_layer, ['NODE'])][0]
+                        replacements[node] = scen_nodes_by_oid[row[0]]
                 arcpy.Delete_management(closest_node_table)
 
             rep_runs_itin_fixed_csv = rep_runs_itin_csv.replace('.csv', '_fixed.csv')
@@ -540,16 +574,14 @@ for scen in scen_list:
             replacements = {}
             node_oid_field = MHN.determine_OID_fieldname(MHN.node)
             for node in missing_pnr_nodes:
-                scen_zone_nodes_query = ''' "NODE" IN ({}) AND "{}" = {} '''.format(','.join(scen_nodes), MHN.zone_attr, scen_node_zones[node])
-                scen_zone_nodes_lyr = MHN.make_skinny_feature_layer(MHN.node, 'scen_nodes_lyr', [node_oid_field, 'NODE'], scen_zone_nodes_query)
+                scen_zone_nodes_query = ''' "{}" = {} '''.format(MHN.zone_attr, scen_node_zones[node])
+                scen_zone_nodes_lyr = MHN.make_skinny_feature_layer(scen_nodes_fc, 'scen_nodes_lyr', ['NODE'], scen_zone_nodes_query)
                 missing_node_lyr = MHN.make_skinny_feature_layer(MHN.node, 'missing_node_lyr', [node_oid_field, 'NODE'], '"NODE" = {}'.format(node))
                 closest_node_table = '/'.join((MHN.mem, 'closest_node_table'))
                 arcpy.GenerateNearTable_analysis(missing_node_lyr, scen_zone_nodes_lyr, closest_node_table)  # Defaults to single closest feature
                 with arcpy.da.SearchCursor(closest_node_table, ['NEAR_FID']) as cursor:
                     for row in cursor:
-                        closest_node_query = '"{}" = {}'.format(node_oid_field, row[0])
-                        closest_node_layer = arcpy.MakeFeatureLayer_management(MHN.node, 'closest_node_lyr', closest_node_query)
-                        replacements[node] = [str(row[0]) for row in arcpy.da.SearchCursor(closest_node_layer, ['NODE'])][0]
+                        replacements[node] = scen_nodes_by_oid[row[0]]
                 arcpy.Delete_management(closest_node_table)
 
             pnr_fixed_csv = pnr_csv.replace('.csv', '_fixed.csv')
@@ -570,52 +602,45 @@ for scen in scen_list:
             os.remove(pnr_csv)
             pnr_csv = pnr_fixed_csv
 
+        if missing_endpoints or missing_pnr_nodes:
+            arcpy.Delete_management(scen_nodes_fc)
+
         # Identify NEW_MODES=4 links in base network and among highway projects completed by scenario year.
         if scen_year > MHN.base_year:
             hwyproj_id_field = MHN.route_systems[MHN.hwyproj][1]
-            hwy_year_attr = [hwyproj_id_field, 'COMPLETION_YEAR']
-            hwy_year_query = '"COMPLETION_YEAR" <= {}'.format(scen_year)
-            hwy_year_view = MHN.make_skinny_table_view(MHN.hwyproj, 'hwy_year_view', hwy_year_attr, hwy_year_query)
-            hwyproj_years = {r[0]: r[1] for r in arcpy.da.SearchCursor(hwy_year_view, hwy_year_attr)}
-            arcpy.Delete_management(hwy_year_view)
-            
+            hwyproj = MHN.snapshot('hwyproj')
+            projects = MHN.select_completed_projects(scen_year)
+            hwyproj_years = dict(zip(hwyproj.keys[projects].tolist(), hwyproj['COMPLETION_YEAR'][projects].tolist()))
+
             busway_coding_attr = [
                 hwyproj_id_field, 'ABB', 'NEW_MODES', 'NEW_DIRECTIONS',
                 'NEW_THRULANES1', 'NEW_THRULANES2', 'NEW_TYPE1', 'NEW_TYPE2',
                 'NEW_AMPM1', 'NEW_AMPM2', 'TOD'
             ]
-            busway_coding_query = ''' "NEW_MODES" = '4' AND "{}" IN ('{}') '''.format(
-                hwyproj_id_field, "','".join(hwyproj_id for hwyproj_id in hwyproj_years.keys())
-            )
-            busway_coding_view = MHN.make_skinny_table_view(
-                MHN.route_systems[MHN.hwyproj][0], 'busway_coding_view', busway_coding_attr, busway_coding_query
-            )
-            busway_coding_abb = [r[0] for r in arcpy.da.SearchCursor(busway_coding_view, ['ABB'])]
+            coding = MHN.snapshot('coding')
+            busway_coding = MHN.select_rows('coding', hwyproj_id_field, hwyproj_years) & (coding['NEW_MODES'] == '4')
+            busway_coding_abb = coding['ABB'][busway_coding].tolist()
             busway_coding_dict = {abb: dict() for abb in busway_coding_abb}
-            with arcpy.da.SearchCursor(busway_coding_view, busway_coding_attr) as c:
-                for r in c:
-                    tipid = r[0]
-                    abb = r[1]
-                    attr = list(r[2:])
-                    for i in range(len(attr)):
-                        attr[i] = str(attr[i]) if str(attr[i]) != '0' else None  # Set 0s to null, stringify rest
-                    attr_dict = dict(zip(busway_coding_attr[2:], attr))
-                    busway_coding_dict[abb][tipid] = attr_dict
-            arcpy.Delete_management(busway_coding_view)
+            for r in zip(*[coding[field][busway_coding].tolist() for field in busway_coding_attr]):
+                tipid = r[0]
+                abb = r[1]
+                attr = list(r[2:])
+                for i in range(len(attr)):
+                    attr[i] = str(attr[i]) if str(attr[i]) != '0' else None  # Set 0s to null, stringify rest
+                attr_dict = dict(zip(busway_coding_attr[2:], attr))
+                busway_coding_dict[abb][tipid] = attr_dict
 
         busway_link_attr = [
             'ABB', 'MILES', 'DIRECTIONS', 'THRULANES1', 'THRULANES2', 'TYPE1', 'TYPE2',
             'AMPM1', 'AMPM2'
         ]
-        busway_link_query = ''' ("MODES" = '4' AND ABB NOT LIKE '%-1') '''
+        arcs = MHN.snapshot('arc')
+        busway_links = (arcs['MODES'] == '4') & ~np.char.endswith(arcs['ABB'].astype(str), '-1')  # "MODES" = '4' AND ABB NOT LIKE '%-1'
         if scen_year > MHN.base_year:
-            busway_link_query += ''' OR "ABB" IN ('{}') '''.format(
-                "','".join((abb for abb in busway_coding_abb if abb[-1] != '1'))
-            )
-        busway_link_view = MHN.make_skinny_table_view(MHN.arc, 'busway_link_view', busway_link_attr, busway_link_query)
-        busway_link_abb = [r[0] for r in arcpy.da.SearchCursor(busway_link_view, ['ABB'])]
+            busway_links |= MHN.select_rows('arc', 'ABB', (abb for abb in busway_coding_abb if abb[-1] != '1'))
+        busway_link_abb = arcs['ABB'][busway_links].tolist()
         busway_baseyear_csv = os.path.join(MHN.temp_dir, 'busway_links_baseyear.csv')
-        MHN.write_attribute_csv(busway_link_view, busway_baseyear_csv, busway_link_attr)
+        MHN.write_snapshot_csv('arc', busway_links, busway_baseyear_csv, busway_link_attr)
 
         # Determine final coded attributes of each MODES=4 link
         busway_nodes = set()
@@ -690,12 +715,8 @@ for scen in scen_list:
         MHN.delete_if_exists(busway_baseyear_csv)
 
         # Identify end nodes of MODES=4 links
-        busway_nodes_list = list(busway_nodes) if busway_nodes else ['-1']
         busway_nodes_attr = ['NODE', 'POINT_X', 'POINT_Y', MHN.zone_attr, MHN.capzone_attr]
-        busway_nodes_query = '"NODE" IN ({})'.format(','.join(busway_nodes_list))
-        busway_nodes_view = MHN.make_skinny_table_view(MHN.node, 'busway_nodes_view', busway_nodes_attr, busway_nodes_query)
-        MHN.write_attribute_csv(busway_nodes_view, busway_nodes_csv, busway_nodes_attr)
-        arcpy.Delete_management(busway_nodes_view)
+        MHN.write_snapshot_csv('node', MHN.select_rows('node', 'NODE', busway_nodes), busway_nodes_csv, busway_nodes_attr)
 
         # Set flag for processing future bus routes
         process_future = 1 if scen_year > MHN.base_year else 0
@@ -708,7 +729,7 @@ for scen in scen_list:
         sas2_args = (scen_tran_path, scen_hwy_path, rep_runs_csv, rep_runs_itin_csv, replace_csv, reroute_csv, pnr_csv,
                      scen, tod, str(min(MHN.centroid_ranges['CBD'])), str(max(MHN.centroid_ranges['CBD'])),
                      str(MHN.max_poe), process_future, MHN.src_dir, missing_links_csv,
-                     link_dict_txt, short_path_txt, path_errors_txt, busway_links_csv, busway_nodes_csv,
+                     link_dict_txt, path_pairs_txt, path_nodes_csv, short_path_txt, path_errors_txt, busway_links_csv, busway_nodes_csv,
                      sas2_output, 0)
         if rsp_eval:
             sas2_args = sas2_args[:-1] + (scen_label,)
@@ -1119,6 +1140,8 @@ with open(relim_csv, 'wt') as w:
 # Node extra attribute CSVs
 exec(open(os.path.join(MHN.src_dir, 'transit_node_extra_attributes.py')).read())
 
+MHN.report_path_cache(path_cache_totals)
+
 # -----------------------------------------------------------------------------
 #  Clean up script-level data.
 # -----------------------------------------------------------------------------
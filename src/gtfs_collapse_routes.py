@@ -2,7 +2,7 @@
 '''
     gtfs_collapse_routes.py
     Authors: cheither & npeterson
-    Revised: 4/29/13
+    Revised: 10/17/26
     ---------------------------------------------------------------------------
     This script reads a file of bus run itinerary data and determines which
     runs are similar enough to be combined to create an AM Peak bus network.
@@ -10,71 +10,280 @@
 
       route-id, linename, itin_a1-itin_b1-dwcode1, itin_a2-itin_b2-dwcode2, ...
 
+    Runs are only ever compared with runs of the same route-id, so the file
+    (which gtfs_reformat_feed.sas sorts by route-id) is read one route-id
+    block at a time, and each block's groups are written before the next is
+    read. Memory use is therefore bounded by the largest route, not the whole
+    feed. Group numbers continue from one block to the next.
+
+    Each run in turn (in input order) becomes the base run of a new group,
+    unless it has already been grouped, and any later run of its route-id
+    sharing at least threshold percent of the base run's elements joins its
+    group. Output rows are "linename,group" for base runs and
+    "linename,group,ratio" for the runs grouped with them.
+
+    Route-id blocks are independent, so with --workers they are collapsed
+    by a pool of processes, a batch of blocks at a time, and their groups are
+    renumbered in input order afterwards: the output is identical to that of
+    a serial run.
+
+    Usage:
+
+      gtfs_collapse_routes.py oneline_itin_txt feed_groups_txt [--minhash]
+                              [--compare] [--workers n]
+
+    With --minhash, route-ids with at least MINHASH_MIN_RUNS runs only compare
+    pairs of runs proposed by locality-sensitive hashing of MinHash signatures
+    of their segments (pairs with a high estimated Jaccard similarity),
+    instead of every pair. Proposed pairs are still grouped by the exact
+    threshold rule. As the rule measures how much of the base run is covered
+    (not Jaccard similarity), runs more than MINHASH_SIZE_RATIO times longer
+    than the base run (e.g. full runs vs. a short-turn base) are always
+    compared; for the rest, a ratio >= 85 implies a Jaccard similarity of at
+    least 0.6. A pair that LSH fails to propose is never grouped, though, so
+    --compare runs both and reports any runs grouped differently (the exact
+    grouping is written when comparing).
+
 '''
 from __future__ import print_function  # Keep in case system Python is 2.x
+import argparse
+import bisect
 import csv
+import multiprocessing
 import os
-import sys
+import time
+import zlib
+
+THRESHOLD = 85                                             ### Threshold to compare runs & determine they are similar enough to combine.
+MINHASH_MIN_RUNS = 200                                     ### Route-ids with fewer runs than this are always compared exhaustively.
+MINHASH_BANDS = 20                                         ### LSH bands x rows = MinHash signature length; pairs with Jaccard
+MINHASH_ROWS = 3                                           ### similarity >= 0.6 are proposed with >99% probability.
+MINHASH_SIZE_RATIO = 1.25                                  ### Runs longer than this times the base run are always compared.
+BATCH_BLOCKS = 4                                           ### Route-id blocks per worker per batch.
+
 
 # -----------------------------------------------------------------------------
-#  Set parameters.
+#  Define functions.
 # -----------------------------------------------------------------------------
-threshold = 85                                             ### Threshold to compare runs & determine they are similar enough to combine.
-infl = sys.argv[1]
-groups = sys.argv[2]
+def collapse_runs(lines, threshold=THRESHOLD, first_group=1, minhash=False):
+    ''' Group a list of runs (each a [route-id, linename, segments...] list),
+        returning a list of output rows: [linename, group] for each base run,
+        followed by [linename, group, ratio] for each run grouped with it.
+        Groups are numbered from first_group, in input order. If minhash is
+        True, large route-ids only compare the pairs from minhash_candidates()
+        (and runs much longer than the base run). '''
+    elements = [set(run) for run in lines]                 ### Each run's unique elements, built once.
+    buckets = {}                                           ### Indices of runs not yet grouped, by route-id.
+    for i, run in enumerate(lines):
+        buckets.setdefault(run[0], []).append(i)
+    candidates = {}                                        ### Runs to compare each run to, where LSH is used.
+    by_size = {}                                           ### (sizes, runs) of each LSH route-id, in size order.
+    if minhash:
+        for route_id, bucket in buckets.items():
+            if len(bucket) >= MINHASH_MIN_RUNS:
+                candidates.update(minhash_candidates(lines, bucket))
+                runs = sorted(bucket, key=lambda i: len(elements[i]))
+                by_size[route_id] = ([len(elements[i]) for i in runs], runs)
+
+    rows = []
+    grouped = [False] * len(lines)
+    grp = first_group                                      ### Group identifier.
+    for base in range(len(lines)):
+        if grouped[base]:                                  ### Already grouped with an earlier base run.
+            continue
+        route_id = lines[base][0]
+        a1 = elements[base]
+        x = len(a1) - 1                                    ### Number of elements in base run itinerary (minus 1 to account for name).
+        rows.append([lines[base][1], grp])
+        if route_id in by_size:
+            sizes, runs = by_size[route_id]
+            longer = runs[bisect.bisect_right(sizes, x * MINHASH_SIZE_RATIO):]
+            compare = sorted(i for i in candidates[base].union(longer) if i > base and not grouped[i])
+        else:
+            compare = buckets[route_id][1:]
+            buckets[route_id] = remaining = []
+        for i in compare:
+            yy = len(a1 & elements[i]) * 100               ### Number of common elements between base and comparison runs * 100.
+            yxratio = yy / x                               ### Ratio of common elements to base run itinerary.
+            if yxratio >= threshold:
+                rows.append([lines[i][1], grp, yxratio])   ### Remove run from further analysis.
+                grouped[i] = True
+            elif route_id not in by_size:
+                remaining.append(i)
+        grp += 1
+    return rows
+
+
+def minhash_signature(segments, size=MINHASH_BANDS * MINHASH_ROWS):
+    ''' Return the MinHash signature of a run's segments, using one
+        permutation hashing: each segment's (32-bit) hash is assigned to one
+        of size bins, and each bin keeps its minimum. Empty bins borrow the
+        minimum of the next non-empty bin (offset by the distance to it), so
+        that signatures of short runs remain comparable. '''
+    signature = [None] * size
+    for segment in set(segments):
+        h = zlib.crc32(segment.encode('utf-8')) & 0xffffffff
+        b, value = h % size, h // size
+        if signature[b] is None or value < signature[b]:
+            signature[b] = value
+    if signature.count(None) == size:
+        return [0] * size
+    bins = list(signature)
+    for b in range(size):
+        offset = 1
+        while signature[b] is None:
+            value = bins[(b + offset) % size]
+            if value is not None:
+                signature[b] = -(value + offset * (1 << 32))  ### Negative, so never equal to a bin's own minimum.
+            offset += 1
+    return signature
+
+
+def minhash_candidates(lines, bucket):
+    ''' Return a {run: set of runs} dict of the candidate pairs among the runs
+        (indices into lines) in bucket, i.e. the runs whose MinHash signatures
+        agree on every row of at least one LSH band. '''
+    signatures = dict((i, minhash_signature(lines[i][2:])) for i in bucket)
+    candidates = dict((i, set()) for i in bucket)
+    for band in range(MINHASH_BANDS):
+        band_buckets = {}
+        for i in bucket:
+            key = tuple(signatures[i][band * MINHASH_ROWS:(band + 1) * MINHASH_ROWS])
+            band_buckets.setdefault(key, []).append(i)
+        for similar in band_buckets.values():
+            if len(similar) > 1:
+                for i in similar:
+                    candidates[i].update(similar)
+    return candidates
+
 
-if os.path.exists(groups):
-    os.remove(groups)
+def read_route_blocks(infl):
+    ''' Yield the runs of infl in blocks of consecutive rows sharing a
+        route-id. Raises ValueError if a route-id reappears after its block,
+        as its runs would then not all be compared with each other. '''
+    finished = set()
+    block = []
+    with open(infl) as r:
+        for run in csv.reader(r):
+            if block and run[0] != block[0][0]:
+                finished.add(block[0][0])
+                yield block
+                block = []
+            if run[0] in finished:
+                raise ValueError('{0} is not sorted by route-id ({1} reappears at {2}).'.format(infl, run[0], run[1]))
+            block.append(run)
+    if block:
+        yield block
+
+
+def collapse_block(task):
+    ''' Collapse one route-id block, given a (lines, minhash, compare) task.
+        Returns (runs, rows, minhash_rows, exact_seconds, minhash_seconds),
+        with groups numbered from 1; minhash_rows is None unless comparing. '''
+    lines, minhash, compare = task
+    start_time = time.time()
+    rows = collapse_runs(lines, minhash=minhash and not compare)
+    seconds = time.time() - start_time
+    if not compare:
+        return (len(lines), rows, None, 0.0 if minhash else seconds, seconds if minhash else 0.0)
+    start_time = time.time()
+    minhash_rows = collapse_runs(lines, minhash=True)
+    return (len(lines), rows, minhash_rows, seconds, time.time() - start_time)
+
+
+def collapse_blocks(infl, minhash=False, compare=False, workers=1):
+    ''' Yield collapse_block() results for each route-id block of infl, in
+        input order. With more than 1 worker, blocks are read and collapsed
+        in batches of BATCH_BLOCKS per worker, so that only one batch is held
+        in memory at a time. '''
+    tasks = ((lines, minhash, compare) for lines in read_route_blocks(infl))
+    if workers <= 1:
+        for task in tasks:
+            yield collapse_block(task)
+        return
+    pool = None
+    try:
+        while True:
+            batch = [task for i, task in zip(range(workers * BATCH_BLOCKS), tasks)]
+            if not batch:
+                break
+            if pool is None and len(batch) > 1:
+                pool = multiprocessing.Pool(workers)
+            for result in (pool.map(collapse_block, batch) if pool else map(collapse_block, batch)):
+                yield result
+    finally:
+        if pool is not None:
+            pool.terminate()
+
+
+def renumber_groups(rows, first_group):
+    ''' Return collapse_runs() output rows (with groups numbered from 1)
+        with their groups numbered from first_group instead. '''
+    return [[row[0], row[1] + first_group - 1] + row[2:] for row in rows]
+
+
+def compare_groupings(exact_rows, minhash_rows):
+    ''' Return the linenames whose group differs between two sets of
+        collapse_runs() output rows, identifying each group by its base run
+        (as one missed pair shifts the numbers of every later group). '''
+    def base_runs(rows):
+        bases = {}
+        for row in rows:
+            if len(row) == 2:
+                bases[row[1]] = row[0]
+        return dict((row[0], bases[row[1]]) for row in rows)
+    exact = base_runs(exact_rows)
+    approx = base_runs(minhash_rows)
+    return sorted(line for line in exact if exact[line] != approx.get(line))
+
+
+def write_groups(rows, outFile):
+    ''' Write collapse_runs() output rows to an open file. '''
+    outFile.writelines(','.join(str(value) for value in row) + '\n' for row in rows)
 
 
 # -----------------------------------------------------------------------------
 #  Process feed data transit runs.
 # -----------------------------------------------------------------------------
-lines = list(csv.reader(open(infl)))
-a = []; b = []; a0 = []; b0 = []                           ### Create a set of empty lists.
-z = len(lines)
-grp = 1                                                    ### Group identifier.
-print('PROCESSING ' + str(z) + ' RUNS.')
-
-for qq in lines[:]:                                        ### Make a slice copy to safely modify the list while iterating over it.
-    if z > 0:
-        a = lines[0]
-        a0 = a[1]                                          ### Get route name for base run.
-        zz = len(lines) - 1
-        i = 1
-        ## --> write first run and group to output file
-        outFile = open(groups, 'a')
-        outFile.write(a0 + ',' + str(grp) + '\n')
-        outFile.close()
-
-        for q in range(zz):
-            b = lines[i]
-            b0 = b[1]
-            if a[0] == b[0]:                               ### Compare route ids from each run.
-                a1 = set(a)                                ### Remove duplicate elements for comparison.
-                b1 = set(b)
-                x = len(a1) - 1                            ### Number of elements in base run itinerary (minus 1 to account for name).
-                y = len(a1 & b1)                           ### Number of common elements between base and comparison runs * 100.
-                yy = y * 100                               ### Y times 100 to yield an integer answer.
-                yxratio = yy / x                           ### Ratio of common elements to base run itinerary.
-
-                if yxratio >= threshold:
-                    lines.pop(i)                           ### Remove run from further analysis.
-                    z = len(lines)
-                    ## --> write group to output file
-                    outFile = open(groups, 'a')
-                    outFile.write(b0 + ',' + str(grp) + ',' + str(yxratio) + '\n')
-                    outFile.close()
-                else:
-                    i += 1
-                del a1; del b1
-            else:
-                i += 1
-            del b; del b0                                  ### Empty lists.
-
-        del a; del a0                                      ### Empty lists.
-        lines.pop(0)
-        z = len(lines)
-        grp += 1
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Collapse similar bus runs into groups.')
+    parser.add_argument('infl', help='one-line itineraries (route-id, linename, segments...)')
+    parser.add_argument('groups', help='output file of grouped runs')
+    parser.add_argument('--minhash', action='store_true', help='only compare runs proposed by MinHash/LSH')
+    parser.add_argument('--compare', action='store_true', help='run exact and MinHash grouping and compare them')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes (0 = one per CPU)')
+    opts = parser.parse_args()
+    if opts.workers < 1:
+        opts.workers = multiprocessing.cpu_count()
+
+    if os.path.exists(opts.groups):
+        os.remove(opts.groups)
+
+    runs = 0
+    grp = 1                                                ### Group identifier.
+    different = []
+    exact_seconds = minhash_seconds = 0.0
+    try:
+        with open(opts.groups, 'w') as outFile:
+            for block_runs, rows, minhash_rows, exact_time, minhash_time in collapse_blocks(
+                    opts.infl, opts.minhash, opts.compare, opts.workers):
+                if minhash_rows is not None:
+                    different.extend(compare_groupings(rows, minhash_rows))
+                write_groups(renumber_groups(rows, grp), outFile)
+                runs += block_runs
+                grp += sum(1 for row in rows if len(row) == 2)
+                exact_seconds += exact_time
+                minhash_seconds += minhash_time
+    except ValueError:
+        os.remove(opts.groups)                             ### Don't leave partial groups for SAS to read.
+        raise
+    print('PROCESSED ' + str(runs) + ' RUNS INTO ' + str(grp - 1) + ' GROUPS.')
+
+    if opts.compare:
+        print('EXACT: {0:.2f} SECONDS; MINHASH: {1:.2f} SECONDS.'.format(exact_seconds, minhash_seconds))
+        if different:
+            print('MINHASH GROUPED {0} RUNS DIFFERENTLY: {1}'.format(len(different), ', '.join(sorted(different)[:20])))
+        else:
+            print('MINHASH GROUPING MATCHES EXACT GROUPING.')
 
-print('DONE!')
+    print('DONE!')
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+'''
+    gtfs_representative_runs.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    An in-process equivalent of gtfs_reformat_feed.sas (and the call it makes
+    to gtfs_collapse_routes.py): given the header and itinerary attributes of
+    a TOD's bus runs, collapse similar runs of each route into groups, choose
+    each group's representative run (the one with the most segments, then
+    the earliest start) and calculate its GROUP_HEADWAY and GROUP_RUNS.
+
+    generate_transit_files.py can use this instead of writing bus_route.csv
+    and bus_itin.csv, running SAS, and reading the results back, or run both
+    and check that they agree with compare_representative_runs(). Either way,
+    the results are written to the same bus_{which}_runs_{tod}.csv format:
+
+      TRANSIT_LINE,FEED_GROUP,GROUP_HEADWAY,GROUP_RUNS
+
+    This module only uses the standard library (and gtfs_collapse_routes.py).
+
+'''
+from __future__ import print_function  # Keep in case system Python is 2.x
+import csv
+import math
+
+from gtfs_collapse_routes import collapse_runs
+
+# Pace special event service, excluded from the representative runs
+PACE_SPECIAL_EVENT_ROUTES = ('222', '237', '282', '284', '387', '475', '476', '768', '769', '773', '774', '775', '776', '779')
+
+# Headway (minutes) of groups with a single run, and the maximum headway, by TOD
+MAX_HEADWAY = {1: 720, 2: 180, 3: 420}
+DEFAULT_MAX_HEADWAY = 120
+
+SAS_CHAR_LENGTH = 8  # Default length of character variables read by SAS list input
+RUNS_HEADER = ['TRANSIT_LINE', 'FEED_GROUP', 'GROUP_HEADWAY', 'GROUP_RUNS']
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def sas_number(value):
+    ''' Format a number as SAS does when concatenating it into a string:
+        whole numbers without decimals, and missing values as ".". '''
+    if value is None:
+        return '.'
+    value = float(value)
+    return str(int(value)) if value == int(value) else repr(value)
+
+
+def oneline_itineraries(routes, itins):
+    ''' Return the [route-id, linename, segments...] runs that
+        gtfs_reformat_feed.sas writes to oneline_itin.txt, in the same
+        (route-id, linename) order. routes is a {linename: (mode, route_id,
+        start)} dict, and itins a list of (linename, itin_a, itin_b,
+        order, dwell_code) tuples. Pace special event runs are excluded. '''
+    segments = dict((line, []) for line in routes)
+    for line, itin_a, itin_b, order, dwell_code in itins:
+        if line in segments:
+            segments[line].append((order, '-'.join(sas_number(v) for v in (itin_a, itin_b, dwell_code))))
+    runs = []
+    for line, (mode, route_id, start) in routes.items():
+        route_id = (route_id or '')[:SAS_CHAR_LENGTH]
+        if mode == 'Q' and route_id in PACE_SPECIAL_EVENT_ROUTES:
+            continue
+        line_segments = [segment for order, segment in sorted(segments[line], key=lambda s: s[0])]
+        runs.append([(line[:1] + route_id).replace(' ', ''), line] + (line_segments or ['']))
+    runs.sort(key=lambda run: (run[0], run[1]))
+    return runs
+
+
+def group_headway(starts, tod):
+    ''' Return the mean headway (minutes) between the start times (seconds
+        after midnight) of a group's runs, as gtfs_reformat_feed.sas
+        calculates it. Overnight (TOD 1) runs are ordered from the evening
+        into the morning. '''
+    max_headway = MAX_HEADWAY.get(int(tod), DEFAULT_MAX_HEADWAY)
+    if len(starts) == 1:
+        return float(max_headway)
+    if int(tod) == 1:
+        def overnight_order(start):
+            seconds = start % 86400
+            return (1 if seconds >= 43200 else 2, int(seconds // 3600), start)
+        starts = sorted(starts, key=overnight_order)
+    else:
+        starts = sorted(starts)
+    headways = []
+    for previous, start in zip(starts, starts[1:]):
+        headway = abs(start - previous) / 60.0
+        if headway > max_headway:
+            headway = 1440 - headway  # Runs crossing midnight
+        if headway == 0:
+            headway = max_headway
+        headways.append(headway)
+    return sum(headways) / len(headways)
+
+
+def select_representative_runs(routes, itins, tod):
+    ''' Return a [transit_line, feed_group, group_headway, group_runs] row for
+        the representative run of each group of similar runs, in group order.
+        Arguments are as for oneline_itineraries(). '''
+    runs = oneline_itineraries(routes, itins)
+    group_of = dict((row[0], row[1]) for row in collapse_runs(runs))
+    segs = {}  # Highest itinerary order of each run, like SAS's max(order)
+    for line, itin_a, itin_b, order, dwell_code in itins:
+        if line in group_of and (segs.get(line) is None or order > segs[line]):
+            segs[line] = order
+
+    members = {}
+    for line, group in group_of.items():
+        members.setdefault(group, []).append(line)
+    rep_runs = []
+    for group in sorted(members):
+        lines = members[group]
+        start = dict((line, routes[line][2] or 0) for line in lines)
+        representative = min(lines, key=lambda line: (segs.get(line) is None, -(segs.get(line) or 0), start[line], line))
+        headway = group_headway([start[line] for line in lines], tod)
+        rep_runs.append([representative, group, math.floor(headway * 10 + 0.5) / 10, len(lines)])
+    return rep_runs
+
+
+def write_representative_runs(rep_runs, runs_csv):
+    ''' Write select_representative_runs() rows to a CSV like the one written
+        by gtfs_reformat_feed.sas. '''
+    with open(runs_csv, 'w') as w:
+        w.write(','.join(RUNS_HEADER) + '\n')
+        for line, group, headway, runs in rep_runs:
+            w.write('{0},{1},{2:.1f},{3}\n'.format(line, group, headway, runs))
+    return runs_csv
+
+
+def read_representative_runs(runs_csv):
+    ''' Read a representative runs CSV into a {transit_line: (feed_group,
+        group_headway, group_runs)} dict. '''
+    rep_runs = {}
+    with open(runs_csv) as r:
+        for row in csv.DictReader(r):
+            rep_runs[row['TRANSIT_LINE'].strip()] = (
+                int(float(row['FEED_GROUP'])), float(row['GROUP_HEADWAY']), int(float(row['GROUP_RUNS'])))
+    return rep_runs
+
+
+def compare_representative_runs(sas_csv, python_csv, tolerance=0.05):
+    ''' Compare the representative runs CSVs written by gtfs_reformat_feed.sas
+        and by write_representative_runs(), returning a list of messages
+        describing each difference (empty if they agree). FEED_GROUP numbers
+        are not compared, only which runs represent a group, and their
+        GROUP_HEADWAY and GROUP_RUNS. '''
+    sas_runs = read_representative_runs(sas_csv)
+    python_runs = read_representative_runs(python_csv)
+    differences = []
+    for line in sorted(set(sas_runs) - set(python_runs)):
+        differences.append('{0} is only a representative run in {1}'.format(line, sas_csv))
+    for line in sorted(set(python_runs) - set(sas_runs)):
+        differences.append('{0} is only a representative run in {1}'.format(line, python_csv))
+    for line in sorted(set(sas_runs) & set(python_runs)):
+        sas_group, sas_headway, sas_count = sas_runs[line]
+        python_group, python_headway, python_count = python_runs[line]
+        if sas_count != python_count:
+            differences.append('{0} represents {1} runs in SAS, {2} in Python'.format(line, sas_count, python_count))
+        if abs(sas_headway - python_headway) > tolerance:
+            differences.append('{0} has GROUP_HEADWAY {1} in SAS, {2} in Python'.format(line, sas_headway, python_headway))
+    return differences
@@ -63,19 +63,13 @@ hwyproj_id_field = MHN.route_systems[MHN.hwyproj][1]
 
 # Export projects with valid completion years.
 year_attr = (hwyproj_id_field, 'COMPLETION_YEAR')
-year_query = '{0} <= {1}'.format("COMPLETION_YEAR", MHN.max_year)
-year_view = MHN.make_skinny_table_view(MHN.hwyproj, 'year_view', year_attr, year_query)
-MHN.write_attribute_csv(year_view, year_csv, year_attr)
-projects = MHN.make_attribute_dict(year_view, hwyproj_id_field, attr_list=[])
-arcpy.Delete_management(year_view)
+projects = MHN.select_completed_projects(MHN.max_year)
+MHN.write_snapshot_csv('hwyproj', projects, year_csv, year_attr)
+coding, network_arcs = MHN.select_scenario_network(projects)
 
 # Export coding for valid projects.
 transact_attr = (hwyproj_id_field, 'ABB', 'ACTION_CODE', 'NEW_DIRECTIONS')
-transact_query = ''' "{0}" IN ('{1}') '''.format(hwyproj_id_field, "','".join((hwyproj_id for hwyproj_id in projects)))
-transact_view = MHN.make_skinny_table_view(MHN.route_systems[MHN.hwyproj][0], 'transact_view', transact_attr, transact_query)
-MHN.write_attribute_csv(transact_view, transact_csv, transact_attr)
-project_arcs = MHN.make_attribute_dict(transact_view, 'ABB', attr_list=[])
-arcpy.Delete_management(transact_view)
+MHN.write_snapshot_csv('coding', coding, transact_csv, transact_attr)
 
 # Export base year arc attributes.
 network_attr = (
@@ -84,10 +78,7 @@ network_attr = (
     'THRULANEWIDTH1', 'THRULANEWIDTH2', 'PARKLANES1', 'PARKLANES2',
     'SIGIC', 'CLTL', 'RRGRADECROSS', 'TOLLDOLLARS', 'MODES', 'MILES'
 )
-network_query = ''' "BASELINK" = '1' OR "ABB" IN ('{0}') '''.format("','".join((arc_id for arc_id in project_arcs if arc_id[-1] != '1')))
-network_view = MHN.make_skinny_table_view(MHN.arc, 'network_view', network_attr, network_query)
-MHN.write_attribute_csv(network_view, network_csv, network_attr)
-arcpy.Delete_management(network_view)
+MHN.write_snapshot_csv('arc', network_arcs, network_csv, network_attr)
 
 
 # -----------------------------------------------------------------------------
@@ -153,22 +144,28 @@ MHN.calculate_itin_measures(temp_itin_table)
 # Generate route features one at a time.
 # (Note: not using the MHN.build_geometry_dict() method for bus_future, because
 #  the time saved in construction is lost in dict-building for small coding
-#  tables.)
+#  tables. Arcs are selected by set membership, rather than "ABB" IN (...)
+#  queries: all of the routes' arcs are copied once, then each route's from
+#  that copy.)
+all_route_arcs_fc = os.path.join(MHN.mem, 'all_route_arcs')
+all_route_arc_ids = set(arc_id for route_arc_ids in route_arcs.values() for arc_id in route_arc_ids)
+MHN.copy_snapshot_features('arc', MHN.select_rows('arc', 'ABB', all_route_arc_ids), all_route_arcs_fc, ['ABB'])
+
 for route_id in sorted(route_arcs.keys()):
 
     # Dissolve route arcs into a single route feature, and append to temp FC.
     route_arc_ids = route_arcs[route_id]
-    route_arcs_lyr = 'route_arcs_lyr'
-    route_arcs_query = ''' "ABB" IN ('{0}') '''.format("','".join(route_arc_ids))
-    arcpy.MakeFeatureLayer_management(MHN.arc, route_arcs_lyr, route_arcs_query)
+    route_arcs_fc = os.path.join(MHN.mem, 'route_arcs')
+    MHN.copy_selected_rows(all_route_arcs_fc, 'ABB', route_arc_ids, route_arcs_fc, [])
     route_dissolved = os.path.join(MHN.mem, 'route_dissolved')
-    arcpy.Dissolve_management(route_arcs_lyr, route_dissolved)
+    arcpy.Dissolve_management(route_arcs_fc, route_dissolved)
     arcpy.AddField_management(route_dissolved, common_id_field, 'TEXT', field_length=10)
     with arcpy.da.UpdateCursor(route_dissolved, [common_id_field]) as cursor:
         for row in cursor:
             row[0] = route_id
             cursor.updateRow(row)
     arcpy.Append_management(route_dissolved, temp_routes_fc, 'NO_TEST')
+arcpy.Delete_management(all_route_arcs_fc)
 
 # Fill other fields with data from future_route_csv.
 header_attr = {}
@@ -202,17 +199,19 @@ with arcpy.da.UpdateCursor(temp_routes_fc, route_fields) as cursor:
 # -----------------------------------------------------------------------------
 #  Merge temp routes with unaltered ones.
 # -----------------------------------------------------------------------------
-unaltered_routes_query = ''' "{0}" NOT IN ('{1}') '''.format(common_id_field, "','".join(route_arcs.keys()))
-
-unaltered_routes_lyr = 'unaltered_routes_lyr'
-arcpy.MakeFeatureLayer_management(MHN.bus_future, unaltered_routes_lyr, unaltered_routes_query)
+# Routes (and itineraries) not in route_arcs, selected by set membership
+# rather than a "NOT IN (...)" query.
+unaltered_routes_fc = os.path.join(MHN.mem, 'unaltered_routes_fc')
+MHN.copy_selected_rows(MHN.bus_future, common_id_field, route_arcs.keys(), unaltered_routes_fc, exclude=True)
 updated_routes_fc = os.path.join(MHN.mem, 'updated_routes_fc')
-arcpy.Merge_management((unaltered_routes_lyr, temp_routes_fc), updated_routes_fc)
+arcpy.Merge_management((unaltered_routes_fc, temp_routes_fc), updated_routes_fc)
+arcpy.Delete_management(unaltered_routes_fc)
 
-unaltered_itin_view = 'unaltered_itin_view'
-arcpy.MakeTableView_management(MHN.route_systems[MHN.bus_future][0], unaltered_itin_view, unaltered_routes_query)
+unaltered_itin_table = os.path.join(MHN.mem, 'unaltered_itin_table')
+MHN.copy_selected_rows(MHN.route_systems[MHN.bus_future][0], common_id_field, route_arcs.keys(), unaltered_itin_table, exclude=True)
 updated_itin_table = os.path.join(MHN.mem, 'updated_itin_table')
-arcpy.Merge_management((unaltered_itin_view, temp_itin_table), updated_itin_table)
+arcpy.Merge_management((unaltered_itin_table, temp_itin_table), updated_itin_table)
+arcpy.Delete_management(unaltered_itin_table)
 
 
 # -----------------------------------------------------------------------------
@@ -38,6 +38,7 @@ nodes_csv = os.path.join(MHN.temp_dir, 'nodes.csv')
 header_csv = os.path.join(MHN.temp_dir, 'header.csv')
 itin_csv = os.path.join(MHN.temp_dir, 'itin.csv')
 link_dict_txt = os.path.join(MHN.temp_dir, 'link_dictionary.txt')  # shortest_path.py input file (called by import_gtfs_bus_routes_2.sas)
+path_pairs_txt = os.path.join(MHN.temp_dir, 'path_pairs.txt')      # shortest_path.py input file (itinerary gaps)
 short_path_txt = os.path.join(MHN.temp_dir, 'short_path.txt')      # shortest_path.py output file
 path_err_txt = os.path.join(MHN.temp_dir, 'path_errors.txt')
 hold_check_csv = os.path.join(MHN.temp_dir, 'hold_check.csv')
@@ -56,6 +57,7 @@ MHN.delete_if_exists(nodes_csv)
 MHN.delete_if_exists(header_csv)
 MHN.delete_if_exists(itin_csv)
 MHN.delete_if_exists(link_dict_txt)
+MHN.delete_if_exists(path_pairs_txt)
 MHN.delete_if_exists(short_path_txt)
 MHN.delete_if_exists(path_err_txt)
 MHN.delete_if_exists(hold_check_csv)
@@ -97,26 +99,16 @@ if network_year > MHN.base_year:
 hwyproj_id_field = MHN.route_systems[MHN.hwyproj][1]
 
 # Identify highway projects to be completed by bus year.
-year_attr = (hwyproj_id_field, 'COMPLETION_YEAR')
-year_query = '{0} <= {1}'.format("COMPLETION_YEAR", network_year)
-year_view = MHN.make_skinny_table_view(MHN.hwyproj, 'year_view', year_attr, year_query)
-projects = MHN.make_attribute_dict(year_view, hwyproj_id_field, attr_list=[])
-arcpy.Delete_management(year_view)
+projects = MHN.select_completed_projects(network_year)
+coding, network_arcs = MHN.select_scenario_network(projects)
 
 # Export coding for identified projects.
 transact_attr = (hwyproj_id_field, 'ABB', 'ACTION_CODE', 'NEW_POSTEDSPEED1', 'NEW_POSTEDSPEED2', 'NEW_DIRECTIONS')
-transact_query = ''' "{0}" IN ('{1}') '''.format(hwyproj_id_field, "','".join((hwyproj_id for hwyproj_id in projects)))
-transact_view = MHN.make_skinny_table_view(MHN.route_systems[MHN.hwyproj][0], 'transact_view', transact_attr, transact_query)
-MHN.write_attribute_csv(transact_view, transact_csv, transact_attr[1:])
-project_arcs = MHN.make_attribute_dict(transact_view, 'ABB', attr_list=[])
-arcpy.Delete_management(transact_view)
+MHN.write_snapshot_csv('coding', coding, transact_csv, transact_attr[1:])
 
 # Export arc attributes for bus year network.
 network_attr = ('ANODE', 'BNODE', 'BASELINK', 'ABB', 'DIRECTIONS', 'TYPE1', 'TYPE2', 'POSTEDSPEED1', 'POSTEDSPEED2', 'MILES')
-network_query = ''' "BASELINK" = '1' OR "ABB" IN ('{0}') '''.format("','".join((arc_id for arc_id in project_arcs if arc_id[-1] != '1')))
-network_view = MHN.make_skinny_table_view(MHN.arc, 'network_view', network_attr, network_query)
-MHN.write_attribute_csv(network_view, network_csv, network_attr)
-arcpy.Delete_management(network_view)
+MHN.write_snapshot_csv('arc', network_arcs, network_csv, network_attr)
 
 # Export node coordinates.
 nodes_attr = ('NODE', 'POINT_X', 'POINT_Y')
@@ -134,10 +126,12 @@ sas1_sas = os.path.join(MHN.src_dir, '{0}.sas'.format(sas1_name))
 sas1_args = [
     raw_header_csv, raw_itin_csv, transact_csv, network_csv, nodes_csv,
     MHN.src_dir, header_csv, itin_csv, pseudo_csv, link_dict_txt,
-    short_path_txt, path_err_txt, hold_check_csv, hold_times_csv,
+    path_pairs_txt, short_path_txt, path_err_txt, hold_check_csv, hold_times_csv,
     routes_processed_csv, str(min_route_id), str(MHN.max_poe), sas1_lst
 ]
+path_cache_totals = MHN.get_path_cache_totals()
 MHN.submit_sas(sas1_sas, sas1_log, sas1_lst, sas1_args)
+MHN.report_path_cache(path_cache_totals)
 if not os.path.exists(sas1_log):
     MHN.die('{0} did not run!'.format(sas1_sas))
 elif os.path.exists(path_err_txt):
@@ -197,7 +191,7 @@ MHN.validate_itin_times(temp_itin_table)
 MHN.calculate_itin_measures(temp_itin_table)
 
 # Build dict to store all arc geometries for mix-and-match route-building.
-vertices_comprising = MHN.build_geometry_dict(MHN.arc, 'ABB')
+vertices_comprising = MHN.snapshot_geometry()
 
 # Generate route features one at a time.
 arcs_traversed_by = {}
@@ -198,6 +198,7 @@ coding_table_path = MHN.break_path(coding_table)
 arcpy.CreateTable_management(coding_table_path['dir'], coding_table_path['name'], updated_coding_table)
 arcpy.Append_management(updated_coding_table, coding_table, 'TEST')
 arcpy.Delete_management(updated_coding_table)
+MHN.invalidate_snapshot('hwyproj', 'coding')
 
 # Rebuild relationship classes.
 arcpy.AddMessage('{0}Rebuilding relationship classes...'.format('\n'))
@@ -172,10 +172,9 @@ zero_fields = [
     'AMPM1', 'AMPM2', 'MODES', 'POSTEDSPEED1', 'POSTEDSPEED2', 'PARKLANES1', 'PARKLANES2', 'SIGIC', 'CLTL',
     'RRGRADECROSS', 'TOLLSYS', 'TOLLDOLLARS', 'NHSIC', 'CHIBLVD', 'TRUCKRTE', 'TRUCKRES', 'VCLEARANCE', 'MESO'
 ]
-MHN.set_nulls_to_zero(temp_arcs, zero_fields)
-
 space_fields = ['BASELINK', 'ROADNAME', 'PARKRES1', 'PARKRES2', 'SRA', 'TRUCKRES_UPDATED']
-MHN.set_nulls_to_space(temp_arcs, space_fields)
+null_values = dict([(field, 0) for field in zero_fields] + [(field, ' ') for field in space_fields])
+MHN.replace_nulls(temp_arcs, null_values)  # All fields in one pass
 
 # Update existing ABB values.
 # -- Arcs with ANODE, BNODE and BASELINK:
@@ -701,24 +700,27 @@ def update_route_system(header, itin, vertices_comprising, split_dict_ABB, new_A
     arcpy.CreateTable_management(itin_copy_path, itin_copy_name, itin)
 
     itin_OID_field = MHN.determine_OID_fieldname(itin)
-    itin_dict = MHN.make_attribute_dict(itin, itin_OID_field)
+    itin_table = MHN.make_attribute_table(itin, itin_OID_field)
+    itin_OIDs = itin_table.keys.tolist()
+    itin_ABBs = itin_table['ABB'].tolist()
+    if order_field:
+        itin_orders = itin_table[order_field].tolist()  # Bumped in place for split links
+        itin_As = itin_table['ITIN_A'].tolist()
+        itin_Bs = itin_table['ITIN_B'].tolist()
 
     # Check validity of ABB value on each line, adjusting the itinerary when
     # invalidity is due to a split
-    max_itin_OID = max([OID for OID in itin_dict])
+    max_itin_OID = max(itin_OIDs)
     split_itin_dict = {}
-    all_itin_OIDs = list(itin_dict.keys())
-    all_itin_OIDs.sort()  # For processing in itinerary order, rather than in the dict's pseudo-random order
-    bad_itin_OIDs = []
+    keep_itin_rows = np.ones(len(itin_table), dtype=bool)
     if order_field:
         order_bump = 0
-    for OID in all_itin_OIDs:
-        common_id = itin_dict[OID][common_id_field]
+    for i in itin_table.rows(np.sort(itin_table.keys)):  # For processing in itinerary order
         if order_field:
-            order = itin_dict[OID][order_field]
+            order = itin_orders[i]
             if order == 1:
                 order_bump = 0
-        ABB = itin_dict[OID]['ABB']
+        ABB = itin_ABBs[i]
         if ABB != None:
             anode = int(ABB.split('-')[0])
             bnode = int(ABB.split('-')[1])
@@ -729,13 +731,13 @@ def update_route_system(header, itin, vertices_comprising, split_dict_ABB, new_A
             baselink = 0
         if ABB not in new_ABB_values:
             if not order_field:  # For hwyproj, all deleted links should be removed from coding. Split links will be replaced.
-                bad_itin_OIDs.append(OID)
+                keep_itin_rows[i] = False
             if (anode,bnode,baselink) in split_dict_ABB:  # If ABB is invalid because it was split, find new ABB values
                 ordered_segments = split_dict_ABB[(anode,bnode,baselink)]
                 if order_field:
-                    bad_itin_OIDs.append(OID)  # For bus routes, only split links should be removed (and replaced).
-                    itin_a = itin_dict[OID]['ITIN_A']
-                    itin_b = itin_dict[OID]['ITIN_B']
+                    keep_itin_rows[i] = False  # For bus routes, only split links should be removed (and replaced).
+                    itin_a = itin_As[i]
+                    itin_b = itin_Bs[i]
                     if itin_b == anode or itin_a == bnode:
                         backwards = True
                         ordered_segments = ordered_segments[::-1]  # Make a reversed copy of the ordered segments
@@ -747,7 +749,7 @@ def update_route_system(header, itin, vertices_comprising, split_dict_ABB, new_A
                     split_baselink = int(split_ABB[0].split('-')[2])
                     split_length_ratio = split_ABB[3]
                     max_itin_OID += 1
-                    split_itin_dict[max_itin_OID] = itin_dict[OID].copy()
+                    split_itin_dict[max_itin_OID] = itin_table.record(itin_OIDs[i])
                     split_itin_dict[max_itin_OID]['ABB'] = split_ABB[0]
 
                     if order_field:
@@ -798,18 +800,18 @@ def update_route_system(header, itin, vertices_comprising, split_dict_ABB, new_A
                             pass  # T_MEAS & ARR_TIME are already correct for itin_b
         else:
             if order_field:
-                itin_dict[OID][order_field] += order_bump
+                itin_orders[i] += order_bump
 
-    for OID in bad_itin_OIDs:
-        del itin_dict[OID]  # Remove invalid ABB records after accounting for splits
-
-    # Combine itinerary dicts, adjust ITIN_ORDER and report new gaps and write
-    # updated records to table in memory.
-    itin_dict.update(split_itin_dict)
+    # Write the valid original records (with adjusted ITIN_ORDER), followed by
+    # the split records, to table in memory. Invalid ABB records are omitted,
+    # after accounting for splits.
     itin_fields = [field.name for field in arcpy.ListFields(itin_copy) if field.type != 'OID']
+    itin_columns = [itin_orders if field == order_field else itin_table[field].tolist() for field in itin_fields]
     with arcpy.da.InsertCursor(itin_copy, itin_fields) as coding_cursor:
-        for OID in itin_dict:
-            coding_cursor.insertRow([itin_dict[OID][field] for field in itin_fields])
+        for i in np.flatnonzero(keep_itin_rows):
+            coding_cursor.insertRow([column[i] for column in itin_columns])
+        for OID in sorted(split_itin_dict):
+            coding_cursor.insertRow([split_itin_dict[OID][field] for field in itin_fields])
 
     # Sort records into a second table in memory.
     itin_updated = os.path.join(MHN.mem, '{}_itin_updated'.format(header_name))
@@ -863,13 +865,14 @@ def update_route_system(header, itin, vertices_comprising, split_dict_ABB, new_A
                 )
 
     # Append the header file attribute values from a search cursor of the original.
-    attributes = MHN.make_attribute_dict(header, common_id_field)
     update_fields = [f.name for f in arcpy.ListFields(header) if f.type not in ['OID', 'Geometry'] and f.name.upper() != 'SHAPE_LENGTH']
+    attributes = MHN.make_attribute_table(header, common_id_field, update_fields)
     with arcpy.da.UpdateCursor(header_updated, update_fields) as attribute_cursor:
         for row in attribute_cursor:
             common_id = row[update_fields.index(common_id_field)]
+            header_attributes = attributes.record(common_id)
             for field in [field for field in update_fields if field != common_id_field]:
-                row[update_fields.index(field)] = attributes[common_id][field]
+                row[update_fields.index(field)] = header_attributes[field]
             attribute_cursor.updateRow(row)
 
     return ((header, header_updated), (itin, itin_updated))
@@ -932,6 +935,8 @@ for updated_route_system in updated_route_systems_list:
     arcpy.Append_management(itin_updated, itin, 'NO_TEST')
     arcpy.Delete_management(itin_updated)
 
+MHN.invalidate_snapshot()  # Arcs, nodes and hwyproj coding have all changed
+
 # Rebuild relationship classes.
 arcpy.AddMessage('\nRebuilding relationship classes...')
 for route_system in MHN.route_systems:
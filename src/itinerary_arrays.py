@@ -0,0 +1,345 @@
+#!/usr/bin/env python
+'''
+    itinerary_arrays.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    Array-based calculations on route system itineraries, used by
+    MHN.calculate_itin_measures() and MHN.validate_itin_times(). Each takes
+    one NumPy array per itinerary field (rows in any order) and returns
+    arrays of the new values in the same row order, so that they can be
+    written back to the itinerary table in a single pass (see
+    changed_itin_values()).
+
+    The row-by-row cursor loops they replace are kept here, as
+    loop_itin_measures() and loop_itin_times(), and running this script
+    checks that both give the same results on synthetic itineraries, and
+    times them:
+
+      itinerary_arrays.py [segment_count]
+
+'''
+import sys
+import time
+
+import numpy as np
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def itin_order(lines, orders):
+    ''' Return the indices that sort itinerary rows by TRANSIT_LINE, then
+        ITIN_ORDER (i.e. ORDER BY TRANSIT_LINE, ITIN_ORDER), and a boolean
+        array (in that order) of the rows beginning a new route. '''
+    lines = np.asarray(lines)
+    orders = np.asarray(orders)
+    order = np.lexsort((orders, lines))
+    sorted_lines = lines[order]
+    starts = np.ones(len(order), dtype=bool)
+    starts[1:] = sorted_lines[1:] != sorted_lines[:-1]
+    return order, starts
+
+
+def itin_measures(lines, orders, miles):
+    ''' Return (f_meas, t_meas) arrays of each itinerary segment's start and
+        end position along its route, as a percentage of the route's total
+        MILES. As in the original loop, the running total is reset at each
+        segment with ITIN_ORDER = 1. '''
+    lines = np.asarray(lines)
+    orders = np.asarray(orders)
+    miles = np.asarray(miles, dtype=float)
+    f_meas = np.zeros(len(lines))
+    t_meas = np.zeros(len(lines))
+    if len(lines) == 0:
+        return f_meas, t_meas
+    line_ids, line_index = np.unique(lines, return_inverse=True)
+    route_miles = np.bincount(line_index, weights=miles, minlength=len(line_ids))
+
+    order = itin_order(lines, orders)[0]
+    percent = miles[order] / route_miles[line_index[order]] * 100
+    resets = orders[order] == 1
+    resets[0] = True
+
+    # Grouped cumulative sum: the running total, less its value before the
+    # first segment of each reset group.
+    cumulative = np.cumsum(percent)
+    first = np.maximum.accumulate(np.where(resets, np.arange(len(order)), 0))
+    t_sorted = cumulative - (cumulative[first] - percent[first])
+    f_sorted = np.zeros(len(order))
+    f_sorted[1:] = t_sorted[:-1]
+    f_sorted[resets] = 0
+
+    f_meas[order] = f_sorted
+    t_meas[order] = t_sorted
+    return f_meas, t_meas
+
+
+def loop_itin_measures(lines, orders, miles):
+    ''' The original row-by-row version of itin_measures(). '''
+    route_miles_dict = {}
+    for route, segment_length in zip(lines, miles):
+        if route in route_miles_dict:
+            route_miles_dict[route] += segment_length
+        else:
+            route_miles_dict[route] = segment_length
+    f_meas = [None] * len(lines)
+    t_meas = [None] * len(lines)
+    cumulative_percent = 0
+    for i in sorted(range(len(lines)), key=lambda i: (lines[i], orders[i])):
+        if orders[i] == 1:  # Beginning of new route
+            cumulative_percent = 0
+        segment_percent = miles[i] / route_miles_dict[lines[i]] * 100
+        f_meas[i] = cumulative_percent
+        cumulative_percent = cumulative_percent + segment_percent
+        t_meas[i] = cumulative_percent
+    return f_meas, t_meas
+
+
+def itin_times(lines, orders, dep_times, arr_times, line_serv_times, miles):
+    ''' Return (dep_times, arr_times, line_serv_times) arrays of each
+        itinerary segment's times (seconds, and minutes), after the QC done
+        by MHN.validate_itin_times(). miles is the MILES of each segment's
+        arc, or NaN if unknown (which raises a KeyError, with the row index,
+        if that segment needs its travel time estimated).
+
+        Rows are taken in TRANSIT_LINE, ITIN_ORDER order. In the original
+        loop, each segment's departure is moved forward to the (adjusted)
+        arrival of the previous row, unless it has ITIN_ORDER = 1, and any
+        segment whose departure then equals its arrival has its travel time
+        estimated at 30 mph. Each row's adjusted arrival is therefore either
+        "fresh" (its own arrival, plus the estimate if it departs when it
+        arrives) or "carried" (the previous row's adjusted arrival, plus the
+        estimate), and within a run of carried rows it is the cumulative
+        maximum of the fresh arrivals less the cumulative estimates. That
+        maximum over-estimates the arrivals of rows whose arrival the
+        previous row falls just short of (they are really fresh), so such
+        rows are found and made fresh, until none remain.
+
+        Times must be whole seconds; otherwise the loop is used. '''
+    lines = np.asarray(lines)
+    orders = np.asarray(orders)
+    dep_times = np.asarray(dep_times)
+    arr_times = np.asarray(arr_times)
+    miles = np.asarray(miles, dtype=float)
+    if not all(np.array_equal(times, np.round(times)) for times in (dep_times, arr_times)):
+        loop_times = loop_itin_times(lines.tolist(), orders.tolist(), dep_times.tolist(), arr_times.tolist(),
+                                     np.asarray(line_serv_times).tolist(), miles.tolist())
+        return tuple(np.array(values) for values in loop_times)
+    n = len(lines)
+    order = itin_order(lines, orders)[0]
+
+    # Sorted arrays, preceded by a row arriving at 0 (the loop's initial
+    # prev_arr_time), which resets.
+    d = np.concatenate(([0], dep_times[order])).astype(np.int64)
+    a = np.concatenate(([0], arr_times[order])).astype(np.int64)
+    m = np.concatenate(([0.0], miles[order]))
+    resets = np.concatenate(([True], orders[order] <= 1))
+    known = ~np.isnan(m)
+    est = np.zeros(n + 1, dtype=np.int64)
+    est[known] = np.rint(m[known] / 30 * 60 * 60).astype(np.int64)  # Seconds, as int(round())
+
+    fresh_arr = np.where(a == d, a + est, a)
+    total_est = np.cumsum(est)
+    fresh = resets.copy()
+    while True:
+        # Cumulative maximum within each run of carried rows, by offsetting
+        # each run above the last.
+        value = fresh_arr - total_est
+        run = np.cumsum(fresh) - 1
+        offset = value.max() - value.min() + 1
+        prev_arr = np.maximum.accumulate(value + run * offset) - run * offset + total_est
+        prev_arr = np.concatenate(([0], prev_arr[:-1]))
+        carried = (prev_arr > d) & (prev_arr >= a)
+        newly_fresh = ~fresh & ~carried & (prev_arr + est > fresh_arr)
+        if not newly_fresh.any():
+            break
+        fresh |= newly_fresh
+
+    shifted = ~resets & (d < prev_arr)
+    new_dep = np.where(shifted, prev_arr, d)
+    new_arr = np.where(shifted, np.maximum(a, prev_arr), a)
+    imputed = new_dep == new_arr
+    if (imputed & ~known).any():
+        raise KeyError(int(order[np.flatnonzero(imputed & ~known)[0] - 1]))
+    new_arr = new_arr + np.where(imputed, est, 0)
+
+    new_ltime = np.asarray(line_serv_times, dtype=float)[order]
+    est_values, est_index = np.unique(est[1:][imputed[1:]], return_inverse=True)
+    est_minutes = np.array([max(round(t / 60., 1), 0.1) for t in est_values.tolist()])  # Minutes (1 d.p.)
+    new_ltime[imputed[1:]] = est_minutes[est_index]
+
+    out_dep = np.empty(n, dtype=np.int64)
+    out_arr = np.empty(n, dtype=np.int64)
+    out_ltime = np.empty(n)
+    out_dep[order] = new_dep[1:]
+    out_arr[order] = new_arr[1:]
+    out_ltime[order] = new_ltime
+    return out_dep, out_arr, out_ltime
+
+
+def loop_itin_times(lines, orders, dep_times, arr_times, line_serv_times, miles):
+    ''' The original row-by-row version of itin_times(). '''
+    dep_times = list(dep_times)
+    arr_times = list(arr_times)
+    line_serv_times = list(line_serv_times)
+    prev_arr_time = 0
+    for i in sorted(range(len(lines)), key=lambda i: (lines[i], orders[i])):
+        row_order = orders[i]
+        dep_time = dep_times[i]
+        arr_time = arr_times[i]
+        ltime = line_serv_times[i]
+
+        # Adjust dep_time & arr_time to accommodate changes to last segment
+        if row_order > 1 and dep_time < prev_arr_time:
+            discrep_d = prev_arr_time - dep_time
+            dep_time += discrep_d
+            if arr_time < dep_time:
+                discrep_a = dep_time - arr_time  # Likely = discrep_d, but may be lower
+                arr_time += discrep_a
+
+        # Re-estimate segment travel time (@ 30mph) when dep_time = arr_time
+        if dep_time == arr_time:
+            if miles[i] != miles[i]:  # NaN: ABB not found
+                raise KeyError(i)
+            time_est = int(round(miles[i] / 30 * 60 * 60))  # Seconds
+            arr_time += time_est
+            ltime = max(round(time_est / 60., 1), 0.1)  # Minutes (1 d.p.)
+
+        dep_times[i], arr_times[i], line_serv_times[i] = dep_time, arr_time, ltime
+        prev_arr_time = arr_time
+    return dep_times, arr_times, line_serv_times
+
+
+def changed_itin_values(old_values, new_values, null_values):
+    ''' Compare the original values of each field (e.g. DEP_TIME, ARR_TIME
+        and LINE_SERV_TIME) with their new values (e.g. from itin_times()),
+        field by field. null_values gives, for each field, the value its
+        NULLs were read as (or None, if it has none). Returns a boolean array
+        of the rows with any changed field, and a list per field of the
+        values to write to those rows: the new value where that field
+        changed, otherwise the original value, with NULLs written back as
+        None rather than as their placeholder. '''
+    changed_fields = [np.asarray(old) != np.asarray(new) for old, new in zip(old_values, new_values)]
+    changed = np.logical_or.reduce(changed_fields)
+    values = []
+    for old, new, field_changed, null in zip(old_values, new_values, changed_fields, null_values):
+        old = np.asarray(old)[changed].tolist()
+        new = np.asarray(new)[changed].tolist()
+        values.append([
+            new_value if is_changed else (None if null is not None and old_value == null else old_value)
+            for old_value, new_value, is_changed in zip(old, new, field_changed[changed].tolist())
+        ])
+    return changed, values
+
+
+def synthetic_itineraries(segment_count, seed=0):
+    ''' Return (lines, orders, miles) arrays of roughly segment_count
+        itinerary segments, in shuffled row order, for routes of 5-80
+        segments. '''
+    rng = np.random.default_rng(seed)
+    lengths = []
+    while sum(lengths) < segment_count:
+        lengths.append(int(rng.integers(5, 81)))
+    lines = np.repeat(np.array(['b{:07d}'.format(i) for i in range(len(lengths))]), lengths)
+    orders = np.concatenate([np.arange(1, n + 1) for n in lengths])
+    miles = np.round(rng.gamma(2.0, 0.15, len(lines)), 2)
+    shuffle = rng.permutation(len(lines))
+    return lines[shuffle], orders[shuffle], miles[shuffle]
+
+
+def synthetic_itin_times(lines, orders, miles, seed=0):
+    ''' Return (dep_times, arr_times, line_serv_times) arrays for the output
+        of synthetic_itineraries(), with the problems validate_itin_times()
+        fixes: segments that depart before the previous one arrives (some of
+        them arriving before they depart, too), segments with no travel
+        time, and routes whose first segment is not ITIN_ORDER 1. '''
+    rng = np.random.default_rng(seed)
+    order = np.lexsort((orders, lines))
+    n = len(order)
+    run_time = rng.integers(20, 240, n)
+    run_time[rng.random(n) < 0.15] = 0                     # No travel time
+    dwell = rng.integers(0, 30, n)
+    starts = np.ones(n, dtype=bool)
+    starts[1:] = lines[order][1:] != lines[order][:-1]
+    route_start = rng.integers(4 * 3600, 24 * 3600, n)
+    elapsed = np.cumsum(run_time + dwell)
+    first = np.maximum.accumulate(np.where(starts, np.arange(n), 0))
+    dep = route_start[first] + elapsed - elapsed[first] - run_time
+    early = rng.random(n) < 0.1                            # Depart before the previous arrival
+    dep[early] -= rng.integers(1, 300, n)[early]
+    arr = dep + run_time
+    backwards = early & (rng.random(n) < 0.3)              # ... and arrive before departing
+    arr[backwards] = dep[backwards] - rng.integers(1, 120, n)[backwards]
+    ltime = np.round(run_time / 60., 1)
+    sorted_orders = orders[order].copy()
+    late_start = starts & (rng.random(n) < 0.05)           # Route beginning at ITIN_ORDER 2
+    sorted_orders[late_start] += 1
+
+    dep_times = np.empty(n, dtype=np.int64)
+    arr_times = np.empty(n, dtype=np.int64)
+    line_serv_times = np.empty(n)
+    dep_times[order], arr_times[order], line_serv_times[order] = dep, arr, ltime
+    orders = orders.copy()
+    orders[order] = sorted_orders
+    return orders, dep_times, arr_times, line_serv_times
+
+
+# -----------------------------------------------------------------------------
+#  Check and time the array versions against the loops.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    segment_count = int(sys.argv[1]) if len(sys.argv) > 1 else 300000
+    lines, orders, miles = synthetic_itineraries(segment_count)
+    line_list, order_list, miles_list = lines.tolist(), orders.tolist(), miles.tolist()
+    failed = False
+
+    start_time = time.perf_counter()
+    loop_f, loop_t = loop_itin_measures(line_list, order_list, miles_list)
+    loop_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    f_meas, t_meas = itin_measures(lines, orders, miles)
+    array_seconds = time.perf_counter() - start_time
+    matches = np.allclose(f_meas, loop_f, rtol=1e-9, atol=1e-9) and np.allclose(t_meas, loop_t, rtol=1e-9, atol=1e-9)
+    failed |= not matches
+    print('{0:<18} {1:>8.3f} s loop {2:>8.3f} s arrays  {3}'.format(
+        'itin_measures', loop_seconds, array_seconds, 'MATCH' if matches else 'MISMATCH'))
+
+    orders, dep_times, arr_times, line_serv_times = synthetic_itin_times(lines, orders, miles)
+    order_list = orders.tolist()
+    start_time = time.perf_counter()
+    loop_times = loop_itin_times(line_list, order_list, dep_times.tolist(), arr_times.tolist(),
+                                 line_serv_times.tolist(), miles_list)
+    loop_seconds = time.perf_counter() - start_time
+    start_time = time.perf_counter()
+    array_times = itin_times(lines, orders, dep_times, arr_times, line_serv_times, miles)
+    array_seconds = time.perf_counter() - start_time
+    matches = all(np.array_equal(np.array(expected), actual) for expected, actual in zip(loop_times, array_times))
+    failed |= not matches
+    print('{0:<18} {1:>8.3f} s loop {2:>8.3f} s arrays  {3}'.format(
+        'itin_times', loop_seconds, array_seconds, 'MATCH' if matches else 'MISMATCH'))
+
+    # NULL LINE_SERV_TIMEs (read as -1, as by MHN.validate_itin_times()) must
+    # only be written if re-estimated, even when DEP_TIME/ARR_TIME shift.
+    null_ltimes = line_serv_times.copy()
+    null_ltimes[::7] = -1
+    old_times = (dep_times, arr_times, null_ltimes)
+    new_times = itin_times(lines, orders, dep_times, arr_times, null_ltimes, miles)
+    changed, values = changed_itin_values(old_times, new_times, (None, None, -1))
+    was_null = null_ltimes[changed] == -1
+    estimated = new_times[2][changed] != -1
+    written = np.array(values[2], dtype=object)
+    shifted_nulls = int((was_null & ~estimated).sum())
+    matches = (
+        shifted_nulls > 0 and
+        all(value is None for value in written[was_null & ~estimated]) and
+        np.array_equal(written[was_null & estimated].astype(float), new_times[2][changed][was_null & estimated]) and
+        all(np.array_equal(np.array(written_values), np.asarray(new)[changed])
+            for written_values, new in zip(values[:2], new_times[:2]))
+    )
+    failed |= not matches
+    print('{0:<18} {1:>8} rows with NULL LINE_SERV_TIME kept NULL  {2}'.format(
+        'changed_itin_values', shifted_nulls, 'MATCH' if matches else 'MISMATCH'))
+
+    print('{} segments of {} routes.'.format(len(lines), len(np.unique(lines))))
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,518 @@
+#!/usr/bin/env python
+'''
+    mhn_core.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    The GDB-agnostic variables and methods of the MasterHighwayNetwork class
+    (scenario years, centroid ranges, TOD periods, TIPID helpers, etc.),
+    which it inherits from MHNCore. This module only imports the standard
+    library, so scripts that only need these (e.g. those called from SAS)
+    can import it in a few milliseconds, without arcpy or an MHN
+    geodatabase:
+
+      from mhn_core import MHNCore as MHN
+      MHN.tipid_from_int(1020003)  # '01-02-0003'
+
+    Run this script to measure its import time (and that of MHN.py):
+
+      mhn_core.py
+
+'''
+import os
+import sys
+
+
+class MHNCore(object):
+    ''' GDB-agnostic variables and methods relating to the MHN processing
+        scripts. '''
+
+    # -----------------------------------------------------------------------------
+    #  SET GDB-AGNOSTIC VARIABLES
+    # -----------------------------------------------------------------------------
+    base_year = 2015  # BASELINK=1 network year, not necessarily scenario 100 (i.e. base_year was recently 2009, while scenario 100 was 2010)
+
+    bus_years = {
+        'base':    2015,  # Year that bus_base feature class represents
+        'current': 2024   # Year that bus_current feature class represents
+        #"current" yr will change if different year specified in MHN object init
+    }
+
+    centroid_ranges = {
+        ## zones17 (C19Q1 and later)
+        'CBD':     range(   1,   48),  # NB. range(i,j) includes i & *excludes* j
+        'Chicago': range(   1,  718),
+        'Cook':    range(   1, 1733),
+        'McHenry': range(2584, 2703),
+        'Lake':    range(2326, 2584),
+        'Kane':    range(2112, 2305),
+        'DuPage':  range(1733, 2112),
+        'Will':    range(2703, 2927),
+        'Kendall': range(2305, 2326),
+        'MHN':     range(   1, 3650),
+        'POE':     range(3633, 3650),
+        'CMAP': {
+            '7_Counties':  range(   1, 2927),
+            'Grundy_Part': range(2949, 2950),
+            'DeKalb_Part': range(2977, 2978)
+        }
+
+        # ## zones09 (C18Q3 and earlier)
+        # 'CBD':     range(   1,   48),  # NB. range(i,j) includes i & *excludes* j
+        # 'Chicago': range(   1,  310),
+        # 'Cook':    range(   1,  855),
+        # 'McHenry': range( 855,  959),
+        # 'Lake':    range( 959, 1134),
+        # 'Kane':    range(1134, 1279),
+        # 'DuPage':  range(1279, 1503),
+        # 'Will':    range(1503, 1691),
+        # 'Kendall': range(1691, 1712),
+        # 'CMAP':    range(   1, 1712),
+        # 'MHN':     range(   1, 1962),
+        # 'POE':     range(1945, 1962)
+    }
+
+    min_node_id =  5001  # 1-5000 reserved for zone centroids/POEs
+    max_node_id = 29999  # 30000+ reserved for MRN nodes
+
+    min_poe = min(centroid_ranges['POE'])
+    max_poe = max(centroid_ranges['POE'])
+
+    scenario_years = {
+        ### Current scenario codes (C22Q2 and later)
+        '100': 2019,  # WARNING: commenting-out 100 will adversely affect transit file generation for later scenarios
+        '200': 2025,
+        '300': 2030,
+        '400': 2035,
+        '500': 2040,
+        '600': 2045,  # UrbanSim only
+        '700': 2050
+
+        ### Old scenario codes (C17Q2-C21Q4)
+        # '100': 2015,  # WARNING: commenting-out 100 will adversely affect transit file generation for later scenarios
+        # '200': 2020,
+        # '300': 2025,
+        # '400': 2030,
+        # '500': 2035,  # Not currently used
+        # '600': 2040,
+        # '700': 2050
+
+        ### Older scenario codes (C17Q1 and earlier):
+        # '100': 2010,  # WARNING: commenting-out 100 will adversely affect transit file generation for later scenarios
+        # '200': 2015,
+        # '300': 2020,
+        # '400': 2025,
+        # '500': 2030,
+        # '600': 2040
+    }
+
+    min_year = min(scenario_years.values())
+    max_year = max(scenario_years.values())
+
+    # Highway/transit TODs.
+    tod_periods = {
+        'highway': {
+            '1':  ('8PM-6AM',                                   # 1: overnight
+                   '"STARTHOUR" >= 20 OR "STARTHOUR" <= 5'),
+            '2':  ('6AM-7AM',                                   # 2: AM shoulder 1
+                   '"STARTHOUR" = 6'),
+            '3':  ('7AM-9AM',                                   # 3: AM peak
+                   '"STARTHOUR" IN (7, 8)'),
+            '4':  ('9AM-10AM',                                  # 4: AM shoulder 2
+                   '"STARTHOUR" = 9'),
+            '5':  ('10AM-2PM',                                  # 5: midday
+                   '"STARTHOUR" >= 10 AND "STARTHOUR" <= 13'),
+            '6':  ('2PM-4PM',                                   # 6: PM shoulder 1
+                   '"STARTHOUR" IN (14, 15)'),
+            '7':  ('4PM-6PM',                                   # 7: PM peak
+                   '"STARTHOUR" IN (16, 17)'),
+            '8':  ('6PM-8PM',                                   # 8: PM shoulder 2
+                   '"STARTHOUR" IN (18, 19)'),
+        },
+        # Condensed TODs for transit (C22Q2 and later)
+        'transit': {
+            '1':  ('6PM-6AM',                                  # 1: overnight
+                   '"STARTHOUR" >= 18 OR "STARTHOUR" < 6'),
+            '2':  ('6AM-9AM',                                  # 2: AM peak
+                   '"STARTHOUR" >= 6 AND "STARTHOUR" < 9'),
+            '3':  ('9AM-4PM',                                  # 3: midday
+                   '"STARTHOUR" >= 9 AND "STARTHOUR" < 16'),
+            '4':  ('4PM-6PM',                                  # 4: PM peak
+                   '"STARTHOUR" >= 16 AND "STARTHOUR" < 18')
+            
+            ### Replaced by longer transit AM peak period (C22Q2 and later)
+            # 'am': ('7AM-9AM',                                  # am: Same as TOD 3, but for buses w/ >50% service in period
+            #        '"AM_SHARE" >= 0.5')
+        }
+    }
+    
+    ampm_tods = {
+        'highway': {
+            '1': ('1', '2', '3', '4', '5', '6', '7', '8'),  # All periods
+            '2': ('2', '3', '4', '5'),                      # AM periods
+            '3': ('1', '6', '7', '8'),                      # PM periods
+            '4': ('1', '5'),                                # Off-peak periods
+            '5': ('2','3','4','6','7','8')                  # AM/PM Peaks + Shoulders
+        },
+        'transit': {
+            '1': ('1', '2', '3', '4'),  # All periods
+            '2': ('2', '3'),            # AM periods
+            '3': ('1', '4'),            # PM periods
+            '4': ('1', '3')             # Off-peak periods
+        }
+    }
+
+    rsps = {
+        3:   "McHenry-Lake Corridor",
+        6:   "IL 31/Front St",
+        10:  "IL 60",
+        11:  "IL 62/Algonquin Rd",
+        13:  "IL 83/Barron Blvd",
+        14:  "IL 131/Greenbay Rd",
+        15:  "IL 173/Rosecrans Rd",
+        20:  "Elgin O'Hare Western Access",
+        21:  "I-290/IL 53 Interchange Improvement",
+        22:  "I-294/I-57 Interchange Addition",
+        23:  "I-294 Central Tri-State Mobility Improvements",
+        24:  "I-290/I-88/I-294 Interchange Improvement",
+        25:  "Central Lake County Corridor: IL 53 North & IL 120",
+        29:  "I-55 Managed Lane",
+        30:  "I-290 Eisenhower Reconstruction & Managed Lane",
+        31:  "Illiana Corridor",
+        32:  "I-190 Access Improvements",
+        33:  "Jane Byrne Interchange Reconstruction",
+        34:  "I-55 Add Lanes & Reconstruction",
+        35:  "I-57 Add Lanes",
+        36:  "I-80 Reconstruction & Managed Lanes",
+        37:  "I-80 Managed Lanes",
+        38:  "I-80 to I-55 Connector",
+        46:  "Randall Rd",
+        51:  "North Algonquin Fox River Crossing",
+        53:  "Caton Farm-Bruce Rd Corridor",
+        55:  "Laraway Rd",
+        56:  "Wilmington-Peotone Rd",
+        57:  "Red Line Extension (South)",
+        58:  "(58A/B) Red Purple Modernization",
+        59:  "Blue Line West Extension",
+        60:  "Brown Line Extension",
+        61:  "Circle Line South (Phase II)",
+        62:  "Circle Line North (Phase III)",
+        63:  "Orange Line Extension",
+        64:  "Yellow Line Enhancements & Extension",
+        66:  "UP Northwest Extension",
+        67:  "SouthWest Service Improvements / 75th St Corridor Improvement Program Elements",
+        68:  "UP North Improvements",
+        69:  "UP West Improvements",
+        70:  "Rock Island Improvements",
+        71:  "BNSF Extension-Oswego/Plano",
+        72:  "BNSF Improvements",
+        73:  "Heritage Corridor Improvements",
+        74:  "Metra Electric Improvements",
+        75:  "Metra Electric Extension",
+        76:  "Milwaukee District North Extension-Wadsworth",
+        77:  "Milwaukee District North Improvements",
+        78:  "Milwaukee District West Extension-Marengo",
+        79:  "Milwaukee District West Improvements",
+        80:  "North Central Service Improvements",
+        81:  "Rock Island Extension",
+        82:  "SouthEast Service",
+        83:  "SouthWest Extension",
+        84:  "STAR Line",
+        85:  "West Loop Transportation Center Phase I",
+        87:  "Mid-City Transitway",
+        88:  "West Loop Transportation Center Phase II",
+        89:  "North Lake Shore Drive Improvements",
+        93:  "Blue Line Forest Park Branch Reconstruction",
+        94:  "Brown Line Capacity Expansion",
+        98:  "A-2 Crossing Rebuild",
+        102: "(102A) Pulse-ART Expansion",
+        103: "River North-Streeterville Transit Improvements",
+        104: "South Lakefront-Museum Campus Access Improvement",
+        105: "Express Bus Expansion",
+        106: "Ashland Ave BRT",
+        107: "Green Line Extension",
+        108: "South Halsted BRT",
+        109: "IL 43/Harlem Ave",
+        110: "IL 47",
+        111: "IL 83/Kingery Hwy",
+        112: "US 12/95th St",
+        113: "US 20/Lake St",
+        114: "US 45/Olde Half Day Rd",
+        115: "BNSF Extension-Sugar Grove",
+        116: "Heritage Corridor Extension",
+        117: "Milwaukee District North Extension-Richmond",
+        118: "Milwaukee District West Extension-Hampshire",
+        119: "STAR Line Eastern Segment",
+        120: "STAR Line Northern Segment",
+        121: "Rock Island RER Service",
+        122: "UP North RER Service",
+        123: "UP Northwest RER Service",
+        124: "CrossRail Chicago",
+        125: "North Lakefront Light Rail Line",
+        126: "South Lakefront Light Rail Line",
+        127: "Superloop Light Rail Line",
+        128: "Madison Street & Jackson Street Light Rail Lines",
+        129: "Clark Street Light Rail Line",
+        130: "Downtown Ring Light Rail Line",
+        131: "The Burnham Ring Light Rail Line",
+        132: "Milwaukee Avenue Streetcar & O'Hare Blue Line Express",
+        134: "Cross-Town Tollway & CTA Route",
+        135: "I-94 Bishop Ford Expressway",
+        136: "I-90/1-94 Kennedy & Dan Ryan Expressways",
+        137: "I-55 Stevenson Expressway",
+        138: "I-90 Kennedy Expressway",
+        139: "I-94 Edens Expressway",
+        140: "I-90/I-94 Kennedy Expressway",
+        141: "I-290/IL-53",
+        142: "I-57",
+        143: "Modern Metra Electric",
+        144: "S.M.A.R.T. - Suburban Metropolitan Area Rapid Transit",
+        145: "Vollmer Rd",
+        146: "I-55 Dual Managed Lane",
+        147: "Blue Line Capacity",
+        151: "CREATE GS-02",
+        152: "Elston-Armitage-Ahsland-Cortland Intersection",
+        153: "Ashland-Ogden Metra Infill Station",
+        154: "South Halsted Bus Enhancements",
+        155: "I-294 BRT Stations",
+        156: "Milwaukee Corridor/O'Hare Improvements",
+        157: "I-57 & Eagle Lake Rd Interchange",
+        158: "US 6",
+        159: "US 30",
+        160: "US 45 & Milburn Bypass",
+        161: "IL 7/143rd St",
+        162: "IL 47",
+        163: "IL 56",
+        164: "IL 60",
+        166: "IL 47 Cross St to Kennedy Rd",
+        9901: "(A1) O'Hare Express Service",
+        9902: "(A2) South Lakefront Improvements",
+        9903: "(A3) I-55 Reconstruction & IL 126 Interchange Reconfiguration",
+        9904: "(A4) I-55/IL 59 Interchange",
+    }
+    
+    #2026 LRTP - Regional Capital Project list
+    rcps = {
+        12121: 'North DuSable LSD Improvements',
+        12129: '75th Street Corridor Improvement Project (CIP)',
+        13104: "I-190 O'Hare Access Improvements",
+        13106: 'I-55 - I-80 to Coal City Road',
+        13107: 'I-55 - IL 129 to Lorenzo Road',
+        13108: 'I-55 Managed Lane I-355 to I-294',
+        13110: 'I-55 - I-80 to US 52',
+        13111: 'I-55 - I-355 to IL 53',
+        13112: 'I-80/I-294 Flex Lanes',
+        13113: 'I-80 - U.S. 30 to I-294 ',
+        13114: 'I-290 - Mannheim Rd to Racine Ave ',
+        13115: 'IL 60 - IL 176 to Townline Rd ',
+        13116: 'IL 173 - IL 59 to US 41 ',
+        13117: 'McHenry Rd - IL 173 to IL 132',
+        13118: 'Algonquin Rd - IL 25 to IL 68',
+        13119: 'Milwaukee Ave from Petite Lake Rd to IL 120',
+        13120: 'IL Route 131 - Russell Rd to Sunset Ave',
+        13122: 'IL 47 - Charles Rd to Reed Road ',
+        13123: 'IL 83 - 31st to 55th, 63rd to Central ',
+        13124: 'US 6 - I-55 to US 52',
+        13125: 'US 30 - IL 47 to Albright Rd',
+        13126: 'IL 7/143rd - Will-Cook Rd to IL7',
+        13127: 'IL 47 -  I-90 to Old Plank Rd ',
+        13128: 'IL 56 from IL 25 to IL 59 ',
+        13130: 'IL 60 from IL 120 to IL 176 ',
+        13131: 'IL 31 Front St - IL 120 to IL 176 ',
+        13132: 'Willow Rd from E of I-294 to E of IL 43, from IL 43 to I-94, and over Middle Fork of N Branch of Chicago River to W of Sunset Ridge Rd',
+        13133: 'Willow Rd from E of Des Plaines River to Waterview Dr./Protection Parkway',
+        13134: 'IL 53 from S of IL 56 Butterfield Rd to Park Blvd',
+        13135: 'IL 22 Lake Zurich Rd from Quentin Rd to W of IL 83',
+        13136: 'US 41 Skokie Hwy from Quassey Avenue to 0.5 Miles S of IL 176',
+        13137: 'IL 137 Buckley Rd from IL 83 to Petersen Rd',
+        13139: 'Ill 120 Belvidere Rd - Ashford Ln to US 45',
+        13140: 'US 45 Lake Ave from Rollins Rd to Washington St and US 45 from Washington St to N of IL 120',
+        14109: 'I-55- Weber Road to US 30',
+        14138: 'IL 83 (Barron Blvd.), IL 120 (Belvidere Rd.) to IL 137 & At Atkinson Rd.',
+        14141: 'IL 120 from Wilson Rd to US 41 IL 53/120 Tollway (IL 120 Bypass)',
+        14142: 'US 12 Richmond West Bypass from Wisconsin State Line to IL 31 Tryon Grove Rd',
+        14161: 'I-57 Interchange Improvements',
+        # 32151: 'Metra BNSF Line Improvements',
+        # 33147: 'Metra Electric Line Improvements',
+        # 33148: 'Metra Rock Island Improvements',
+        # 33149: 'Metra SWS Line Improvements',
+        # 33150: 'Metra HC Line Improvements',
+        # 33152: 'Metra UPW Line Improvements',
+        # 33153: 'Metra MDW Line Improvements',
+        # 33154: 'Metra UPNW Line Improvements & Extension',
+        # 33155: 'Metra MDN Line Improvements',
+        # 33156: "Metra O'Hare Express & NCS Line Improvements",
+        # 33157: 'Metra UPN Line Improvements',
+        33158: 'A2 Crossing Modernization',
+        44101: 'North McHenry Fox River Crossing',
+        44102: 'Northern Algonquin Bypass',
+        54103: 'IL 390 Interchange to County Farm Road',
+        54105: '1-88 York Road Interchange Expansion',
+        62143: 'South Lakefront Busway',
+        62159: 'Elston-Armitage Intersection Improvements',
+        62160: 'Devon-Caldwell Intersection Improvements',
+        # 63144: 'AOK Station',
+        # 63145: 'Pink Line Madison Station',
+        # 63146: 'Divison Station'
+    }
+
+
+    # -----------------------------------------------------------------------------
+    #  DEFINE METHODS
+    # -----------------------------------------------------------------------------
+    @staticmethod
+    def break_path(fullpath):
+        ''' Splits a full-path string into a dictionary, containing 'dir', 'name'
+            and 'ext' values. '''
+        split1 = os.path.split(fullpath)
+        directory = split1[0]
+        filename_ext = split1[1]
+        split2 = os.path.splitext(split1[1])
+        filename = split2[0]
+        extension = split2[1]
+        return {'dir': directory, 'name': filename, 'ext': extension, 'name_ext': filename_ext}
+
+
+    @staticmethod
+    def determine_arc_bearing(line_geom):
+        ''' Determines the cardinal direction of a single arc, determined from its
+            two endpoints. The angle is determined by the atan2() function, and
+            after some numeric manipulation is then used to select the correct
+            cardinal direction from an ordered list of possibilities. '''
+        from math import atan2, degrees, floor
+        x1 = line_geom.firstPoint.X
+        y1 = line_geom.firstPoint.Y
+        x2 = line_geom.lastPoint.X
+        y2 = line_geom.lastPoint.Y
+        xdiff = x2 - x1
+        ydiff = y2 - y1
+        angle = degrees(atan2(ydiff, xdiff))
+        index = int(floor(((angle + 22.5) % 360) / 45))
+        cardinal_dirs = ('E', 'NE', 'N', 'NW', 'W', 'SW', 'S', 'SE')  # Order here is critical
+        bearing = cardinal_dirs[index]
+        return bearing
+
+
+    @staticmethod
+    def determine_tolltype(vdf, cost):
+        ''' Automatically determine TOLLTYPE code, based on link's VDF and
+            toll cost. '''
+        if cost > 0:
+            if vdf == '7':
+                tolltype = '1'  # Fixed cost toll (i.e. toll plaza)
+            else:
+                tolltype = '2'  # Per-mile rate (i.e. distance-based tolling)
+        else:
+            tolltype = '0'  # N/A (not tolled)
+        return tolltype
+
+
+    @staticmethod
+    def ensure_dir(directory):
+        ''' Checks for the existence of a directory, creating it if it doesn't
+            exist yet. '''
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        return directory
+
+
+    @staticmethod
+    def is_tipid(in_str):
+        ''' Check whether a string is a properly formatted TIPID. '''
+        is_tipid = False
+        try:
+            if len(in_str) == 10:
+                pt1, pt2, pt3 = (int(pt) for pt in in_str.split('-'))
+                if (0 <= pt1 <= 99) and (0 <= pt2 <= 99) and (0 <= pt3 <= 9999):
+                    return True
+        except:
+            pass
+        return is_tipid
+
+
+    @staticmethod
+    def make_path(directory, filename, extension=''):
+        ''' Combines a directory, name and optional extension to create a full-path
+            string for a file. '''
+        fullpath = os.path.join(directory, filename)
+        if extension != '':
+            fullpath += '.' + extension.lstrip('.')  # Guarantee 1 (and only 1) '.' in front of extension
+        return fullpath
+
+
+    @staticmethod
+    def timestamp(ts_format='%Y%m%d%H%M%S'):
+        ''' Creates a timestamp string, defaulting to the form YYYYMMDDHHMMSS, but
+            any standard date formatting is accepted. See docs for details:
+            <http://docs.python.org/2/library/datetime.html#strftime-strptime-behavior>.
+
+            %a day of week, using locale's abbreviated weekday names
+            %A day of week, using locale's full weekday names
+            %b,%h month, using locale's abbreviated month names
+            %B month, using locale's full month names #%c date and time as %x %X
+            %d day of month (01-31)
+            %H hour (00-23)
+            %I hour (00-12)
+            %j day number of year (001-366)
+            %m month number (01-12)
+            %M minute (00-59)
+            %p locale's equivalent of AM or PM, whichever is appropriate
+            %r time as %I:%M:%S %p
+            %S seconds (00-59)
+            %U week number of year (01-52), Sunday is the first day of the week
+            %w day of week; Sunday is day 0
+            %W week number of year (01-52), Monday is the first
+            %x date, using locale's date format
+            %X time, using locale's time format
+            %y year within century (00-99)
+            %Y year, including century (for example, 1994)
+            %Z time zone abbreviation
+        '''
+        from datetime import datetime
+        ts = datetime.now().strftime(ts_format)
+        return ts
+
+
+    @classmethod
+    def tipid_from_int(cls, n):
+        ''' Format an integer < 100,000,000 as a TIPID string. '''
+        try:
+            n_str = str(int(n)).zfill(8)
+            tipid = '-'.join([n_str[:2], n_str[2:4], n_str[4:]])
+        except:
+            return None
+        return tipid if cls.is_tipid(tipid) else None
+
+
+    @classmethod
+    def tipid_to_int(cls, tipid):
+        ''' Convert a TIPID string to an integer. '''
+        if cls.is_tipid(tipid):
+            n_str = tipid.replace('-', '')
+            return int(n_str)
+        else:
+            return None
+
+
+# -----------------------------------------------------------------------------
+#  Measure import times.
+# -----------------------------------------------------------------------------
+def import_seconds(module, runs=5):
+    ''' Return the best of several times (in seconds) to import a module in a
+        fresh Python process, excluding the interpreter's own start-up. '''
+    import subprocess
+    timer = 'import time; t = time.perf_counter(); import {}; print(time.perf_counter() - t)'.format(module)
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    return min(float(subprocess.check_output([sys.executable, '-c', timer], cwd=src_dir)) for run in range(runs))
+
+
+if __name__ == '__main__':
+    max_seconds = 0.05
+    core_seconds = import_seconds('mhn_core')
+    print('{0:<10} {1:>8.1f} ms'.format('mhn_core', core_seconds * 1000))
+    try:
+        print('{0:<10} {1:>8.1f} ms'.format('MHN', import_seconds('MHN') * 1000))
+    except Exception:
+        print('{0:<10} {1:>8}'.format('MHN', 'failed'))  # e.g. missing dependencies
+    print('mhn_core import is {} the {:.0f} ms limit.'.format('within' if core_seconds < max_seconds else 'OVER', max_seconds * 1000))
+    sys.exit(0 if core_seconds < max_seconds else 1)
@@ -0,0 +1,857 @@
+#!/usr/bin/env python
+'''
+    network_graph.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    A compact, array-backed directed graph for finding shortest paths through
+    the MHN. Links are stored in compressed sparse row (CSR) form: for the
+    node with index i, its outbound links are targets[offsets[i]:offsets[i+1]]
+    with costs costs[offsets[i]:offsets[i+1]]. Node indices follow ascending
+    node ID.
+
+    This module only uses the standard library, so that it can be imported
+    quickly by shortest_path.py (which is called from SAS using the system's
+    default Python installation) as well as by MHN.py.
+
+'''
+from __future__ import print_function  # Keep in case system Python is 2.x
+import csv
+import hashlib
+import heapq
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from math import hypot
+
+INF = float('inf')
+FEET_PER_MILE = 5280
+COST_PER_FOOT = 100.0 / FEET_PER_MILE  # Link dictionary costs are miles * 100
+METHODS = ('dijkstra', 'astar', 'bidirectional', 'ch')
+
+# Binary graph file layout: a fixed header, followed by the node_ids, offsets,
+# targets, costs (and optionally x, y) arrays, each padded to 8 bytes.
+GRAPH_MAGIC = b'MHNGRAPH'
+GRAPH_VERSION = 1
+MIN_PARALLEL_PAIRS = 200  # Fewer pairs than this are not worth starting a process pool for
+GRAPH_HEADER = struct.Struct('<8sIIIId4x')  # magic, version, nodes, links, has_xy, scale
+
+
+class NetworkGraph(object):
+    ''' A directed network graph stored as CSR arrays (offsets, neighbor
+        indices and float costs), with a mapping of node IDs to indices. '''
+
+    def __init__(self, node_ids, offsets, targets, costs):
+        self.node_ids = node_ids  # Node ID of each index, in ascending order
+        self.offsets = offsets    # Length node_count + 1
+        self.targets = targets    # Index of the B-node of each link
+        self.costs = costs        # Cost of each link
+        self.index = dict((node, i) for i, node in enumerate(node_ids))
+        self.x = None               # Node coordinates (feet), for A* searches
+        self.y = None
+        self.heuristic_scale = 0.0  # Cost per foot of straight-line distance
+        self.last_settled = 0       # Nodes settled by the most recent search
+        self.last_widened = 0       # Search windows widened by the most recent search
+        self._reverse = None
+        self._grid = None
+        self.hierarchy = None       # ContractionHierarchy, for 'ch' searches
+        self.graph_file = None      # Binary graph file matching this graph, if any
+        self._fingerprint = None
+        return None
+
+    def __len__(self):
+        return len(self.node_ids)
+
+    @property
+    def node_count(self):
+        return len(self.node_ids)
+
+    @property
+    def link_count(self):
+        return len(self.targets)
+
+    @property
+    def has_coordinates(self):
+        return self.x is not None
+
+
+    # -------------------------------------------------------------------------
+    #  Coordinates & derived graphs
+    # -------------------------------------------------------------------------
+    def set_coordinates(self, coords):
+        ''' Attach node coordinates (in feet) from a {node: (x, y)} dict, e.g.
+            from read_node_coordinates(), enabling the A* search methods. If
+            any node in the graph lacks coordinates, they are not attached and
+            A* searches fall back to Dijkstra's algorithm.
+
+            The heuristic is straight-line distance converted to cost units at
+            COST_PER_FOOT, but reduced to the lowest cost-per-foot of any link
+            if that is smaller (e.g. from truncating miles * 100 to integers).
+            This guarantees that the heuristic never overestimates, so A*
+            paths have the same cost as Dijkstra's. Returns True if
+            coordinates were attached. '''
+        self._fingerprint = None
+        self.graph_file = None  # Coordinates may differ from the saved graph's
+        x = array('d', [0.0]) * len(self.node_ids)
+        y = array('d', [0.0]) * len(self.node_ids)
+        for i, node in enumerate(self.node_ids):
+            if node not in coords:
+                self.x = self.y = None
+                self.heuristic_scale = 0.0
+                return False
+            x[i], y[i] = coords[node]
+        self._grid = None
+        scale = COST_PER_FOOT
+        offsets, targets, costs = self.offsets, self.targets, self.costs
+        for u in range(len(self.node_ids)):
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                length = hypot(x[u] - x[v], y[u] - y[v])
+                if length > 0 and costs[k] < scale * length:
+                    scale = costs[k] / length
+        self.x, self.y = x, y
+        self.heuristic_scale = scale * (1 - 1e-9)  # Guard against rounding
+        return True
+
+    def fingerprint(self, coordinates=True):
+        ''' Return a hash of the graph's contents (nodes, links, costs and, if
+            coordinates is True, any node coordinates), which changes whenever
+            the network does. '''
+        if self._fingerprint is None:
+            self._fingerprint = {}
+        if coordinates not in self._fingerprint:
+            sha = hashlib.sha1(struct.pack('<II', self.node_count, self.link_count))
+            sections = [self.node_ids, self.offsets, self.targets, self.costs]
+            if coordinates and self.has_coordinates:
+                sections += [self.x, self.y]
+            for values in sections:
+                sha.update(array_bytes(values))
+            self._fingerprint[coordinates] = sha.hexdigest()
+        return self._fingerprint[coordinates]
+
+    def set_hierarchy(self, hierarchy):
+        ''' Attach a ContractionHierarchy built from this graph, enabling the
+            'ch' search method. Returns False (and attaches nothing) if it was
+            built from a different network. '''
+        if hierarchy.fingerprint != self.fingerprint(coordinates=False):
+            return False
+        self.hierarchy = hierarchy
+        return True
+
+    def reverse(self):
+        ''' Return the graph with every link reversed, using the same node
+            indices (built once and cached). '''
+        if self._reverse is None:
+            n = len(self.node_ids)
+            offsets, targets, costs = self.offsets, self.targets, self.costs
+            r_offsets = array('i', [0]) * (n + 1)
+            for k in range(len(targets)):
+                r_offsets[targets[k] + 1] += 1
+            for i in range(n):
+                r_offsets[i + 1] += r_offsets[i]
+            fill = array('i', r_offsets[:-1])
+            r_targets = array('i', [0]) * len(targets)
+            r_costs = array('d', [0.0]) * len(targets)
+            for u in range(n):
+                for k in range(offsets[u], offsets[u + 1]):
+                    v = targets[k]
+                    j = fill[v]
+                    r_targets[j] = u
+                    r_costs[j] = costs[k]
+                    fill[v] = j + 1
+            self._reverse = NetworkGraph(self.node_ids, r_offsets, r_targets, r_costs)
+            self._reverse._reverse = self
+        return self._reverse
+
+    @property
+    def grid(self):
+        ''' GridIndex of node coordinates (built once and cached). '''
+        if self._grid is None and self.has_coordinates:
+            self._grid = GridIndex(self.x, self.y)
+        return self._grid
+
+    def window_mask(self, indices, buffer):
+        ''' Flag the nodes within a bounding box around the node indices in
+            indices, expanded by buffer feet on all sides, using the grid
+            index. Returns a bytearray (1 = inside) or None if the box covers
+            every node in the graph. '''
+        grid = self.grid
+        x, y = self.x, self.y
+        xmin = min(x[i] for i in indices) - buffer
+        xmax = max(x[i] for i in indices) + buffer
+        ymin = min(y[i] for i in indices) - buffer
+        ymax = max(y[i] for i in indices) + buffer
+        if xmin <= grid.xmin and xmax >= grid.xmax and ymin <= grid.ymin and ymax >= grid.ymax:
+            return None
+        allowed = bytearray(len(self.node_ids))
+        for i in grid.nodes_in_box(xmin, xmax, ymin, ymax):
+            allowed[i] = 1
+        return allowed
+
+
+    # -------------------------------------------------------------------------
+    #  Constructors
+    # -------------------------------------------------------------------------
+    @classmethod
+    def from_arcs(cls, arcs):
+        ''' Build a graph from an iterable of directional (anode, bnode, cost)
+            tuples. '''
+        arcs = list(arcs)
+        nodes = set()
+        for anode, bnode, cost in arcs:
+            nodes.add(anode)
+            nodes.add(bnode)
+        try:
+            node_list = sorted(nodes)
+        except TypeError:
+            node_list = list(nodes)  # Unorderable (mixed-type) node IDs
+        if all(isinstance(node, int) for node in node_list):
+            node_ids = array('i', node_list)
+        else:
+            node_ids = node_list
+        index = dict((node, i) for i, node in enumerate(node_list))
+
+        # Count outbound links per node, then convert to cumulative offsets
+        offsets = array('i', [0]) * (len(node_list) + 1)
+        for anode, bnode, cost in arcs:
+            offsets[index[anode] + 1] += 1
+        for i in range(len(node_list)):
+            offsets[i + 1] += offsets[i]
+
+        # Fill links into each node's slice, preserving input order
+        fill = array('i', offsets[:-1])
+        targets = array('i', [0]) * len(arcs)
+        costs = array('d', [0.0]) * len(arcs)
+        for anode, bnode, cost in arcs:
+            a = index[anode]
+            k = fill[a]
+            targets[k] = index[bnode]
+            costs[k] = cost
+            fill[a] = k + 1
+
+        return cls(node_ids, offsets, targets, costs)
+
+    @classmethod
+    def from_dict(cls, graph):
+        ''' Build a graph from a dict-of-dicts, as accepted by the original
+            MHN.find_shortest_path(), e.g. {'a': {'w': 14, 'x': 7}, ...}. '''
+        return cls.from_arcs(
+            (anode, bnode, cost)
+            for anode, bnodes in graph.items()
+            for bnode, cost in bnodes.items()
+        )
+
+    @classmethod
+    def from_links(cls, links, min_node=None):
+        ''' Build a graph from an iterable of MHN arc (anode, bnode, directions,
+            cost) tuples. Arcs with DIRECTIONS > 1 are expanded into links in
+            both directions. Arcs touching a node ID less than min_node (i.e.
+            zone centroids) are skipped, if specified. '''
+        def expand(links):
+            for anode, bnode, directions, cost in links:
+                if min_node is not None and (anode < min_node or bnode < min_node):
+                    continue
+                yield (anode, bnode, cost)
+                if int(directions) > 1:
+                    yield (bnode, anode, cost)
+        return cls.from_arcs(expand(links))
+
+    @classmethod
+    def from_network_csv(cls, network_csv, cost_field='MILES', cost_scale=100,
+                         min_node=None):
+        ''' Build a graph from an exported network CSV with (at least) ANODE,
+            BNODE, DIRECTIONS and cost_field columns, e.g. the network.csv
+            written by import_gtfs_bus_routes.py. Costs are cost_field values
+            multiplied by cost_scale (default of 100 matches the miles*100
+            units of the SAS link dictionary). '''
+        def read_links(r):
+            for row in csv.DictReader(r):
+                cost = float(row[cost_field]) * cost_scale
+                yield (int(row['ANODE']), int(row['BNODE']), row['DIRECTIONS'], cost)
+        with open(network_csv) as r:
+            return cls.from_links(read_links(r), min_node)
+
+    @classmethod
+    def from_link_dict(cls, link_dict_txt):
+        ''' Build a graph from the $-delimited link dictionary written by the
+            SAS programs, with one row per A-node of the form:
+
+                5001${5002:12,5003:40}
+        '''
+        def read_arcs(r):
+            for line in r:
+                line = line.strip()
+                if not line:
+                    continue
+                anode, bnodes = line.split('$', 1)
+                anode = int(anode)
+                for pair in bnodes.strip('{} ').split(','):
+                    if pair.strip():
+                        bnode, cost = pair.split(':')
+                        yield (anode, int(bnode), float(cost))
+        with open(link_dict_txt) as r:
+            return cls.from_arcs(read_arcs(r))
+
+
+    # -------------------------------------------------------------------------
+    #  Binary graph files
+    # -------------------------------------------------------------------------
+    def save(self, graph_file):
+        ''' Write the graph (and coordinates, if attached) to a compact binary
+            file that can be memory-mapped by NetworkGraph.load(). Node IDs
+            must be integers. '''
+        sections = [array('i', self.node_ids), array('i', self.offsets),
+                    array('i', self.targets), array('d', self.costs)]
+        if self.has_coordinates:
+            sections += [array('d', self.x), array('d', self.y)]
+        with open(graph_file, 'wb') as w:
+            w.write(GRAPH_HEADER.pack(
+                GRAPH_MAGIC, GRAPH_VERSION, len(self.node_ids), len(self.targets),
+                int(self.has_coordinates), self.heuristic_scale
+            ))
+            for section in sections:
+                if sys.byteorder != 'little':
+                    section.byteswap()
+                data = array_bytes(section)
+                w.write(data)
+                w.write(b'\0' * (-len(data) % 8))
+        self.graph_file = graph_file
+        return graph_file
+
+    @classmethod
+    def load(cls, graph_file):
+        ''' Memory-map a binary graph file written by save(). The arrays are
+            read directly from the mapped file (read-only), so loading takes
+            only as long as building the node ID index. '''
+        with open(graph_file, 'rb') as r:
+            mm = mmap.mmap(r.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mm) < GRAPH_HEADER.size:
+            raise ValueError('{0} is not a binary network graph file.'.format(graph_file))
+        magic, version, n, m, has_xy, scale = GRAPH_HEADER.unpack_from(mm, 0)
+        if magic != GRAPH_MAGIC or version != GRAPH_VERSION:
+            raise ValueError('{0} is not a version {1} binary network graph file.'.format(graph_file, GRAPH_VERSION))
+        if sys.byteorder != 'little':
+            raise ValueError('Binary network graph files can only be memory-mapped on little-endian systems.')
+        pos = [GRAPH_HEADER.size]
+        def section(typecode, count):
+            size = struct.calcsize(typecode) * count
+            start = pos[0]
+            if start + size > len(mm):
+                raise ValueError('{0} is truncated.'.format(graph_file))
+            pos[0] += size + (-size % 8)
+            return map_section(mm, typecode, start, size)
+        node_ids = section('i', n)
+        offsets = section('i', n + 1)
+        targets = section('i', m)
+        costs = section('d', m)
+        graph = cls(node_ids, offsets, targets, costs)
+        if has_xy:
+            graph.x = section('d', n)
+            graph.y = section('d', n)
+            graph.heuristic_scale = scale
+        graph._mmap = mm  # Keep the mapping open for the life of the graph
+        graph.graph_file = graph_file
+        return graph
+
+    @classmethod
+    def from_file(cls, graph_file):
+        ''' Load a graph from either a binary graph file or a SAS link
+            dictionary text file, detected from the file's first bytes. '''
+        with open(graph_file, 'rb') as r:
+            magic = r.read(len(GRAPH_MAGIC))
+        if magic == GRAPH_MAGIC:
+            return cls.load(graph_file)
+        return cls.from_link_dict(graph_file)
+
+
+    # -------------------------------------------------------------------------
+    #  Shortest paths
+    # -------------------------------------------------------------------------
+    def dijkstra(self, source, target=None, allowed=None):
+        ''' Dijkstra's algorithm from node index source, stopping early once
+            node index target (if any) is settled. Target may also be a
+            collection of node indices, in which case the search stops once
+            all of them are settled. Returns (dist, pred) lists, where pred
+            holds the index of each reached node's predecessor (-1 for the
+            source and unreached nodes).
+
+            If allowed is specified (see window_mask()), only links whose
+            A-node is flagged in it are followed. '''
+        offsets = self.offsets
+        targets = self.targets
+        costs = self.costs
+        n = len(self.node_ids)
+        dist = [INF] * n
+        pred = array('i', [-1]) * n
+        settled = bytearray(n)
+        settled_count = 0
+        if target is None or isinstance(target, int):
+            remaining = None
+        else:
+            remaining = set(target)
+            target = None
+        dist[source] = 0.0
+        queue = [(0.0, source)]
+        while queue:
+            (p_cost, u) = heapq.heappop(queue)
+            if settled[u]:
+                continue
+            settled[u] = 1
+            settled_count += 1
+            if u == target:
+                break
+            if remaining is not None:
+                remaining.discard(u)
+                if not remaining:
+                    break
+            if allowed is not None and not allowed[u]:
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                b_cost = p_cost + costs[k]
+                if b_cost < dist[v]:
+                    dist[v] = b_cost
+                    pred[v] = u
+                    heapq.heappush(queue, (b_cost, v))
+        self.last_settled = settled_count
+        return dist, pred
+
+    def astar(self, source, target, allowed=None):
+        ''' A* search from node index source to node index target, using the
+            straight-line distance to target as the heuristic. Returns (dist,
+            pred) like dijkstra(), although dist is only final for settled
+            nodes (including target). '''
+        if not self.has_coordinates:
+            return self.dijkstra(source, target, allowed)
+        offsets = self.offsets
+        targets = self.targets
+        costs = self.costs
+        x, y, scale = self.x, self.y, self.heuristic_scale
+        tx, ty = x[target], y[target]
+        n = len(self.node_ids)
+        dist = [INF] * n
+        pred = array('i', [-1]) * n
+        settled = bytearray(n)
+        settled_count = 0
+        dist[source] = 0.0
+        queue = [(scale * hypot(x[source] - tx, y[source] - ty), 0.0, source)]
+        while queue:
+            (est_cost, p_cost, u) = heapq.heappop(queue)
+            if settled[u]:
+                continue
+            settled[u] = 1
+            settled_count += 1
+            if u == target:
+                break
+            if allowed is not None and not allowed[u]:
+                continue
+            for k in range(offsets[u], offsets[u + 1]):
+                v = targets[k]
+                b_cost = p_cost + costs[k]
+                if b_cost < dist[v]:
+                    dist[v] = b_cost
+                    pred[v] = u
+                    heapq.heappush(queue, (b_cost + scale * hypot(x[v] - tx, y[v] - ty), b_cost, v))
+        self.last_settled = settled_count
+        return dist, pred
+
+    def bidirectional_astar(self, source, target, allowed=None):
+        ''' Bidirectional A* search between node indices source and target,
+            using the average of the forward and reverse straight-line
+            heuristics as the potential, so that both searches can stop as
+            soon as they meet. Without coordinates, this is bidirectional
+            Dijkstra. Returns (cost, path indices), or None if there is no
+            path. '''
+        n = len(self.node_ids)
+        graphs = (self, self.reverse())
+        if self.has_coordinates:
+            x, y, scale = self.x, self.y, self.heuristic_scale
+            sx, sy, tx, ty = x[source], y[source], x[target], y[target]
+            half = scale / 2
+            potential = lambda v: half * (hypot(x[v] - tx, y[v] - ty) - hypot(x[v] - sx, y[v] - sy))
+        else:
+            potential = lambda v: 0.0
+        sign = (1, -1)  # Forward search adds potential, reverse subtracts it
+        dist = ([INF] * n, [INF] * n)
+        pred = (array('i', [-1]) * n, array('i', [-1]) * n)
+        settled = (bytearray(n), bytearray(n))
+        settled_count = 0
+        dist[0][source] = 0.0
+        dist[1][target] = 0.0
+        queues = ([(potential(source), 0.0, source)], [(-potential(target), 0.0, target)])
+        best, meet = INF, None
+        while queues[0] and queues[1]:
+            if queues[0][0][0] + queues[1][0][0] >= best:
+                break
+            side = 0 if queues[0][0][0] <= queues[1][0][0] else 1
+            (est_cost, p_cost, u) = heapq.heappop(queues[side])
+            if settled[side][u]:
+                continue
+            settled[side][u] = 1
+            settled_count += 1
+            if side == 0 and allowed is not None and not allowed[u]:
+                continue
+            graph = graphs[side]
+            s_dist, o_dist, s_pred = dist[side], dist[1 - side], pred[side]
+            for k in range(graph.offsets[u], graph.offsets[u + 1]):
+                v = graph.targets[k]
+                if side == 1 and allowed is not None and not allowed[v]:
+                    continue  # Reverse search follows links from v to u
+                b_cost = p_cost + graph.costs[k]
+                if b_cost < s_dist[v]:
+                    s_dist[v] = b_cost
+                    s_pred[v] = u
+                    heapq.heappush(queues[side], (b_cost + sign[side] * potential(v), b_cost, v))
+                if b_cost + o_dist[v] < best:
+                    best = b_cost + o_dist[v]
+                    meet = v
+        self.last_settled = settled_count
+        if meet is None:
+            return None
+        path = [meet]
+        i = meet
+        while i != source:
+            i = pred[0][i]
+            path.append(i)
+        path.reverse()
+        i = meet
+        while i != target:
+            i = pred[1][i]
+            path.append(i)
+        return best, path
+
+    def trace_path(self, pred, source, target):
+        ''' Walk a predecessor array back from target to source, returning the
+            list of node IDs along the path. '''
+        node_ids = self.node_ids
+        path = [node_ids[target]]
+        i = target
+        while i != source:
+            i = pred[i]
+            path.append(node_ids[i])
+        path.reverse()
+        return path
+
+    def shortest_path(self, start, end, method='dijkstra', window=None):
+        ''' Find the shortest path between node IDs start and end, using one of
+            the search methods in METHODS ('astar' and 'bidirectional' require
+            coordinates to be goal-directed, and 'ch' requires a hierarchy from
+            set_hierarchy()). Returns a (cost,
+            [start, ..., end]) tuple like MHN.find_shortest_path(), or None if
+            end cannot be reached from start.
+
+            If window (miles) is specified and the graph has coordinates, the
+            search only leaves nodes within a bounding box around start and
+            end, buffered by window miles. If no path is found within it, the
+            buffer is doubled until the box covers the whole network, so a
+            path is only ever missed if none exists. Windows are not used by
+            'ch' searches, which are always exact. '''
+        if method not in METHODS:
+            raise ValueError('Unknown shortest path method: {0}'.format(method))
+        if method == 'ch' and self.hierarchy is None:
+            raise ValueError('The ch method requires a contraction hierarchy (see set_hierarchy()).')
+        self.last_widened = 0
+        if start == end:
+            return (0, [start])
+        source = self.index.get(start)
+        target = self.index.get(end)
+        if source is None or target is None:
+            return None
+        if window is None or not self.has_coordinates or method == 'ch':
+            return self._search(source, target, method)
+        buffer = window * FEET_PER_MILE
+        settled = 0
+        while True:
+            allowed = self.window_mask((source, target), buffer)
+            result = self._search(source, target, method, allowed)
+            settled += self.last_settled
+            if result is not None or allowed is None:
+                self.last_settled = settled
+                return result
+            buffer *= 2
+            self.last_widened += 1
+
+    def _search(self, source, target, method, allowed=None):
+        ''' Run a single search between node indices, returning a
+            shortest_path() result. '''
+        if method == 'ch':
+            result = self.hierarchy.query(source, target)
+            self.last_settled = self.hierarchy.last_settled
+            if result is None:
+                return None
+            cost, path = result
+            return (native_cost(cost), [self.node_ids[i] for i in path])
+        if method == 'bidirectional':
+            result = self.bidirectional_astar(source, target, allowed)
+            if result is None:
+                return None
+            cost, path = result
+            return (native_cost(cost), [self.node_ids[i] for i in path])
+        if method == 'astar':
+            dist, pred = self.astar(source, target, allowed)
+        else:
+            dist, pred = self.dijkstra(source, target, allowed)
+        if dist[target] == INF:
+            return None
+        return (native_cost(dist[target]), self.trace_path(pred, source, target))
+
+    def shortest_paths_from(self, start, ends):
+        ''' Find the shortest paths from node ID start to each node ID in ends,
+            with a single Dijkstra search that stops once every reachable end
+            is settled. Returns a {end: result} dict, with results identical
+            to shortest_path(start, end).
+
+            No search window is used: a window covering all of the ends would
+            make each end's path depend on which other ends share its start
+            (see solve_pairs()). '''
+        self.last_widened = 0
+        results = {}
+        source = self.index.get(start)
+        end_index = {}
+        for end in ends:
+            if end == start:
+                results[end] = (0, [start])
+            elif source is None or end not in self.index:
+                results[end] = None
+            else:
+                end_index[end] = self.index[end]
+        if not end_index:
+            return results
+        dist, pred = self.dijkstra(source, set(end_index.values()))
+        for end, target in end_index.items():
+            if dist[target] != INF:
+                results[end] = (native_cost(dist[target]), self.trace_path(pred, source, target))
+            else:
+                results[end] = None
+        return results
+
+    def solve_pairs(self, pairs, method='dijkstra', window=None, workers=1):
+        ''' Find the shortest path for each (start, end) pair, returning a list
+            of results in the same order as pairs, identical to those of
+            shortest_path() for each pair. With the 'dijkstra' method (and no
+            search window), pairs are grouped by start node, and starts with
+            several ends use one shortest_paths_from() search, which settles
+            nodes in the same order as each one-to-one search. Other methods
+            search for each pair separately: a grouped Dijkstra search could
+            break ties between equal-cost paths differently than astar or
+            bidirectional, and a window shared by all of a start's ends could
+            find a different path than the pair's own window.
+            The number of searches run and avoided are stored in
+            self.last_searches and self.last_searches_saved, the total nodes
+            settled in self.last_settled, and the number of windows that had
+            to be widened in self.last_widened.
+
+            If workers is greater than 1, the pairs are split among that many
+            processes by solve_pairs_parallel(). '''
+        if workers > 1:
+            return solve_pairs_parallel(self, pairs, method, window, workers)
+        ends_by_start = {}
+        for start, end in pairs:
+            ends = ends_by_start.setdefault(start, [])
+            if end not in ends:
+                ends.append(end)
+        solved = {}
+        searches = 0
+        settled = 0
+        widened = 0
+        grouped = method == 'dijkstra' and (window is None or not self.has_coordinates)
+        for start, ends in ends_by_start.items():
+            if len(ends) == 1 or not grouped:
+                groups = [[end] for end in ends]
+            else:
+                groups = [ends]
+            for group in groups:
+                if len(group) == 1:
+                    solved[(start, group[0])] = self.shortest_path(start, group[0], method, window)
+                else:
+                    for end, result in self.shortest_paths_from(start, group).items():
+                        solved[(start, end)] = result
+                if start in self.index and any(end != start and end in self.index for end in group):
+                    searches += 1
+                    settled += self.last_settled
+                    widened += 1 if self.last_widened else 0
+        one_pair_searches = len(set(
+            (start, end) for start, end in pairs
+            if start != end and start in self.index and end in self.index
+        ))
+        self.last_searches = searches
+        self.last_searches_saved = one_pair_searches - searches
+        self.last_settled = settled
+        self.last_widened = widened
+        return [solved[pair] for pair in pairs]
+
+
+class GridIndex(object):
+    ''' A uniform grid of square cells (cell_size feet on a side) over node
+        coordinates, so that the nodes within a bounding box can be found
+        without checking the coordinates of every node in the network. '''
+
+    def __init__(self, x, y, cell_size=FEET_PER_MILE):
+        self.cell_size = float(cell_size)
+        self.xmin, self.xmax = min(x), max(x)
+        self.ymin, self.ymax = min(y), max(y)
+        self.x, self.y = x, y
+        self.cells = {}
+        for i in range(len(x)):
+            self.cells.setdefault(self._cell(x[i], y[i]), []).append(i)
+
+    def _cell(self, x, y):
+        return (int((x - self.xmin) // self.cell_size), int((y - self.ymin) // self.cell_size))
+
+    def nodes_in_box(self, xmin, xmax, ymin, ymax):
+        ''' Return a list of the indices of nodes within the bounding box. '''
+        c_xmin, c_ymin = self._cell(max(xmin, self.xmin), max(ymin, self.ymin))
+        c_xmax, c_ymax = self._cell(min(xmax, self.xmax), min(ymax, self.ymax))
+        x, y = self.x, self.y
+        nodes = []
+        for cx in range(c_xmin, c_xmax + 1):
+            for cy in range(c_ymin, c_ymax + 1):
+                cell = self.cells.get((cx, cy))
+                if not cell:
+                    continue
+                if c_xmin < cx < c_xmax and c_ymin < cy < c_ymax:
+                    nodes.extend(cell)  # Interior cells are entirely within the box
+                else:
+                    nodes.extend(i for i in cell if xmin <= x[i] <= xmax and ymin <= y[i] <= ymax)
+        return nodes
+
+
+def solve_pairs_parallel(graph, pairs, method='dijkstra', window=None, workers=2):
+    ''' Solve pairs like graph.solve_pairs(), spreading the A-node groups
+        across a pool of worker processes. Workers memory-map the graph's
+        binary file (saving it to a temporary file first, if necessary), so
+        the network is shared rather than copied into each process. Results
+        are returned in the order of pairs, identical to a serial run. Falls
+        back to a serial run if there are fewer than MIN_PARALLEL_PAIRS pairs
+        or too few A-nodes to split, or if a process pool cannot be
+        started. '''
+    starts = []
+    for start, end in pairs:
+        if start not in starts:
+            starts.append(start)
+    workers = min(workers, len(starts))
+    if workers <= 1 or len(pairs) < MIN_PARALLEL_PAIRS:
+        return graph.solve_pairs(pairs, method, window)
+    try:
+        import multiprocessing
+    except ImportError:
+        return graph.solve_pairs(pairs, method, window)
+
+    graph_file = graph.graph_file
+    temp_file = None
+    if graph_file is None:
+        handle, temp_file = tempfile.mkstemp(suffix='.graph')
+        os.close(handle)
+        graph_file = graph.save(temp_file)
+    hierarchy_file = getattr(graph.hierarchy, 'ch_file', None) if method == 'ch' else None
+
+    # Deal A-nodes out in contiguous blocks, one block per task, keeping each
+    # A-node's pairs together so that grouped searches are not split up.
+    batch_count = workers * 4
+    batch_of = dict((start, i * batch_count // len(starts)) for i, start in enumerate(starts))
+    batches = [[] for i in range(batch_count)]
+    for pair in pairs:
+        batches[batch_of[pair[0]]].append(pair)
+    tasks = [(batch, method, window) for batch in batches if batch]
+    try:
+        pool = multiprocessing.Pool(workers, _init_worker, (graph_file, hierarchy_file))
+    except (OSError, ValueError):
+        if temp_file:
+            os.remove(temp_file)
+        return graph.solve_pairs(pairs, method, window)
+    try:
+        outputs = pool.map(_solve_batch, tasks)  # Returned in task order
+    finally:
+        pool.close()
+        pool.join()
+        if temp_file:
+            graph.graph_file = None
+            os.remove(temp_file)
+
+    solved = {}
+    graph.last_searches = graph.last_searches_saved = graph.last_settled = graph.last_widened = 0
+    for (batch, method, window), (results, stats) in zip(tasks, outputs):
+        solved.update(zip(batch, results))
+        graph.last_searches += stats[0]
+        graph.last_searches_saved += stats[1]
+        graph.last_settled += stats[2]
+        graph.last_widened += stats[3]
+    return [solved[pair] for pair in pairs]
+
+
+_worker_graph = None  # Graph loaded by each solve_pairs_parallel() worker
+
+
+def _init_worker(graph_file, hierarchy_file=None):
+    global _worker_graph
+    _worker_graph = NetworkGraph.load(graph_file)
+    if hierarchy_file:
+        from contraction_hierarchy import ContractionHierarchy
+        _worker_graph.set_hierarchy(ContractionHierarchy.load(hierarchy_file))
+
+
+def _solve_batch(task):
+    pairs, method, window = task
+    graph = _worker_graph
+    results = graph.solve_pairs(pairs, method, window)
+    return results, (graph.last_searches, graph.last_searches_saved, graph.last_settled, graph.last_widened)
+
+
+def native_cost(cost):
+    ''' Return whole-number costs as ints, so that output written from float
+        costs matches output written from the integer link dictionary. '''
+    return int(cost) if cost == int(cost) else cost
+
+
+def array_bytes(values):
+    ''' Return the raw bytes of an array or memoryview (arrays have tostring()
+        rather than tobytes() in Python 2). '''
+    if sys.version_info[0] < 3 and isinstance(values, array):
+        return values.tostring()
+    return values.tobytes()
+
+
+def map_section(buffer, typecode, start, size):
+    ''' Return buffer[start:start + size] (e.g. part of a memory-mapped binary
+        file) as a read-only view of typecode values. Python 2 memoryviews
+        cannot be cast, so there the bytes are copied into an array instead. '''
+    if sys.version_info[0] < 3:
+        values = array(typecode)
+        values.fromstring(buffer[start:start + size])
+        return values
+    return memoryview(buffer)[start:start + size].cast(typecode)
+
+
+def read_node_coordinates(nodes_csv):
+    ''' Read a {node: (x, y)} dict from a CSV whose first three columns are
+        node ID, x and y (e.g. NODE, POINT_X, POINT_Y). Rows that do not start
+        with a numeric node ID (e.g. headers) are skipped. '''
+    coords = {}
+    with open(nodes_csv) as r:
+        for row in csv.reader(r):
+            try:
+                coords[int(row[0])] = (float(row[1]), float(row[2]))
+            except (IndexError, ValueError):
+                continue
+    return coords
+
+
+def find_shortest_path(graph, start, end):
+    ''' Find the shortest path between 2 nodes in a graph, which may be either a
+        NetworkGraph or a dict-of-dicts of link costs, e.g.:
+
+            {'a': {'w': 14, 'x': 7, 'y': 9},
+             'b': {'w': 9, 'z': 6},
+             'w': {'a': 14, 'b': 9, 'y': 2},
+             'x': {'a': 7, 'y': 10, 'z': 15},
+             'y': {'a': 9, 'w': 2, 'x': 10, 'z': 11},
+             'z': {'b': 6, 'x': 15, 'y': 11}}
+
+        Returns (cost, path), or None if there is no path.
+    '''
+    if not isinstance(graph, NetworkGraph):
+        graph = NetworkGraph.from_dict(graph)
+    return graph.shortest_path(start, end)
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+'''
+    path_cache.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    An on-disk (SQLite) cache of shortest path results, so that itinerary gaps
+    that recur across TODs, across scenarios sharing a highway network, and
+    across repeated runs do not have to be searched for again.
+
+    Results are keyed by (network, anode, bnode), where network is the
+    NetworkGraph.fingerprint() of the graph that was searched, plus the search
+    method and window (if any): equal-cost paths can be broken differently by
+    each, and NetworkGraph.solve_pairs() always returns the same result for a
+    pair with the same graph, method and window, so a cached result is exactly
+    what a search would return. Any change to the exported network therefore changes the
+    key, so stale results are never returned; the paths of networks that have
+    not been used recently are dropped once more than max_networks are cached,
+    and the least recently used paths are dropped once more than max_paths are
+    cached.
+
+    The cache lives in MHN.temp_dir by default (see default_cache_path()).
+    Cumulative hit/miss counts are stored in the database, so that tools which
+    call shortest_path.py via SAS can report them with totals().
+
+'''
+from __future__ import print_function  # Keep in case system Python is 2.x
+import os
+import sqlite3
+import time
+
+CACHE_VERSION = 2  # 2: keyed by search method, too
+DEFAULT_MAX_PATHS = 500000
+DEFAULT_MAX_NETWORKS = 32
+
+
+def default_cache_path():
+    ''' Return the default cache location: path_cache.sqlite in the temp
+        directory next to this script's directory (i.e. MHN.temp_dir). '''
+    src_dir = os.path.dirname(os.path.abspath(__file__))
+    return os.path.realpath(os.path.join(src_dir, '../temp', 'path_cache.sqlite'))
+
+
+class PathCache(object):
+    ''' A persistent cache of NetworkGraph.shortest_path() results. '''
+
+    def __init__(self, cache_db=None, max_paths=DEFAULT_MAX_PATHS, max_networks=DEFAULT_MAX_NETWORKS):
+        self.cache_db = cache_db or default_cache_path()
+        self.max_paths = max_paths
+        self.max_networks = max_networks
+        self.hits = 0    # For this instance only; see totals() for all runs
+        self.misses = 0
+        cache_dir = os.path.dirname(self.cache_db)
+        if cache_dir and not os.path.exists(cache_dir):
+            os.makedirs(cache_dir)
+        self.conn = sqlite3.connect(self.cache_db, timeout=60)
+        self._create_tables()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _create_tables(self):
+        ''' Create the cache tables, discarding any written by a different
+            version of this module. '''
+        with self.conn:
+            version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+            if version != CACHE_VERSION:
+                for table in ('paths', 'networks', 'stats'):
+                    self.conn.execute('DROP TABLE IF EXISTS {0}'.format(table))
+                self.conn.execute('PRAGMA user_version = {0}'.format(CACHE_VERSION))
+            self.conn.execute(
+                'CREATE TABLE IF NOT EXISTS paths ('
+                'network TEXT, anode INTEGER, bnode INTEGER, cost NUMERIC, path TEXT, used REAL, '
+                'PRIMARY KEY (network, anode, bnode))'
+            )
+            self.conn.execute('CREATE INDEX IF NOT EXISTS paths_used ON paths (used)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS networks (network TEXT PRIMARY KEY, used REAL)')
+            self.conn.execute('CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value INTEGER)')
+            self.conn.execute("INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)")
+
+    def get(self, network, pairs):
+        ''' Look up (anode, bnode) pairs for a network, returning a
+            {pair: result} dict of the cached ones (a result of None means no
+            path exists). '''
+        found = {}
+        now = time.time()
+        with self.conn:
+            for pair in set(pairs):
+                row = self.conn.execute(
+                    'SELECT cost, path FROM paths WHERE network = ? AND anode = ? AND bnode = ?',
+                    (network, pair[0], pair[1])
+                ).fetchone()
+                if row is None:
+                    continue
+                cost, path = row
+                found[pair] = None if path is None else (cost, [int(node) for node in path.split(',')])
+            self.conn.executemany(
+                'UPDATE paths SET used = ? WHERE network = ? AND anode = ? AND bnode = ?',
+                ((now, network, anode, bnode) for anode, bnode in found)
+            )
+        return found
+
+    def put(self, network, results):
+        ''' Store a {(anode, bnode): result} dict for a network, then evict old
+            entries if the cache has grown too large. '''
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO paths VALUES (?, ?, ?, ?, ?, ?)',
+                ((network, anode, bnode,
+                  None if result is None else result[0],
+                  None if result is None else ','.join(str(node) for node in result[1]),
+                  now) for (anode, bnode), result in results.items())
+            )
+            self.conn.execute('INSERT OR REPLACE INTO networks VALUES (?, ?)', (network, now))
+        self.evict()
+
+    def evict(self):
+        ''' Drop the paths of the least recently used networks beyond
+            max_networks, then the least recently used paths beyond
+            max_paths. '''
+        with self.conn:
+            stale = [row[0] for row in self.conn.execute(
+                'SELECT network FROM networks ORDER BY used DESC LIMIT -1 OFFSET ?', (self.max_networks,)
+            )]
+            for network in stale:
+                self.conn.execute('DELETE FROM paths WHERE network = ?', (network,))
+                self.conn.execute('DELETE FROM networks WHERE network = ?', (network,))
+            excess = self.conn.execute('SELECT COUNT(*) FROM paths').fetchone()[0] - self.max_paths
+            if excess > 0:
+                self.conn.execute(
+                    'DELETE FROM paths WHERE rowid IN (SELECT rowid FROM paths ORDER BY used LIMIT ?)', (excess,)
+                )
+
+    def clear(self):
+        ''' Remove every cached path (hit/miss totals are kept). '''
+        with self.conn:
+            self.conn.execute('DELETE FROM paths')
+            self.conn.execute('DELETE FROM networks')
+
+    def totals(self):
+        ''' Return the cumulative (hits, misses) of every run using this cache
+            database. '''
+        stats = dict(self.conn.execute('SELECT name, value FROM stats'))
+        return (stats['hits'], stats['misses'])
+
+    def solve_pairs(self, graph, pairs, method='dijkstra', window=None, workers=1):
+        ''' Equivalent to graph.solve_pairs(pairs, method, window, workers),
+            but only searching for pairs that are not already cached, and
+            caching the results of those that are searched for. '''
+        network = '{0}/method={1}'.format(graph.fingerprint(), method)
+        if window is not None and graph.has_coordinates and method != 'ch':
+            network += '/window={0!r}'.format(float(window))
+        solved = self.get(network, pairs)
+        unsolved = [pair for pair in pairs if pair not in solved]
+        if unsolved:
+            solved.update(zip(unsolved, graph.solve_pairs(unsolved, method, window, workers)))
+            self.put(network, dict((pair, solved[pair]) for pair in unsolved))
+        else:
+            graph.last_searches = graph.last_searches_saved = graph.last_settled = graph.last_widened = 0
+        hits = len(pairs) - len(unsolved)
+        self.hits += hits
+        self.misses += len(unsolved)
+        with self.conn:
+            self.conn.execute("UPDATE stats SET value = value + ? WHERE name = 'hits'", (hits,))
+            self.conn.execute("UPDATE stats SET value = value + ? WHERE name = 'misses'", (len(unsolved),))
+        return [solved[pair] for pair in pairs]
@@ -2,11 +2,76 @@
 '''
     shortest_path.py
     Authors: cheither & npeterson
-    Revised: 4/13/17
+    Revised: 10/17/26
     ---------------------------------------------------------------------------
-    This script finds the shortest path between two nodes, using a network
-    graph read in from a CSV. It is essentially a wrapper of the MHN module's
-    find_shortest_path() function, to facilitate calls from SAS programs.
+    This script finds the shortest path between pairs of nodes, using a network
+    graph read in from a link dictionary written by SAS, or from a binary graph
+    file written by this script. It is essentially a wrapper of the NetworkGraph
+    class shared with the MHN module's find_shortest_path() function, to
+    facilitate calls from SAS programs.
+
+    Three calling conventions are supported (graph_file may be either a link
+    dictionary or a binary graph file, which is detected automatically):
+
+      shortest_path.py anode bnode graph_file short_path_txt
+          Find a single path and append it to short_path_txt.
+
+      shortest_path.py --pairs path_pairs_txt graph_file short_path_txt
+          Find a path for every "anode,bnode" row of path_pairs_txt in one
+          process, and (over)write all of them to short_path_txt, in the same
+          order as the input pairs. With --method dijkstra, pairs sharing an
+          A-node are solved with a single one-to-many search.
+
+      shortest_path.py --convert link_dict_txt graph_file
+          Convert a link dictionary (plus --nodes coordinates, if given) to a
+          binary graph file, which is memory-mapped rather than parsed when
+          it is used.
+
+    Optional arguments:
+
+      --nodes nodes_csv
+          Node coordinates (NODE, POINT_X, POINT_Y in feet), which allow the
+          astar and bidirectional methods to search towards the B-node.
+      --method {dijkstra,astar,bidirectional,ch}
+          Search method (default dijkstra). Path costs are the same for every
+          method; only the number of nodes searched differs. ch requires a
+          current --hierarchy file (or --build-hierarchy).
+      --save-graph graph_file
+          Also save the graph that was read (with coordinates) as a binary
+          graph file, for reuse by later calls on the same network. (The SAS
+          programs do not, because their link dictionaries are rebuilt on
+          every run.)
+      --window miles
+          Only search within a bounding box around each A-node and B-node,
+          buffered by this many miles (requires coordinates). The buffer is
+          doubled until a path is found or the box covers the whole network,
+          so paths are never missed. Windowed pairs are searched one at a
+          time, not grouped by A-node. At MHN scale, plain astar is faster
+          (see shortest_path_benchmark.py), so the SAS programs do not use it.
+      --cache cache_db
+          SQLite path cache to consult before searching, and to store new
+          results in (default path_cache.sqlite in the MHN temp directory).
+      --no-cache
+          Search for every pair, without using the path cache.
+      --hierarchy ch_file
+          Contraction hierarchy file for the graph (normally saved alongside
+          the scenario's highway batchin files). It is only used with
+          --method ch (which ignores --window), and must have been built from
+          the same network. At MHN scale, queries are slower than with astar
+          (see shortest_path_benchmark.py), so it is not the default.
+      --build-hierarchy
+          Build the --hierarchy file first, if it is missing or was built from
+          a different network, and report the build time and query throughput
+          compared to --method (or dijkstra, with --method ch).
+      --workers n
+          Number of processes to spread the pairs across (default 1, i.e.
+          serial; 0 uses every CPU). Workers memory-map the binary graph
+          (a temporary one, if graph_file is a link dictionary) rather than
+          copying it, and results are written in the same order either way.
+
+    Each output row has the form "(cost, [anode, ..., bnode])", which is what
+    read_path_output.sas expects. If no path exists, "(0, [anode, bnode])" is
+    written so that the SAS programs report it as a path error.
 
     This script will be called using the system's default python installation
     (whatever is returned by the command "ftype Python.File" in cmd.exe), and
@@ -14,62 +79,152 @@
 
 '''
 from __future__ import print_function  # Keep in case system Python is 2.x
+import argparse
 import csv
+import multiprocessing
+import os
+import random
 import sys
-import heapq
-# Do NOT import MHN and call MHN.find_shortest_path()! Importing MHN for each
-# anode-bnode pair takes *forever* when run outside of ArcGIS (i.e. from SAS).
+import time
+# Do NOT import MHN and call MHN.find_shortest_path()! Importing MHN takes
+# *forever* when run outside of ArcGIS (i.e. from SAS). Use the arcpy-free
+# network_graph module that MHN.find_shortest_path() is built on instead (and
+# mhn_core for any of MHN's constants or TIPID helpers).
+from network_graph import METHODS, NetworkGraph, read_node_coordinates
+from path_cache import PathCache
+from contraction_hierarchy import ContractionHierarchy
+
 
 # -----------------------------------------------------------------------------
-#  Set parameters.
+#  Define functions.
 # -----------------------------------------------------------------------------
-anode = sys.argv[1]
-bnode = sys.argv[2]
-link_dict_txt = sys.argv[3]
-short_path_txt = sys.argv[4]
-sys.setrecursionlimit(6000)  # Max. iterations (sys default = 1000)
+def read_path_pairs(path_pairs_txt):
+    ''' Read a list of (anode, bnode) tuples from a comma-delimited file. Rows
+        that do not contain two node IDs (e.g. headers) are skipped. '''
+    pairs = []
+    with open(path_pairs_txt) as r:
+        for row in csv.reader(r):
+            try:
+                pairs.append((int(row[0]), int(row[1])))
+            except (IndexError, ValueError):
+                continue
+    return pairs
+
+
+def format_path(anode, bnode, result):
+    ''' Format a NetworkGraph.shortest_path() result as a line of
+        short_path.txt. '''
+    if result is None:
+        result = (0, [anode, bnode])  # Zero cost flags a path error in SAS
+    return str(result) + '\n'
+
+
+def load_hierarchy(graph, ch_file):
+    ''' Attach the contraction hierarchy in ch_file to graph, if it exists
+        and was built from the same network. Returns True if attached. '''
+    if not os.path.exists(ch_file):
+        return False
+    if graph.set_hierarchy(ContractionHierarchy.load(ch_file)):
+        print('Using contraction hierarchy {0}.'.format(ch_file))
+        return True
+    print('{0} was built from a different network; not using it.'.format(ch_file))
+    return False
+
+
+def build_hierarchy(graph, ch_file, method, sample_size=200):
+    ''' Build, save and attach a contraction hierarchy for graph, reporting
+        the build time and the query throughput of the hierarchy versus
+        method on a fixed random sample of node pairs. '''
+    start_time = time.time()
+    hierarchy = ContractionHierarchy.build(graph)
+    build_seconds = time.time() - start_time
+    hierarchy.save(ch_file)
+    graph.set_hierarchy(hierarchy)
+    print('Built contraction hierarchy {0} in {1:.1f} seconds ({2} links, including shortcuts, vs. {3}).'.format(
+        ch_file, build_seconds, hierarchy.link_count, graph.link_count))
+
+    rng = random.Random(0)
+    sample = [(graph.node_ids[rng.randrange(graph.node_count)], graph.node_ids[rng.randrange(graph.node_count)])
+              for i in range(sample_size)]
+    if method == 'ch':
+        method = 'dijkstra'
+    seconds = {}
+    for query_method in (method, 'ch'):
+        start_time = time.time()
+        for anode, bnode in sample:
+            graph.shortest_path(anode, bnode, query_method)
+        seconds[query_method] = max(time.time() - start_time, 1e-9) / sample_size
+        print('  {0}: {1:.3f} ms/query ({2:.0f} queries/second)'.format(
+            query_method, seconds[query_method] * 1000, 1 / seconds[query_method]))
+    if seconds['ch'] < seconds[method]:
+        print('  Preprocessing pays off after {0:.0f} queries.'.format(build_seconds / (seconds[method] - seconds['ch'])))
+    return hierarchy
 
 
 # -----------------------------------------------------------------------------
-#  Find shortest path.
+#  Find shortest path(s).
 # -----------------------------------------------------------------------------
-# Use copy of find_shortest_path() from MHN.py to avoid costly arcpy imports:
-def find_shortest_path(graph, start, end):
-    ''' Recursive function written by Chris Laffra to find shortest path
-        between 2 nodes in a graph; implementation of Dijkstra's algorithm.
-        Based on <http://code.activestate.com/recipes/119466/#c6>.
-
-        Example graph dictionary (sub-dicts contain distances):
-
-            {'a': {'w': 14, 'x': 7, 'y': 9},
-             'b': {'w': 9, 'z': 6},
-             'w': {'a': 14, 'b': 9, 'y': 2},
-             'x': {'a': 7, 'y': 10, 'z': 15},
-             'y': {'a': 9, 'w': 2, 'x': 10, 'z': 11},
-             'z': {'b': 6, 'x': 15, 'y': 11}}
-    '''
-    queue = [(0, start, [])]
-    seen = set()
-    while True:
-        (p_cost, node, path) = heapq.heappop(queue)
-        if node not in seen:
-            path = path + [node]
-            seen.add(node)
-            if node == end:
-                return p_cost, path
-            if node in graph.keys():
-                for (b_node, b_cost) in graph[node].items():
-                    heapq.heappush(queue, (p_cost + b_cost, b_node, path))
-
-graph = {}
-reader = csv.reader(open(link_dict_txt), delimiter='$')
-for row in reader:
-    graph[eval(row[0])] = eval(row[1]) # Assign key/value pairs
-
-print('Finding shortest path from {0} to {1}...'.format(anode, bnode))
-
-short_path = open(short_path_txt, 'a')
-short_path.write(str(find_shortest_path(graph, eval(anode), eval(bnode))) + '\n')
-short_path.close()
-
-print('DONE')
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Find shortest path(s) through a network graph.')
+    parser.add_argument('args', nargs='+', help='[anode bnode] graph_file short_path_txt')
+    parser.add_argument('--pairs', help='file of "anode,bnode" rows to solve in one call')
+    parser.add_argument('--convert', action='store_true', help='convert link_dict_txt to binary graph_file')
+    parser.add_argument('--nodes', help='CSV of node coordinates (NODE, POINT_X, POINT_Y), for A*')
+    parser.add_argument('--method', choices=METHODS, default='dijkstra', help='search method')
+    parser.add_argument('--save-graph', help='binary graph file to save the graph to')
+    parser.add_argument('--window', type=float, help='search window buffer (miles) around each pair')
+    parser.add_argument('--cache', help='SQLite path cache (default: path_cache.sqlite in MHN temp dir)')
+    parser.add_argument('--no-cache', action='store_true', help='do not use the path cache')
+    parser.add_argument('--hierarchy', help='contraction hierarchy file to use, if current')
+    parser.add_argument('--workers', type=int, default=1, help='number of worker processes')
+    parser.add_argument('--build-hierarchy', action='store_true', help='build the --hierarchy file, if not current')
+    opts = parser.parse_args()
+
+    if opts.convert:
+        graph_file, opts.save_graph = opts.args
+        pairs = []
+    elif opts.pairs:
+        graph_file, short_path_txt = opts.args
+        pairs = read_path_pairs(opts.pairs)
+        write_mode = 'w'
+    else:
+        anode, bnode, graph_file, short_path_txt = opts.args
+        pairs = [(int(anode), int(bnode))]
+        write_mode = 'a'
+
+    graph = NetworkGraph.from_file(graph_file)
+    if opts.nodes:
+        graph.set_coordinates(read_node_coordinates(opts.nodes))
+    if opts.save_graph:
+        graph.save(opts.save_graph)
+        print('Saved {0}-node, {1}-link graph to {2}.'.format(graph.node_count, graph.link_count, opts.save_graph))
+    if opts.workers < 1:
+        opts.workers = multiprocessing.cpu_count()
+    if opts.hierarchy and (opts.method == 'ch' or opts.build_hierarchy):
+        if not load_hierarchy(graph, opts.hierarchy) and opts.build_hierarchy:
+            build_hierarchy(graph, opts.hierarchy, opts.method)
+    if opts.convert:
+        sys.exit()
+    if opts.method == 'ch' and graph.hierarchy is None:
+        sys.exit('--method ch requires a current --hierarchy file (or --build-hierarchy).')
+
+    if len(pairs) == 1:
+        print('Finding shortest path from {0} to {1}...'.format(*pairs[0]))
+    else:
+        print('Finding {0} shortest paths...'.format(len(pairs)))
+
+    if opts.no_cache:
+        results = graph.solve_pairs(pairs, opts.method, opts.window, opts.workers)
+    else:
+        with PathCache(opts.cache) as cache:
+            results = cache.solve_pairs(graph, pairs, opts.method, opts.window, opts.workers)
+        print('Path cache: {0} hits, {1} misses.'.format(cache.hits, cache.misses))
+    with open(short_path_txt, write_mode) as short_path:
+        for (anode, bnode), result in zip(pairs, results):
+            short_path.write(format_path(anode, bnode, result))
+
+    print('Ran {0} searches ({1} saved by grouping pairs on A-node), settling {2} nodes.'.format(
+        graph.last_searches, graph.last_searches_saved, graph.last_settled))
+    if opts.window is not None and opts.method != 'ch':
+        print('Widened the search window for {0} searches.'.format(graph.last_widened))
+    print('DONE')
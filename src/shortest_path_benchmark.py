@@ -0,0 +1,371 @@
+#!/usr/bin/env python
+'''
+    shortest_path_benchmark.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    Benchmarks every shortest path implementation used by the MHN programs on
+    a synthetic network of MHN scale, and writes the timings (and peak memory)
+    as JSON, so that regressions are visible from one change to the next.
+
+    The synthetic network is planar: a jittered grid of network nodes (IDs
+    from 5001, up to 29999) linked to their grid neighbors, with a share of
+    the links randomly dropped or made one-way (DIRECTIONS = 1), plus zone
+    centroids (IDs 1-3649) attached by two-way connectors. As in the SAS link
+    dictionary, centroid connectors are excluded from the graph that is
+    searched, and costs are integer miles * 100. The same seed always
+    produces the same network and the same itinerary gap queries (short hops
+    between nearby nodes, some sharing an A-node).
+
+    Usage:
+
+      shortest_path_benchmark.py [--nodes n] [--queries n] [--seed n]
+                                 [--workers n] [--no-hierarchy] [--no-memory]
+                                 [--output results_json]
+
+    Results are printed, and written to results_json if specified. Each
+    implementation's path costs are checked against Dijkstra's (windowed
+    searches may only ever be longer), and any mismatches are reported. The
+    results of solve_pairs() must also be identical (costs and paths) to
+    solving each pair with shortest_path() and the same method and window,
+    and shortest_path.py must write the same short_path.txt whether the path
+    cache is empty (cold) or already holds every pair (warm).
+
+    Unlike shortest_path.py, this script requires Python 3.
+
+'''
+import argparse
+import csv
+import heapq
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from math import sqrt
+
+from network_graph import FEET_PER_MILE, NetworkGraph, read_node_coordinates
+from contraction_hierarchy import ContractionHierarchy
+
+MAX_ZONE = 3649  # Highest zone centroid ID
+MIN_NODE = 5001  # Lowest network node ID
+MAX_NODE = 29999  # Highest network node ID
+GRID_SPACING = 0.5 * FEET_PER_MILE  # Distance between neighboring grid nodes
+ORIGIN = (1000000.0, 1800000.0)  # Lower-left corner, in (roughly) IL State Plane East feet
+DROP_SHARE = 0.1  # Share of grid links left out, so that blocks are irregular
+ONE_WAY_SHARE = 0.15  # Share of links with DIRECTIONS = 1
+MULTI_END_SHARE = 0.25  # Share of gap queries whose A-node has several B-nodes
+MAX_GAP_STEPS = 12  # Gap queries span up to this many grid steps (6 miles)
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def generate_network(node_count=MAX_NODE - MIN_NODE + 1, seed=0):
+    ''' Generate a synthetic planar network of about node_count network nodes
+        (at most MAX_NODE - MIN_NODE + 1), plus MAX_ZONE zone centroids.
+        Returns (links, coords, grid), where links is a list of MHN arc
+        (anode, bnode, directions, miles) tuples, coords is a {node: (x, y)}
+        dict and grid is a list of rows of network node IDs. '''
+    rng = random.Random(seed)
+    side = int(sqrt(min(node_count, MAX_NODE - MIN_NODE + 1)))
+    grid = [[MIN_NODE + row * side + col for col in range(side)] for row in range(side)]
+    coords = {}
+    for row in range(side):
+        for col in range(side):
+            coords[grid[row][col]] = (
+                ORIGIN[0] + (col + rng.uniform(-0.3, 0.3)) * GRID_SPACING,
+                ORIGIN[1] + (row + rng.uniform(-0.3, 0.3)) * GRID_SPACING
+            )
+
+    def miles(anode, bnode):
+        (xa, ya), (xb, yb) = coords[anode], coords[bnode]
+        return sqrt((xa - xb) ** 2 + (ya - yb) ** 2) / FEET_PER_MILE
+
+    links = []
+    for row in range(side):
+        for col in range(side):
+            for next_row, next_col in ((row, col + 1), (row + 1, col)):
+                if next_row == side or next_col == side or rng.random() < DROP_SHARE:
+                    continue
+                anode, bnode = grid[row][col], grid[next_row][next_col]
+                if rng.random() < ONE_WAY_SHARE:
+                    if rng.random() < 0.5:
+                        anode, bnode = bnode, anode
+                    links.append((anode, bnode, 1, miles(anode, bnode)))
+                else:
+                    links.append((anode, bnode, 2, miles(anode, bnode)))
+
+    # Zone centroids sit near a random network node, with a two-way connector
+    for zone in range(1, MAX_ZONE + 1):
+        node = grid[rng.randrange(side)][rng.randrange(side)]
+        x, y = coords[node]
+        coords[zone] = (x + rng.uniform(-0.2, 0.2) * GRID_SPACING, y + rng.uniform(-0.2, 0.2) * GRID_SPACING)
+        links.append((zone, node, 2, miles(zone, node)))
+
+    return links, coords, grid
+
+
+def generate_queries(grid, query_count=500, seed=0):
+    ''' Generate a fixed list of (anode, bnode) itinerary gap queries between
+        nearby network nodes (up to MAX_GAP_STEPS grid steps apart). Some
+        A-nodes are given several B-nodes, as happens when the same node
+        starts gaps in several itineraries. '''
+    rng = random.Random(seed)
+    side = len(grid)
+    steps = min(MAX_GAP_STEPS, side - 1)
+    queries = []
+    while len(queries) < query_count:
+        row, col = rng.randrange(side), rng.randrange(side)
+        end_count = rng.randint(2, 4) if rng.random() < MULTI_END_SHARE else 1
+        for i in range(min(end_count, query_count - len(queries))):
+            end_row = min(max(row + rng.randint(-steps, steps), 0), side - 1)
+            end_col = min(max(col + rng.randint(-steps, steps), 0), side - 1)
+            queries.append((grid[row][col], grid[end_row][end_col]))
+    return queries
+
+
+def write_link_dict(links, link_dict_txt):
+    ''' Write links (excluding centroid connectors) as a $-delimited link
+        dictionary, in the same format as the SAS programs. '''
+    bnodes = {}
+    for anode, bnode, directions, miles in links:
+        if anode <= MAX_ZONE or bnode <= MAX_ZONE:
+            continue
+        bnodes.setdefault(anode, []).append((bnode, int(miles * 100)))
+        if directions > 1:
+            bnodes.setdefault(bnode, []).append((anode, int(miles * 100)))
+    with open(link_dict_txt, 'w') as w:
+        for anode in sorted(bnodes):
+            w.write('{0}${{{1}}}\n'.format(anode, ','.join('{0}:{1}'.format(*b) for b in bnodes[anode])))
+
+
+def write_nodes_csv(coords, nodes_csv):
+    ''' Write network node coordinates as a NODE, POINT_X, POINT_Y CSV. '''
+    with open(nodes_csv, 'w') as w:
+        writer = csv.writer(w, lineterminator='\n')
+        writer.writerow(['NODE', 'POINT_X', 'POINT_Y'])
+        for node in sorted(coords):
+            if node >= MIN_NODE:
+                writer.writerow([node, coords[node][0], coords[node][1]])
+
+
+def read_legacy_link_dict(link_dict_txt):
+    ''' Read a link dictionary into a dict-of-dicts, as the original
+        shortest_path.py did. '''
+    graph = {}
+    with open(link_dict_txt) as r:
+        for row in csv.reader(r, delimiter='$'):
+            graph[eval(row[0])] = eval(row[1])
+    return graph
+
+
+def legacy_find_shortest_path(graph, start, end):
+    ''' The original MHN.find_shortest_path() (Chris Laffra's recipe), kept
+        as the baseline: a Dijkstra search over a dict-of-dicts that copies
+        the path onto every queue entry. Returns None (rather than raising
+        IndexError) if there is no path. '''
+    queue = [(0, start, [])]
+    seen = set()
+    while queue:
+        (p_cost, node, path) = heapq.heappop(queue)
+        if node not in seen:
+            path = path + [node]
+            seen.add(node)
+            if node == end:
+                return p_cost, path
+            if node in graph:
+                for (b_node, b_cost) in graph[node].items():
+                    heapq.heappush(queue, (p_cost + b_cost, b_node, path))
+    return None
+
+
+def measure(func, memory=True):
+    ''' Call func() and return (result, seconds, peak_kb). Peak memory is
+        measured in a second call, so that tracing does not slow the timed
+        one; peak_kb is None if memory is False. '''
+    start_time = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start_time
+    peak_kb = None
+    if memory:
+        tracemalloc.start()
+        func()
+        peak_kb = round(tracemalloc.get_traced_memory()[1] / 1024.0, 1)
+        tracemalloc.stop()
+    return result, seconds, peak_kb
+
+
+def compare_costs(results, reference, at_least=False):
+    ''' Count the results whose cost differs from the reference results (or,
+        if at_least, is lower than it, as windowed searches may be longer). '''
+    mismatches = 0
+    for result, expected in zip(results, reference):
+        if (result is None) != (expected is None):
+            mismatches += 1
+        elif result is not None:
+            if result[0] < expected[0] - 1e-9 or (not at_least and result[0] > expected[0] + 1e-9):
+                mismatches += 1
+    return mismatches
+
+
+def compare_paths(results, reference):
+    ''' Count the results that are not identical (cost and path) to the
+        reference results. '''
+    return sum(1 for result, expected in zip(results, reference) if result != expected)
+
+
+def check_path_cache(pairs_csv, link_dict_txt, nodes_csv, temp_dir, method, window=None):
+    ''' Run shortest_path.py twice with the same new path cache, and return
+        whether the short_path.txt written by the cold (empty cache) and warm
+        (every pair cached) runs are identical. '''
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'shortest_path.py')
+    cache_db = os.path.join(temp_dir, 'path_cache_{0}_{1}.sqlite'.format(method, window))
+    outputs = []
+    for run in ('cold', 'warm'):
+        short_path_txt = os.path.join(temp_dir, 'short_path_{0}.txt'.format(run))
+        command = [sys.executable, script, '--pairs', pairs_csv, '--nodes', nodes_csv, '--method', method,
+                   '--cache', cache_db, link_dict_txt, short_path_txt]
+        if window is not None:
+            command += ['--window', str(window)]
+        subprocess.check_output(command)
+        with open(short_path_txt) as r:
+            outputs.append(r.read())
+    os.remove(cache_db)
+    return outputs[0] == outputs[1]
+
+
+def run_benchmark(node_count=MAX_NODE - MIN_NODE + 1, query_count=500, seed=0, workers=1,
+                  hierarchy=True, memory=True, temp_dir=None):
+    ''' Generate the synthetic network and queries, time every
+        implementation, and return the results as a JSON-serializable dict. '''
+    links, coords, grid = generate_network(node_count, seed)
+    queries = generate_queries(grid, query_count, seed)
+    link_dict_txt = os.path.join(temp_dir, 'link_dict.txt')
+    nodes_csv = os.path.join(temp_dir, 'nodes.csv')
+    graph_file = os.path.join(temp_dir, 'network.graph')
+    ch_file = os.path.join(temp_dir, 'network.ch')
+    write_link_dict(links, link_dict_txt)
+    write_nodes_csv(coords, nodes_csv)
+
+    benchmark = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'seed': seed,
+        'network': {
+            'nodes': sum(len(row) for row in grid),
+            'centroids': MAX_ZONE,
+            'arcs': len(links),
+            'one_way_arcs': sum(1 for link in links if link[2] == 1),
+        },
+        'queries': {
+            'count': len(queries),
+            'a_nodes': len(set(anode for anode, bnode in queries)),
+        },
+        'load': [],
+        'paths': [],
+    }
+
+    def record(section, name, func, count=None):
+        result, seconds, peak_kb = measure(func, memory)
+        entry = {'name': name, 'seconds': round(seconds, 4), 'peak_kb': peak_kb}
+        if count:
+            entry['ms_per_query'] = round(1000 * seconds / count, 4)
+        benchmark[section].append(entry)
+        print('{0:<32} {1:>10.3f} s{2}'.format(
+            name, seconds, '' if peak_kb is None else ' {0:>12,.0f} KB peak'.format(peak_kb)))
+        return result, entry
+
+    # Graph loading
+    legacy_graph = record('load', 'legacy_link_dict', lambda: read_legacy_link_dict(link_dict_txt))[0]
+    graph = record('load', 'link_dict', lambda: NetworkGraph.from_link_dict(link_dict_txt))[0]
+    graph.set_coordinates(record('load', 'nodes_csv', lambda: read_node_coordinates(nodes_csv))[0])
+    graph.save(graph_file)
+    graph = record('load', 'binary_graph', lambda: NetworkGraph.load(graph_file))[0]
+    benchmark['network']['graph_links'] = graph.link_count
+
+    # Path searches (Dijkstra is the reference for every other method)
+    reference, entry = record('paths', 'dijkstra', lambda: [graph.shortest_path(a, b) for a, b in queries], len(queries))
+    entry['mismatches'] = 0
+    # (name, function, at_least, name of the per-pair search whose results solve_pairs() must equal)
+    searches = [
+        ('legacy_find_shortest_path', lambda: [legacy_find_shortest_path(legacy_graph, a, b) for a, b in queries], False, None),
+        ('astar', lambda: [graph.shortest_path(a, b, 'astar') for a, b in queries], False, None),
+        ('bidirectional', lambda: [graph.shortest_path(a, b, 'bidirectional') for a, b in queries], False, None),
+        ('astar_window_3', lambda: [graph.shortest_path(a, b, 'astar', 3) for a, b in queries], True, None),
+        ('solve_pairs_dijkstra', lambda: graph.solve_pairs(queries), False, 'dijkstra'),
+        ('solve_pairs_astar', lambda: graph.solve_pairs(queries, 'astar'), False, 'astar'),
+        ('solve_pairs_astar_window_3', lambda: graph.solve_pairs(queries, 'astar', 3), True, 'astar_window_3'),
+    ]
+    if workers > 1:
+        searches.append((
+            'solve_pairs_astar_workers_{0}'.format(workers),
+            lambda: graph.solve_pairs(queries, 'astar', None, workers), False, 'astar'
+        ))
+    per_pair = {'dijkstra': reference}
+    for name, func, at_least, per_pair_name in searches:
+        results, entry = record('paths', name, func, len(queries))
+        entry['mismatches'] = compare_costs(results, reference, at_least)
+        if per_pair_name:
+            entry['mismatches'] += compare_paths(results, per_pair[per_pair_name])
+        per_pair[name] = results
+
+    # Path cache: cold and warm runs of shortest_path.py must write the same paths
+    pairs_csv = os.path.join(temp_dir, 'path_pairs.csv')
+    with open(pairs_csv, 'w') as w:
+        w.write(''.join('{0},{1}\n'.format(a, b) for a, b in queries))
+    benchmark['path_cache'] = []
+    for method, window in (('dijkstra', None), ('astar', None), ('astar', 3)):
+        identical = check_path_cache(pairs_csv, link_dict_txt, nodes_csv, temp_dir, method, window)
+        benchmark['path_cache'].append({'method': method, 'window': window, 'identical': identical})
+        print('{0:<32} {1:>12}'.format('path_cache_{0}{1}'.format(method, '_window_{0}'.format(window) if window else ''),
+                                       'identical' if identical else 'DIFFERENT'))
+
+    if hierarchy:
+        built, entry = record('load', 'build_hierarchy', lambda: ContractionHierarchy.build(graph))
+        entry['links'] = built.link_count
+        built.save(ch_file)
+        graph.set_hierarchy(record('load', 'hierarchy_file', lambda: ContractionHierarchy.load(ch_file))[0])
+        results, entry = record('paths', 'ch', lambda: [graph.shortest_path(a, b, 'ch') for a, b in queries], len(queries))
+        entry['mismatches'] = compare_costs(results, reference)
+
+    return benchmark
+
+
+# -----------------------------------------------------------------------------
+#  Run the benchmark.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the MHN shortest path implementations.')
+    parser.add_argument('--nodes', type=int, default=MAX_NODE - MIN_NODE + 1,
+                        help='approximate number of network nodes (default %(default)s)')
+    parser.add_argument('--queries', type=int, default=500, help='number of gap queries (default %(default)s)')
+    parser.add_argument('--seed', type=int, default=0, help='random seed for the network and queries')
+    parser.add_argument('--workers', type=int, default=1, help='also time solve_pairs() with this many processes')
+    parser.add_argument('--no-hierarchy', action='store_true', help='skip the (slow) contraction hierarchy build')
+    parser.add_argument('--no-memory', action='store_true', help='skip peak memory measurements')
+    parser.add_argument('--output', help='JSON file to write the results to')
+    args = parser.parse_args()
+
+    temp_dir = tempfile.mkdtemp(prefix='mhn_benchmark_')
+    try:
+        results = run_benchmark(args.nodes, args.queries, args.seed, args.workers,
+                                not args.no_hierarchy, not args.no_memory, temp_dir)
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
+    if args.output:
+        with open(args.output, 'w') as w:
+            json.dump(results, w, indent=2, sort_keys=True)
+        print('Results written to {0}.'.format(args.output))
+    mismatched = [entry['name'] for entry in results['paths'] if entry.get('mismatches')]
+    mismatched += ['path_cache_{0}_window_{1}'.format(entry['method'], entry['window'])
+                   for entry in results['path_cache'] if not entry['identical']]
+    if mismatched:
+        print('WARNING: results differ from their reference (see above) for: {0}'.format(', '.join(mismatched)))
+        sys.exit(1)
@@ -0,0 +1,729 @@
+#!/usr/bin/env python
+'''
+    storage.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    Storage backends for MHN.py. MasterHighwayNetwork reads and writes its
+    feature classes and tables through one of these, chosen by the
+    extension of the MHN path (see open_storage()):
+
+      - ArcpyStorage: an ArcGIS file geodatabase, through arcpy.da cursors.
+      - GeoPackageStorage: a GeoPackage (or plain SQLite) copy of the MHN,
+        through the standard library's sqlite3, with geometries as NumPy
+        arrays of vertices. Needs no ArcGIS license, so the attribute
+        methods of MHN.py (cursors, make_attribute_dict(),
+        write_attribute_csv(), snapshot(), build_geometry_dict(), etc.) can
+        be run and tested headless.
+
+    Both have the same methods, taking the same dataset paths that MHN.py
+    builds (e.g. <gdb>/hwynet/hwynet_arc). A GeoPackage has no feature
+    datasets, so its tables are named by the last part of the path
+    (hwynet_arc). Cursors take the same field lists, where clauses and
+    sql_clause as arcpy.da cursors, including the 'OID@' and 'SHAPE@'
+    tokens. In a GeoPackage, 'SHAPE@' is a list of (n, 2) vertex arrays,
+    one per part (or ring).
+
+    Geoprocessing tools (MakeFeatureLayer, CalculateField, etc.) are still
+    arcpy-only.
+
+    Running this script copies the feature classes and tables of an MHN
+    geodatabase (which needs arcpy) to a new GeoPackage:
+
+      storage.py mhn_gdb out_gpkg
+
+'''
+import collections
+import fnmatch
+import os
+import sqlite3
+import struct
+import sys
+
+import numpy as np
+
+Field = collections.namedtuple('Field', ['name', 'type'])
+
+GEOPACKAGE_EXTENSIONS = ('.gpkg', '.sqlite', '.db')
+
+# SQLite declared types, by arcpy field type, for GeoPackageStorage.create_table()
+SQLITE_TYPES = {
+    'OID': 'INTEGER', 'SmallInteger': 'SMALLINT', 'Integer': 'INTEGER', 'Single': 'FLOAT',
+    'Double': 'DOUBLE', 'String': 'TEXT', 'Date': 'DATETIME', 'GUID': 'TEXT', 'GlobalID': 'TEXT', 'Blob': 'BLOB',
+}
+
+# arcpy field types, by SQLite declared type, for GeoPackageStorage.list_fields()
+ARCPY_TYPES = {
+    'SMALLINT': 'SmallInteger', 'TINYINT': 'SmallInteger', 'BOOLEAN': 'SmallInteger',
+    'INTEGER': 'Integer', 'INT': 'Integer', 'MEDIUMINT': 'Integer',
+    'FLOAT': 'Single', 'DOUBLE': 'Double', 'REAL': 'Double',
+    'TEXT': 'String', 'DATE': 'Date', 'DATETIME': 'Date', 'BLOB': 'Blob',
+}
+
+# GeoPackage geometry type, by arcpy shape type
+GEOMETRY_TYPES = {'Point': 'POINT', 'Multipoint': 'MULTIPOINT', 'Polyline': 'MULTILINESTRING', 'Polygon': 'POLYGON'}
+
+WKB_TYPES = {'POINT': 1, 'LINESTRING': 2, 'POLYGON': 3, 'MULTIPOINT': 4, 'MULTILINESTRING': 5}
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def open_storage(path):
+    ''' Return the storage backend for an MHN path: GeoPackageStorage for a
+        .gpkg/.sqlite/.db file, otherwise ArcpyStorage. '''
+    if os.path.splitext(path)[1].lower() in GEOPACKAGE_EXTENSIONS:
+        return GeoPackageStorage(path)
+    return ArcpyStorage(path)
+
+
+def add_message(message):
+    ''' arcpy.AddMessage(), if arcpy has been imported, otherwise print. '''
+    arcpy = sys.modules.get('arcpy')
+    if arcpy:
+        arcpy.AddMessage(message)
+    else:
+        print(message)
+    return None
+
+
+def add_warning(message):
+    ''' arcpy.AddWarning(), if arcpy has been imported, otherwise print to
+        stderr. '''
+    arcpy = sys.modules.get('arcpy')
+    if arcpy:
+        arcpy.AddWarning(message)
+    else:
+        print(message, file=sys.stderr)
+    return None
+
+
+def add_error(message):
+    ''' arcpy.AddError(), if arcpy has been imported, otherwise print to
+        stderr. '''
+    arcpy = sys.modules.get('arcpy')
+    if arcpy:
+        arcpy.AddError(message)
+    else:
+        print(message, file=sys.stderr)
+    return None
+
+
+def _read_wkb(buf, offset, parts):
+    ''' Append the (n, 2) vertex arrays of each part/ring of the WKB geometry
+        at offset in buf to parts, returning the offset of its end. Z and M
+        values are dropped. '''
+    endian = '<' if buf[offset] == 1 else '>'
+    wkb_type = struct.unpack_from(endian + 'I', buf, offset + 1)[0]
+    offset += 5
+    dims = 2 + bool(wkb_type & 0x80000000) + bool(wkb_type & 0x40000000)  # EWKB Z/M flags
+    wkb_type &= 0x0FFFFFFF
+    dims += {1: 1, 2: 1, 3: 2}.get(wkb_type // 1000, 0)  # ISO Z, M, ZM
+    base_type = wkb_type % 1000
+
+    def read_points(offset, n):
+        coords = np.frombuffer(buf, endian + 'f8', n * dims, offset).reshape(n, dims)[:, :2]
+        parts.append(coords.astype('f8'))
+        return offset + 8 * n * dims
+
+    if base_type == 1:
+        offset = read_points(offset, 1)
+    elif base_type == 2:
+        offset = read_points(offset + 4, struct.unpack_from(endian + 'I', buf, offset)[0])
+    elif base_type == 3:
+        ring_count = struct.unpack_from(endian + 'I', buf, offset)[0]
+        offset += 4
+        for ring in range(ring_count):
+            offset = read_points(offset + 4, struct.unpack_from(endian + 'I', buf, offset)[0])
+    elif base_type in (4, 5, 6, 7):
+        geom_count = struct.unpack_from(endian + 'I', buf, offset)[0]
+        offset += 4
+        for geom in range(geom_count):
+            offset = _read_wkb(buf, offset, parts)
+    else:
+        raise ValueError('Unsupported WKB geometry type {}.'.format(wkb_type))
+    return offset
+
+
+def read_gpkg_geometry(blob):
+    ''' Decode a GeoPackage geometry blob to a list of (n, 2) vertex arrays,
+        one per part (or polygon ring). NULL is returned as None, and an
+        empty geometry as []. '''
+    if blob is None:
+        return None
+    buf = bytes(blob)
+    if buf[:2] != b'GP':
+        raise ValueError('Not a GeoPackage geometry blob.')
+    flags = buf[3]
+    if flags & 0x10:
+        return []
+    envelope_code = (flags >> 1) & 0x07
+    if envelope_code > 4:
+        raise ValueError('Invalid GeoPackage envelope code {}.'.format(envelope_code))
+    parts = []
+    _read_wkb(buf, 8 + (0, 32, 48, 48, 64)[envelope_code], parts)
+    return parts
+
+
+def write_gpkg_geometry(parts, geometry_type, srs_id=0):
+    ''' Encode vertices (an (n, 2) array, or a list of them, one per part) as
+        a GeoPackage geometry blob of the specified type (POINT, LINESTRING,
+        POLYGON, MULTIPOINT, MULTILINESTRING or GEOMETRY, which picks one of
+        the first three or MULTILINESTRING). The parts of a LINESTRING are
+        joined into one, as in MHN.build_geometry_dict(). '''
+    if parts is None:
+        return None
+    if isinstance(parts, np.ndarray):
+        parts = [parts]
+    parts = [np.asarray(part, dtype='<f8').reshape(-1, 2) for part in parts]
+    geometry_type = geometry_type.upper()
+    if geometry_type == 'GEOMETRY':
+        if len(parts) != 1:
+            geometry_type = 'MULTILINESTRING'
+        else:
+            geometry_type = 'POINT' if len(parts[0]) == 1 else 'LINESTRING'
+    if geometry_type not in WKB_TYPES:
+        raise ValueError('Unsupported geometry type {}.'.format(geometry_type))
+    wkb_type = WKB_TYPES[geometry_type]
+    empty = not any(len(part) for part in parts)
+
+    def linestring(part):
+        return struct.pack('<BII', 1, 2, len(part)) + part.tobytes()
+
+    if geometry_type == 'POINT':
+        wkb = struct.pack('<BI', 1, wkb_type) + (parts[0][0].tobytes() if not empty else struct.pack('<2d', np.nan, np.nan))
+    elif geometry_type == 'LINESTRING':
+        wkb = linestring(np.concatenate(parts) if parts else np.empty((0, 2), '<f8'))
+    elif geometry_type == 'POLYGON':
+        wkb = struct.pack('<BII', 1, wkb_type, len(parts)) + b''.join(struct.pack('<I', len(p)) + p.tobytes() for p in parts)
+    elif geometry_type == 'MULTIPOINT':
+        points = np.concatenate(parts) if parts else np.empty((0, 2), '<f8')
+        wkb = struct.pack('<BII', 1, wkb_type, len(points)) + b''.join(struct.pack('<BI', 1, 1) + p.tobytes() for p in points)
+    else:
+        wkb = struct.pack('<BII', 1, wkb_type, len(parts)) + b''.join(linestring(part) for part in parts)
+    flags = 0x01 | (0x10 if empty else 0)  # Little-endian header, no envelope
+    return b'GP' + bytes((0, flags)) + struct.pack('<i', srs_id) + wkb
+
+
+def _geometry_bound(blob, axis, func):
+    ''' ST_MinX() etc., used by the R-tree triggers of GeoPackage tables. '''
+    parts = read_gpkg_geometry(blob)
+    if not parts:
+        return None
+    return float(func(np.concatenate(parts)[:, axis]))
+
+
+def _geometry_is_empty(blob):
+    parts = read_gpkg_geometry(blob)
+    return 1 if parts is None or not any(len(part) for part in parts) else 0
+
+
+def copy_dataset(source, dest, table, dest_table=None):
+    ''' Copy a feature class/table, with its OIDs, from one storage backend
+        to a new table in a GeoPackageStorage. Returns the number of rows
+        copied. '''
+    dest_table = dest_table or table
+    fields = [f for f in source.list_fields(table) if f.type not in ('OID', 'Geometry')]
+    geometry_type = source.geometry_type(table)
+    srs_id = 0
+    if geometry_type:
+        sr = source.spatial_reference(table)
+        srs_id = dest.add_spatial_reference(sr)
+    dest.create_table(dest_table, fields, geometry_type, srs_id)
+    cursor_fields = ['OID@'] + [f.name for f in fields] + (['SHAPE@'] if geometry_type else [])
+    row_count = 0
+    with source.search(table, cursor_fields) as in_cursor:
+        with dest.insert(dest_table, cursor_fields) as out_cursor:
+            for row in in_cursor:
+                if geometry_type:
+                    row = tuple(row[:-1]) + (source.vertex_parts(row[-1]),)
+                out_cursor.insertRow(row)
+                row_count += 1
+    return row_count
+
+
+def export_geopackage(mhn_gdb, out_gpkg):
+    ''' Copy every feature class and table of an MHN geodatabase to a new
+        GeoPackage, for use with GeoPackageStorage. '''
+    import arcpy
+    source = ArcpyStorage(mhn_gdb)
+    dest = GeoPackageStorage(out_gpkg)
+    datasets = list(arcpy.ListTables() or []) + list(arcpy.ListFeatureClasses() or [])
+    for fd in arcpy.ListDatasets(feature_type='Feature') or []:
+        datasets += [os.path.join(fd, fc) for fc in arcpy.ListFeatureClasses(feature_dataset=fd) or []]
+    for dataset in datasets:
+        row_count = copy_dataset(source, dest, os.path.join(mhn_gdb, dataset), os.path.basename(dataset))
+        add_message('{0}: {1} rows'.format(dataset, row_count))
+    dest.close()
+    return out_gpkg
+
+
+# -----------------------------------------------------------------------------
+#  Define storage backends.
+# -----------------------------------------------------------------------------
+class ArcpyStorage(object):
+    ''' An ArcGIS workspace (e.g. the MHN file geodatabase), through
+        arcpy. '''
+
+    def __init__(self, workspace):
+        import arcpy
+        self.arcpy = arcpy
+        self.workspace = workspace
+        arcpy.env.overwriteOutput = True
+        arcpy.env.workspace = workspace
+
+    def exists(self, table):
+        return self.arcpy.Exists(table)
+
+    def list_tables(self, wildcard='*'):
+        return list(self.arcpy.ListTables(wildcard) or [])
+
+    def list_fields(self, table):
+        return [Field(f.name, f.type) for f in self.arcpy.ListFields(table)]
+
+    def oid_field(self, table):
+        return self.arcpy.Describe(table).OIDFieldName
+
+    def geometry_type(self, table):
+        ''' The GeoPackage geometry type of a feature class, or None for a
+            table. '''
+        shape_type = getattr(self.arcpy.Describe(table), 'shapeType', None)
+        return GEOMETRY_TYPES.get(shape_type) if shape_type else None
+
+    def spatial_reference(self, table):
+        return self.arcpy.Describe(table).spatialReference
+
+    def editable_fields(self, table):
+        ''' The fields an insert cursor can write (i.e. not the OID, geometry
+            or Shape_Length/Shape_Area fields). '''
+        return [Field(f.name, f.type) for f in self.arcpy.ListFields(table)
+                if f.editable and f.type not in ('OID', 'Geometry')]
+
+    def copy_schema(self, table, out_table):
+        ''' Create an empty feature class/table (replacing any existing one)
+            with the fields, geometry type and spatial reference of
+            another. '''
+        out_dir, out_name = os.path.split(out_table)
+        desc = self.arcpy.Describe(table)
+        shape_type = getattr(desc, 'shapeType', None)
+        if shape_type:
+            self.arcpy.CreateFeatureclass_management(
+                out_dir, out_name, shape_type, table, spatial_reference=desc.spatialReference)
+        else:
+            self.arcpy.CreateTable_management(out_dir, out_name, table)
+        return out_table
+
+    def delete(self, table):
+        ''' Delete a dataset (or any other path arcpy can delete, e.g. a
+            shapefile). '''
+        self.arcpy.Delete_management(table)
+
+    def search(self, table, fields, where_clause=None, sql_clause=(None, None)):
+        return self.arcpy.da.SearchCursor(table, fields, where_clause, sql_clause=sql_clause)
+
+    def update(self, table, fields, where_clause=None, sql_clause=(None, None)):
+        return self.arcpy.da.UpdateCursor(table, fields, where_clause, sql_clause=sql_clause)
+
+    def insert(self, table, fields):
+        return self.arcpy.da.InsertCursor(table, fields)
+
+    def to_numpy(self, table, fields, where_clause=None, null_value=None):
+        return self.arcpy.da.TableToNumPyArray(table, fields, where_clause, null_value=null_value)
+
+    def geometry_dict(self, table, key_field):
+        ''' A {key: arcpy.Array} dict of the vertices of each feature. '''
+        geom_dict = {}
+        with self.arcpy.da.SearchCursor(table, [key_field, 'SHAPE@']) as cursor:
+            for row in cursor:
+                key = row[0]
+                geom = row[1]
+                geom_dict[key] = self.arcpy.Array()
+                for part in geom:
+                    for point in part:
+                        geom_dict[key].add(point)
+        return geom_dict
+
+    @staticmethod
+    def vertex_parts(geom):
+        ''' Convert an arcpy geometry to a list of (n, 2) vertex arrays. '''
+        if geom is None:
+            return None
+        if geom.type == 'point':
+            return [np.array([[geom.firstPoint.X, geom.firstPoint.Y]])]
+        return [np.array([(p.X, p.Y) for p in part if p], dtype='f8').reshape(-1, 2) for part in geom]
+
+
+class GeoPackageStorage(object):
+    ''' A GeoPackage (or plain SQLite database) copy of the MHN, through
+        sqlite3. '''
+
+    def __init__(self, path):
+        self.path = path
+        self.workspace = path
+        self.connection = sqlite3.connect(path)
+        # Needed by the R-tree spatial index triggers of GeoPackage tables
+        self.connection.create_function('ST_IsEmpty', 1, _geometry_is_empty)
+        self.connection.create_function('ST_MinX', 1, lambda g: _geometry_bound(g, 0, np.min))
+        self.connection.create_function('ST_MaxX', 1, lambda g: _geometry_bound(g, 0, np.max))
+        self.connection.create_function('ST_MinY', 1, lambda g: _geometry_bound(g, 1, np.min))
+        self.connection.create_function('ST_MaxY', 1, lambda g: _geometry_bound(g, 1, np.max))
+
+    def close(self):
+        self.connection.close()
+
+    @staticmethod
+    def table_name(table):
+        ''' GeoPackage table of a dataset path, e.g. hwynet_arc for
+            <gdb>/hwynet/hwynet_arc. '''
+        return os.path.basename(os.path.normpath(str(table)))
+
+    def _has_table(self, name):
+        return self.connection.execute(
+            "SELECT 1 FROM sqlite_master WHERE type IN ('table', 'view') AND name = ? COLLATE NOCASE", (name,)
+        ).fetchone() is not None
+
+    def _geometry_column(self, table):
+        ''' (column name, geometry type, srs_id) of a table's geometry, or
+            None. '''
+        if not self._has_table('gpkg_geometry_columns'):
+            return None
+        return self.connection.execute(
+            'SELECT column_name, geometry_type_name, srs_id FROM gpkg_geometry_columns WHERE table_name = ? COLLATE NOCASE',
+            (self.table_name(table),)
+        ).fetchone()
+
+    def exists(self, table):
+        return self._has_table(self.table_name(table))
+
+    def list_tables(self, wildcard='*'):
+        ''' Non-spatial tables matching a wildcard, as arcpy.ListTables(). '''
+        names = [row[0] for row in self.connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+        spatial = set()
+        if self._has_table('gpkg_geometry_columns'):
+            spatial = set(row[0].lower() for row in self.connection.execute('SELECT table_name FROM gpkg_geometry_columns'))
+        return [
+            name for name in names
+            if name.lower() not in spatial and not name.lower().startswith(('gpkg_', 'rtree_', 'sqlite_'))
+            and fnmatch.fnmatch(name.lower(), wildcard.lower())
+        ]
+
+    def list_fields(self, table):
+        geometry = self._geometry_column(table)
+        geometry_name = geometry[0].lower() if geometry else None
+        fields = []
+        for cid, name, declared_type, notnull, default, pk in self.connection.execute(
+                'PRAGMA table_info("{}")'.format(self.table_name(table))):
+            if pk and declared_type.upper() == 'INTEGER':
+                field_type = 'OID'
+            elif name.lower() == geometry_name:
+                field_type = 'Geometry'
+            else:
+                field_type = ARCPY_TYPES.get(declared_type.split('(')[0].strip().upper(), 'String')
+            fields.append(Field(name, field_type))
+        if not fields:
+            raise ValueError('{} does not exist in {}.'.format(self.table_name(table), self.path))
+        return fields
+
+    def oid_field(self, table):
+        for field in self.list_fields(table):
+            if field.type == 'OID':
+                return field.name
+        return 'rowid'
+
+    def geometry_type(self, table):
+        geometry = self._geometry_column(table)
+        return geometry[1].upper() if geometry else None
+
+    def spatial_reference(self, table):
+        ''' The srs_id of a table's geometry, or None. '''
+        geometry = self._geometry_column(table)
+        return geometry[2] if geometry else None
+
+    def editable_fields(self, table):
+        return [f for f in self.list_fields(table) if f.type not in ('OID', 'Geometry')]
+
+    def copy_schema(self, table, out_table):
+        ''' Create an empty table (replacing any existing one) with the
+            fields, geometry type and srs_id of another. '''
+        self.create_table(
+            out_table, self.editable_fields(table), self.geometry_type(table), self.spatial_reference(table) or 0)
+        return out_table
+
+    def delete(self, table):
+        ''' Drop a table, along with its spatial index and GeoPackage
+            metadata. '''
+        name = self.table_name(table)
+        geometry = self._geometry_column(table)
+        if geometry:
+            self.connection.execute('DROP TABLE IF EXISTS "rtree_{0}_{1}"'.format(name, geometry[0]))
+        self.connection.execute('DROP TABLE IF EXISTS "{}"'.format(name))
+        if self._has_table('gpkg_contents'):
+            self.connection.execute('DELETE FROM gpkg_contents WHERE table_name = ? COLLATE NOCASE', (name,))
+            self.connection.execute('DELETE FROM gpkg_geometry_columns WHERE table_name = ? COLLATE NOCASE', (name,))
+        self.connection.commit()
+
+    def _columns(self, table, fields):
+        ''' Translate cursor fields to quoted columns, and return the index of
+            the 'SHAPE@' field (or None). '''
+        columns = []
+        shape_index = None
+        for i, field in enumerate(fields):
+            if field == 'OID@':
+                field = self.oid_field(table)
+            elif field.upper().startswith('SHAPE@'):
+                if field.upper() != 'SHAPE@':
+                    raise ValueError('{} is not supported by GeoPackageStorage (use SHAPE@).'.format(field))
+                geometry = self._geometry_column(table)
+                if not geometry:
+                    raise ValueError('{} has no geometry.'.format(self.table_name(table)))
+                field = geometry[0]
+                shape_index = i
+            columns.append('"{}"'.format(field))
+        return columns, shape_index
+
+    def _select_sql(self, table, columns, where_clause=None, sql_clause=(None, None)):
+        prefix, postfix = sql_clause if sql_clause else (None, None)
+        sql = 'SELECT {0}{1} FROM "{2}"'.format(prefix + ' ' if prefix else '', ', '.join(columns), self.table_name(table))
+        if where_clause:
+            sql += ' WHERE ' + where_clause
+        if postfix:
+            sql += ' ' + postfix
+        return sql
+
+    def search(self, table, fields, where_clause=None, sql_clause=(None, None)):
+        if isinstance(fields, str):
+            fields = [fields]
+        columns, shape_index = self._columns(table, fields)
+        return _SearchCursor(fields, self.connection, self._select_sql(table, columns, where_clause, sql_clause), shape_index)
+
+    def update(self, table, fields, where_clause=None, sql_clause=(None, None)):
+        if isinstance(fields, str):
+            fields = [fields]
+        columns, shape_index = self._columns(table, fields)
+        oid_column = '"{}"'.format(self.oid_field(table))
+        rows = self.connection.execute(
+            self._select_sql(table, [oid_column] + columns, where_clause, sql_clause)).fetchall()
+        return _UpdateCursor(self, table, fields, columns, oid_column, rows, shape_index)
+
+    def insert(self, table, fields):
+        if isinstance(fields, str):
+            fields = [fields]
+        columns, shape_index = self._columns(table, fields)
+        return _InsertCursor(self, table, fields, columns, shape_index)
+
+    def encode_geometry(self, table, parts):
+        geometry = self._geometry_column(table)
+        return write_gpkg_geometry(parts, geometry[1], geometry[2] or 0)
+
+    def to_numpy(self, table, fields, where_clause=None, null_value=None):
+        ''' A NumPy structured array of the fields, as
+            arcpy.da.TableToNumPyArray(). NULLs are replaced by null_value (a
+            single value, or a {field: value} dict) where specified; fields
+            that still have NULLs are object arrays, containing None. '''
+        with self.search(table, fields, where_clause) as cursor:
+            rows = [row for row in cursor]
+        columns = [list(column) for column in zip(*rows)] if rows else [[] for f in fields]
+        arrays = []
+        for field, column in zip(fields, columns):
+            null = null_value.get(field) if isinstance(null_value, dict) else null_value
+            if null is not None:
+                column = [null if value is None else value for value in column]
+            arrays.append(np.array(column) if column else np.array([], dtype='f8'))
+        records = np.empty(len(rows), dtype=[(field, array.dtype) for field, array in zip(fields, arrays)])
+        for field, array in zip(fields, arrays):
+            records[field] = array
+        return records
+
+    def geometry_dict(self, table, key_field):
+        ''' A {key: (n, 2) array} dict of the vertices of each feature, with
+            the parts of multi-part features joined. '''
+        geom_dict = {}
+        with self.search(table, [key_field, 'SHAPE@']) as cursor:
+            for key, parts in cursor:
+                geom_dict[key] = np.concatenate(parts) if parts else np.empty((0, 2))
+        return geom_dict
+
+    @staticmethod
+    def vertex_parts(parts):
+        return parts
+
+    def add_spatial_reference(self, sr):
+        ''' Add a spatial reference (an srs_id, or an arcpy.SpatialReference)
+            to gpkg_spatial_ref_sys, if missing, and return its srs_id. '''
+        self._ensure_gpkg_tables()
+        if sr is None:
+            return 0
+        if isinstance(sr, int):
+            srs_id, name, definition = sr, 'srs_{}'.format(sr), 'undefined'
+        else:
+            srs_id, name, definition = sr.factoryCode or 0, sr.name, sr.exportToString().split(';')[0]
+        self.connection.execute(
+            'INSERT OR IGNORE INTO gpkg_spatial_ref_sys (srs_name, srs_id, organization, organization_coordsys_id, definition) '
+            'VALUES (?, ?, ?, ?, ?)', (name, srs_id, 'EPSG' if srs_id > 0 else 'NONE', srs_id, definition)
+        )
+        self.connection.commit()
+        return srs_id
+
+    def _ensure_gpkg_tables(self):
+        ''' Create the GeoPackage metadata tables, if missing. '''
+        if self._has_table('gpkg_contents'):
+            return None
+        self.connection.executescript('''
+            PRAGMA application_id = 1196444487;
+            PRAGMA user_version = 10200;
+            CREATE TABLE gpkg_spatial_ref_sys (
+                srs_name TEXT NOT NULL, srs_id INTEGER PRIMARY KEY, organization TEXT NOT NULL,
+                organization_coordsys_id INTEGER NOT NULL, definition TEXT NOT NULL, description TEXT);
+            INSERT INTO gpkg_spatial_ref_sys VALUES
+                ('Undefined cartesian SRS', -1, 'NONE', -1, 'undefined', NULL),
+                ('Undefined geographic SRS', 0, 'NONE', 0, 'undefined', NULL);
+            CREATE TABLE gpkg_contents (
+                table_name TEXT NOT NULL PRIMARY KEY, data_type TEXT NOT NULL, identifier TEXT UNIQUE,
+                description TEXT DEFAULT '', last_change DATETIME NOT NULL DEFAULT (strftime('%Y-%m-%dT%H:%M:%fZ','now')),
+                min_x DOUBLE, min_y DOUBLE, max_x DOUBLE, max_y DOUBLE, srs_id INTEGER);
+            CREATE TABLE gpkg_geometry_columns (
+                table_name TEXT NOT NULL, column_name TEXT NOT NULL, geometry_type_name TEXT NOT NULL,
+                srs_id INTEGER NOT NULL, z TINYINT NOT NULL, m TINYINT NOT NULL,
+                CONSTRAINT pk_geom_cols PRIMARY KEY (table_name, column_name));
+        ''')
+        return None
+
+    def create_table(self, table, fields, geometry_type=None, srs_id=0):
+        ''' Create a table (replacing any existing one) with an fid OID field,
+            the specified Fields (arcpy types) and, if geometry_type is
+            specified, a geom field. '''
+        self._ensure_gpkg_tables()
+        name = self.table_name(table)
+        columns = ['"fid" INTEGER PRIMARY KEY AUTOINCREMENT']
+        if geometry_type:
+            columns.append('"geom" {}'.format(geometry_type.upper()))
+        columns += ['"{0}" {1}'.format(f.name, SQLITE_TYPES.get(f.type, 'TEXT')) for f in fields]
+        self.delete(table)
+        self.connection.execute('CREATE TABLE "{0}" ({1})'.format(name, ', '.join(columns)))
+        self.connection.execute(
+            'INSERT INTO gpkg_contents (table_name, data_type, identifier, srs_id) VALUES (?, ?, ?, ?)',
+            (name, 'features' if geometry_type else 'attributes', name, srs_id if geometry_type else None)
+        )
+        if geometry_type:
+            self.connection.execute(
+                'INSERT INTO gpkg_geometry_columns VALUES (?, ?, ?, ?, 0, 0)', (name, 'geom', geometry_type.upper(), srs_id))
+        self.connection.commit()
+        return name
+
+
+class _SearchCursor(object):
+    ''' Rows of a GeoPackageStorage.search(), as tuples. reset() re-runs the
+        query, to start again from the first row. '''
+
+    def __init__(self, fields, connection, sql, shape_index):
+        self.fields = tuple(fields)
+        self._connection = connection
+        self._sql = sql
+        self._rows = connection.execute(sql)
+        self._shape_index = shape_index
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._rows.close()
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._rows)
+        if self._shape_index is not None:
+            i = self._shape_index
+            row = row[:i] + (read_gpkg_geometry(row[i]),) + row[i + 1:]
+        return row
+
+    next = __next__
+
+    def reset(self):
+        self._rows.close()
+        self._rows = self._connection.execute(self._sql)
+
+
+class _UpdateCursor(object):
+    ''' Rows of a GeoPackageStorage.update(), as lists, with updateRow() and
+        deleteRow() applying to the last row returned. Changes are committed
+        when the cursor is closed. '''
+
+    def __init__(self, storage, table, fields, columns, oid_column, rows, shape_index):
+        self.fields = tuple(fields)
+        self._storage = storage
+        self._table = table
+        self._rows = iter(rows)
+        self._shape_index = shape_index
+        self._oid = None
+        name = storage.table_name(table)
+        self._update_sql = 'UPDATE "{0}" SET {1} WHERE {2} = ?'.format(name, ', '.join(c + ' = ?' for c in columns), oid_column)
+        self._delete_sql = 'DELETE FROM "{0}" WHERE {1} = ?'.format(name, oid_column)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._storage.connection.commit()
+        return False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        row = next(self._rows)
+        self._oid = row[0]
+        row = list(row[1:])
+        if self._shape_index is not None:
+            row[self._shape_index] = read_gpkg_geometry(row[self._shape_index])
+        return row
+
+    next = __next__
+
+    def updateRow(self, row):
+        row = list(row)
+        if self._shape_index is not None:
+            row[self._shape_index] = self._storage.encode_geometry(self._table, row[self._shape_index])
+        self._storage.connection.execute(self._update_sql, row + [self._oid])
+        return None
+
+    def deleteRow(self):
+        self._storage.connection.execute(self._delete_sql, (self._oid,))
+        return None
+
+
+class _InsertCursor(object):
+    ''' GeoPackageStorage.insert(), committed when the cursor is closed. '''
+
+    def __init__(self, storage, table, fields, columns, shape_index):
+        self.fields = tuple(fields)
+        self._storage = storage
+        self._table = table
+        self._shape_index = shape_index
+        self._insert_sql = 'INSERT INTO "{0}" ({1}) VALUES ({2})'.format(
+            storage.table_name(table), ', '.join(columns), ', '.join('?' * len(columns)))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self._storage.connection.commit()
+        return False
+
+    def insertRow(self, row):
+        ''' Insert a row, returning its OID. '''
+        row = list(row)
+        if self._shape_index is not None:
+            row[self._shape_index] = self._storage.encode_geometry(self._table, row[self._shape_index])
+        return self._storage.connection.execute(self._insert_sql, row).lastrowid
+
+
+# -----------------------------------------------------------------------------
+#  Copy an MHN geodatabase to a GeoPackage.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        sys.exit('Usage: storage.py mhn_gdb out_gpkg')
+    export_geopackage(sys.argv[1], sys.argv[2])
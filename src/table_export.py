@@ -0,0 +1,138 @@
+#!/usr/bin/env python
+'''
+    table_export.py
+    Author: npeterson
+    Revised: 10/17/26
+    ---------------------------------------------------------------------------
+    Bulk CSV formatting for MHN.write_attribute_csv(), which hands most
+    attribute data to SAS. Rows are read a chunk at a time, each chunk is
+    formatted with one string template per row and written with a single
+    call, rather than joining and writing each row separately.
+
+    The output is byte-for-byte the same as writing
+    ','.join(map(str, row)) + '\n' for each row: every value is converted
+    with str(), so floats keep their shortest repr and NULLs are written as
+    "None".
+
+    Running this script times both on a synthetic table the size of the MHN
+    arcs, or on the hwynet_arc feature class of an MHN geodatabase or
+    GeoPackage (see storage.py), and checks that their output is identical:
+
+      table_export.py [mhn_gdb | row_count]
+
+'''
+import itertools
+import os
+import random
+import sys
+import tempfile
+import time
+
+CHUNK_ROWS = 20000  # Rows formatted & written at a time
+
+
+# -----------------------------------------------------------------------------
+#  Define functions.
+# -----------------------------------------------------------------------------
+def format_rows(rows):
+    ''' Return the CSV text of a list of rows: the same as
+        ','.join(map(str, row)) + '\n' for each row, but formatted with a
+        single "%s,%s,...%s" template (%s applies str() to each value), which
+        is faster than joining each row, or transposing the rows to format a
+        column at a time. All rows must have the same number of fields. '''
+    if not rows:
+        return ''
+    template = ','.join(['%s'] * len(rows[0])) + '\n'
+    return ''.join([template % (row if type(row) is tuple else tuple(row)) for row in rows])
+
+
+def write_rows(rows, w, chunk_rows=CHUNK_ROWS):
+    ''' Write an iterable of rows (e.g. an arcpy.da.SearchCursor) to an open
+        file, chunk_rows at a time. Returns the number of rows written. '''
+    rows = iter(rows)
+    row_count = 0
+    while True:
+        chunk = list(itertools.islice(rows, chunk_rows))
+        if not chunk:
+            break
+        w.write(format_rows(chunk))
+        row_count += len(chunk)
+    return row_count
+
+
+def legacy_write_rows(rows, w):
+    ''' Write rows to an open file one at a time, as
+        MHN.write_attribute_csv() originally did. '''
+    row_count = 0
+    for row in rows:
+        w.write(','.join(map(str, row)) + '\n')
+        row_count += 1
+    return row_count
+
+
+def synthetic_arc_rows(row_count, seed=0):
+    ''' Return a list of rows resembling a network.csv export of hwynet_arc:
+        ANODE, BNODE, ABB, integer and float attributes (some NULL), MODES
+        and MILES. '''
+    rng = random.Random(seed)
+    rows = []
+    for i in range(row_count):
+        anode = 5001 + i // 3
+        bnode = rng.randint(5001, 29999)
+        rows.append((
+            anode, bnode, '{}-{}-{}'.format(anode, bnode, rng.randint(1, 2)), str(rng.randint(1, 3)),
+            str(rng.randint(1, 7)), str(rng.randint(1, 7)), rng.randint(0, 3), rng.randint(0, 3),
+            rng.choice([25, 30, 35, 45, 55, 65]), rng.choice([0, 30, 35, 45]), rng.randint(1, 4), rng.randint(0, 4),
+            rng.choice([10.0, 11.0, 12.0]), rng.choice([0.0, 11.0, 12.0]), rng.randint(0, 2), rng.randint(0, 2),
+            None if rng.random() < 0.3 else rng.randint(0, 1), None if rng.random() < 0.3 else rng.randint(0, 1),
+            rng.randint(0, 1), rng.randint(0, 1), rng.randint(0, 1),
+            rng.choice([0.0, 0.0, 0.0, 0.35, 1.4500000476837158]), rng.choice(['1', '2', '3', '4']),
+            rng.randint(0, 1), rng.randint(0, 2), None if rng.random() < 0.9 else rng.randint(150, 180),
+            round(rng.random() * 2, 4),
+        ))
+    return rows
+
+
+def time_export(write, rows, textfile):
+    ''' Return the rows/sec of writing rows to textfile with write(). '''
+    start_time = time.perf_counter()
+    with open(textfile, 'w') as w:
+        row_count = write(rows, w)
+    return row_count / max(time.perf_counter() - start_time, 1e-9)
+
+
+# -----------------------------------------------------------------------------
+#  Compare to the row-by-row export.
+# -----------------------------------------------------------------------------
+if __name__ == '__main__':
+    arg = sys.argv[1] if len(sys.argv) > 1 else '60000'
+    temp_dir = tempfile.mkdtemp()
+    legacy_csv = os.path.join(temp_dir, 'legacy.csv')
+    bulk_csv = os.path.join(temp_dir, 'bulk.csv')
+
+    if arg.isdigit():
+        rows = synthetic_arc_rows(int(arg))
+        def get_rows():
+            return rows
+        source = '{} synthetic arc rows'.format(len(rows))
+    else:
+        from MHN import MasterHighwayNetwork
+        MHN = MasterHighwayNetwork(arg)
+        fields = [f.name for f in MHN.storage.list_fields(MHN.arc) if f.name != '' and f.type != 'Geometry']
+        def get_rows():
+            return MHN.storage.search(MHN.arc, fields)
+        source = MHN.arc
+
+    legacy_rate = time_export(legacy_write_rows, get_rows(), legacy_csv)
+    bulk_rate = time_export(write_rows, get_rows(), bulk_csv)
+    with open(legacy_csv, 'rb') as legacy, open(bulk_csv, 'rb') as bulk:
+        identical = legacy.read() == bulk.read()
+    os.remove(legacy_csv)
+    os.remove(bulk_csv)
+    os.rmdir(temp_dir)
+
+    print(source)
+    print('{0:<10} {1:>12,.0f} rows/sec'.format('row loop', legacy_rate))
+    print('{0:<10} {1:>12,.0f} rows/sec'.format('bulk', bulk_rate))
+    print('Output is {}.'.format('IDENTICAL' if identical else 'DIFFERENT'))
+    sys.exit(0 if identical else 1)
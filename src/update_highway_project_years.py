@@ -305,6 +305,7 @@ with arcpy.da.UpdateCursor(MHN.hwyproj, [common_id_field, 'COMPLETION_YEAR']) as
         c.updateRow(r)
 edit.stopOperation()
 edit.stopEditing(True)
+MHN.invalidate_snapshot('hwyproj')
 
 
 # -----------------------------------------------------------------------------
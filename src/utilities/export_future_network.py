@@ -79,22 +79,16 @@ arcpy.AddMessage('\nPreparing {} network attributes...'.format(build_year))
 # Export coding for highway projects completed by scenario year.
 hwyproj_id_field = MHN.route_systems[MHN.hwyproj][1]
 year_attr = [hwyproj_id_field,'COMPLETION_YEAR']
-year_query = '"COMPLETION_YEAR" <= {}'.format(build_year)
-year_view = MHN.make_skinny_table_view(MHN.hwyproj, 'year_view', year_attr, year_query)
-MHN.write_attribute_csv(year_view, year_csv, year_attr)
-hwy_projects = MHN.make_attribute_dict(year_view, hwyproj_id_field, attr_list=[])
-arcpy.Delete_management(year_view)
+hwy_projects = MHN.select_completed_projects(build_year)
+MHN.write_snapshot_csv('hwyproj', hwy_projects, year_csv, year_attr)
+hwy_coding, network_arcs = MHN.select_scenario_network(hwy_projects)
 
 transact_attr = [
     hwyproj_id_field,'ACTION_CODE','NEW_DIRECTIONS','NEW_TYPE1','NEW_TYPE2','NEW_AMPM1','NEW_AMPM2','NEW_POSTEDSPEED1',
     'NEW_POSTEDSPEED2','NEW_THRULANES1','NEW_THRULANES2','NEW_THRULANEWIDTH1','NEW_THRULANEWIDTH2','ADD_PARKLANES1',
     'ADD_PARKLANES2','ADD_SIGIC','ADD_CLTL','ADD_RRGRADECROSS','NEW_TOLLDOLLARS','NEW_MODES','TOD','ABB','REP_ANODE','REP_BNODE'
 ]
-transact_query = "{} IN ('{}')".format(hwyproj_id_field, "','".join(id for id in hwy_projects))
-transact_view = MHN.make_skinny_table_view(MHN.route_systems[MHN.hwyproj][0], 'transact_view', transact_attr, transact_query)
-MHN.write_attribute_csv(transact_view, transact_csv, transact_attr)
-hwy_abb = MHN.make_attribute_dict(transact_view, 'ABB', attr_list=[])
-arcpy.Delete_management(transact_view)
+MHN.write_snapshot_csv('coding', hwy_coding, transact_csv, transact_attr)
 
 # Export arc & node attributes of all baselinks and skeletons used in
 # projects completed by scenario year.
@@ -103,9 +97,7 @@ network_attr = [
     'THRULANES1','THRULANES2','THRULANEWIDTH1','THRULANEWIDTH2','PARKLANES1','PARKLANES2','BASELINK',
     'SIGIC','CLTL','RRGRADECROSS','TOLLDOLLARS','MODES','MILES'
 ]
-network_query = "BASELINK = '1' OR ABB IN ('{}')".format("','".join((abb for abb in hwy_abb if abb[-1] != '1')))
-network_lyr = MHN.make_skinny_feature_layer(MHN.arc, 'network_lyr', network_attr, network_query)
-MHN.write_attribute_csv(network_lyr, network_csv, network_attr)
+MHN.write_snapshot_csv('arc', network_arcs, network_csv, network_attr)
 
 # Process attribute tables with export_future_network_2.sas.
 sas1_sas = os.path.join(MHN.util_dir, '{}.sas'.format(sas1_name))
@@ -102,28 +102,21 @@ arcpy.AddMessage('\nPreparing {} network attributes...'.format(build_year))
 hwyproj_id_field = in_mhn.route_systems[in_mhn.hwyproj][1]
 year_attr = [hwyproj_id_field,'COMPLETION_YEAR']
 year_query = '"COMPLETION_YEAR" <= {}'.format(build_year)
-year_view = in_mhn.make_skinny_table_view(in_mhn.hwyproj, 'year_view', year_attr, year_query)
-in_mhn.write_attribute_csv(year_view, year_csv, year_attr)
-hwy_projects = in_mhn.make_attribute_dict(year_view, hwyproj_id_field, attr_list=[])
-arcpy.Delete_management(year_view)
+hwy_projects = in_mhn.select_completed_projects(build_year)
+in_mhn.write_snapshot_csv('hwyproj', hwy_projects, year_csv, year_attr)
+hwy_coding, network_arcs = in_mhn.select_scenario_network(hwy_projects)
 
 transact_attr = [hwyproj_id_field,'ACTION_CODE','NEW_DIRECTIONS','NEW_TYPE1','NEW_TYPE2','NEW_AMPM1','NEW_AMPM2','NEW_POSTEDSPEED1',
                  'NEW_POSTEDSPEED2','NEW_THRULANES1','NEW_THRULANES2','NEW_THRULANEWIDTH1','NEW_THRULANEWIDTH2','ADD_PARKLANES1',
                  'ADD_PARKLANES2','ADD_SIGIC','ADD_CLTL','ADD_RRGRADECROSS','NEW_TOLLDOLLARS','NEW_MODES','TOD','ABB','REP_ANODE','REP_BNODE']
-transact_query = '''"{0}" IN ('{1}')'''.format(hwyproj_id_field, "','".join((hwyproj_id for hwyproj_id in hwy_projects)))
-transact_view = in_mhn.make_skinny_table_view(in_mhn.route_systems[in_mhn.hwyproj][0], 'transact_view', transact_attr, transact_query)
-in_mhn.write_attribute_csv(transact_view, transact_csv, transact_attr)
-hwy_abb = in_mhn.make_attribute_dict(transact_view, 'ABB', attr_list=[])
-arcpy.Delete_management(transact_view)
+in_mhn.write_snapshot_csv('coding', hwy_coding, transact_csv, transact_attr)
 
 # Export arc & node attributes of all baselinks and skeletons used in
 # projects completed by scenario year.
 network_attr = ['ANODE','BNODE','ABB','DIRECTIONS','TYPE1','TYPE2','AMPM1','AMPM2','POSTEDSPEED1','POSTEDSPEED2',
                 'THRULANES1','THRULANES2','THRULANEWIDTH1','THRULANEWIDTH2','PARKLANES1','PARKLANES2','BASELINK',
                 'SIGIC','CLTL','RRGRADECROSS','TOLLDOLLARS','MODES','MILES']
-network_query = '''"BASELINK" = '1' OR "ABB" IN ('{}')'''.format("','".join((abb for abb in hwy_abb if abb[-1] != '1')))
-network_lyr = in_mhn.make_skinny_feature_layer(in_mhn.arc, 'network_lyr', network_attr, network_query)
-in_mhn.write_attribute_csv(network_lyr, network_csv, network_attr)
+in_mhn.write_snapshot_csv('arc', network_arcs, network_csv, network_attr)
 
 # Process attribute tables with export_future_network_2.sas.
 sas1_sas = os.path.join(in_mhn.util_dir, '{}.sas'.format(sas1_name))